@@ -0,0 +1,68 @@
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+
+# Shared by the benchmarks: makes the modules in Code/ importable and writes results as
+# JSON documents of the same shape, so runs from different commits can be compared with
+# compare.py.
+
+# vocabulary of the text that stands in for text-heavy transfers (1400-byte segments compress about 3:1 with zlib)
+WORDS = ("the", "of", "and", "to", "in", "is", "for", "that", "with", "on", "as", "by", "at", "from",
+         "packet", "segment", "window", "receiver", "sender", "sequence", "number", "timeout", "data",
+         "connection", "header", "checksum", "transfer", "buffer", "acknowledgement", "retransmission")
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if CODE_DIR not in sys.path:
+    sys.path.insert(0, CODE_DIR)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=CODE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        "commit": git_commit(),
+        "time": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def make_text(size, seed=0):
+    # English-like lines of WORDS, reproducible for a given size and seed
+    rng = random.Random(seed)
+    lines, length = [], 0
+    while length < size:
+        line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 14))).capitalize() + ".\n"
+        lines.append(line)
+        length += len(line)
+    return "".join(lines).encode()[:size]
+
+
+def default_output(suite):
+    commit = git_commit()
+    return f"{suite}-{commit}.json" if commit else f"{suite}.json"
+
+
+def write_results(path, suite, settings, results):
+    # results is a list of dicts; each has the fields that identify it plus its measurements
+    document = {"suite": suite, "environment": environment(), "settings": settings, "results": results}
+    with open(path, "w") as file:
+        json.dump(document, file, indent=1)
+    print(f"wrote {path}")
+
+
+def read_results(path):
+    with open(path) as file:
+        return json.load(file)
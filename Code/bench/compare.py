@@ -0,0 +1,53 @@
+import sys
+import common
+
+# usage: python bench/compare.py <baseline.json> <candidate.json>
+# Lines up the results of two runs of the same suite (micro or e2e) and prints the ratio of
+# each measurement, candidate over baseline (> 1 is faster for rates, slower for times).
+
+KEYS = {"micro": ("name", "payload"),
+        "e2e": ("size", "loss", "arq", "cc", "mss", "window", "content", "compression", "pacing", "bottleneck",
+                "handshake")}
+MEASUREMENTS = {"micro": ("ops_per_second",),
+                "e2e": ("goodput_bytes_per_second", "completion_seconds", "sender_cpu_seconds")}
+# values of the keys that results from before they existed lack
+DEFAULTS = {"content": "random", "compression": "none", "pacing": "off", "bottleneck": 0, "handshake": "intact"}
+
+
+def key_of(result, keys):
+    return tuple(result.get(key, DEFAULTS.get(key)) for key in keys)
+
+
+def compare(baseline, candidate):
+    suite = baseline["suite"]
+    if candidate["suite"] != suite:
+        raise ValueError(f"cannot compare a {suite} run with a {candidate['suite']} run")
+    keys = KEYS[suite]
+    before = {key_of(result, keys): result for result in baseline["results"]}
+    rows = []
+    for result in candidate["results"]:
+        identity = key_of(result, keys)
+        old = before.get(identity)
+        if old is None:
+            continue
+        for measurement in MEASUREMENTS[suite]:
+            if old.get(measurement) and result.get(measurement) is not None:
+                rows.append((identity, measurement, old[measurement], result[measurement],
+                             result[measurement] / old[measurement]))
+    return rows
+
+
+def main():
+    if len(sys.argv) != 3:
+        print("usage: python bench/compare.py <baseline.json> <candidate.json>")
+        return 2
+    baseline, candidate = common.read_results(sys.argv[1]), common.read_results(sys.argv[2])
+    print(f"{baseline['environment']['commit']} -> {candidate['environment']['commit']}")
+    for identity, measurement, old, new, ratio in compare(baseline, candidate):
+        name = " ".join(str(part) for part in identity)
+        print(f"{name:48} {measurement:26} {old:14.6g} {new:14.6g} {ratio:7.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
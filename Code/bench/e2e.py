@@ -0,0 +1,258 @@
+import argparse
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+import common
+
+# usage: python bench/e2e.py [--sizes 1M 100M 1G] [--loss 0 0.01 0.05] [--arq ...] [--cc ...]
+#                            [--content random text] [--compression none zlib ...] [--pacing on off]
+#                            [--bottleneck 0 2000000] [--handshake intact syn ack] [--output results.json]
+# Loopback transfers for every combination of file size, emulated loss rate (the sender's
+# LOSS_PROBABILITY), ARQ mode, congestion controller, file content, payload compression,
+# pacing and bottleneck. A bottleneck (bytes/s) puts netem.py between the two ends, with
+# BOTTLENECK_DELAY each way and a drop-tail queue of BOTTLENECK_QUEUE bytes, where the
+# difference between bursts and paced segments shows up as losses. --handshake corrupts
+# the SYN, the SYN-ACK or the handshake ACK on their way (also through netem.py), so the
+# runs check that a corrupted handshake segment is retried instead of accepted.
+# Each run gets a fresh receiver and sender process configured through their module
+# settings, and reports completion time, goodput, retransmissions, payload bytes on the
+# wire and the CPU time of both sides. A run only counts as ok when the received file is
+# identical.
+
+SIZES = ("1M", "100M", "1G")
+LOSS_RATES = (0.0, 0.01, 0.05)
+ARQ_MODES = ("SELECTIVE_REPEAT", "GO_BACK_N")
+CONTROLLERS = ("reno", "newreno", "cubic", "bbr")
+CONTENTS = ("random",)  # "random" (incompressible) or "text" (common.make_text)
+COMPRESSION = ("none",)  # "none" or a codec name of compression.py, offered alone in the SYN
+PACING = ("on", "off")  # sender.PACING
+BOTTLENECKS = (0,)  # bytes per second of the emulated link; 0 = plain loopback
+HANDSHAKES = ("intact",)  # "intact", or the handshake segment corrupted on its way (see HANDSHAKE_CORRUPTION)
+# handshake segment -> (forward, reverse) numbers of the datagrams netem.py corrupts, in the low
+# byte of the sequence number (of the ack_num for the SYN-ACK, which echoes the SYN's ISN + 1)
+HANDSHAKE_CORRUPTION = {"intact": ((), ()), "syn": ((1,), ()), "synack": ((), (1,)), "ack": ((2,), ())}
+SEQ_NUM_BYTE = 11
+ACK_NUM_BYTE = 15
+BOTTLENECK_DELAY = 0.02  # seconds of one-way delay on the emulated link
+BOTTLENECK_QUEUE = 32 * 1024  # bytes queued in front of the bottleneck before it drops
+NETEM_PORT = 8002
+MSS = 1400  # the protocol's defaults are tiny teaching values; benchmarks use a realistic segment
+WINDOW_SEGMENTS = 64  # sender WINDOW_SIZE, so CWND_MAX = WINDOW_SEGMENTS * MSS
+RUN_TIMEOUT = 1800  # seconds before a run is abandoned
+SEED = 0  # file contents and simulated loss are reproducible
+UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+CHUNK = 1 << 20
+
+
+def parse_size(text):
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def make_file(path, size, seed=SEED, content="random"):
+    # random (incompressible) bytes or text, the same for every run of the same size
+    rng = random.Random(seed)
+    with open(path, "wb") as file:
+        for offset in range(0, size, CHUNK):
+            length = min(CHUNK, size - offset)
+            file.write(rng.randbytes(length) if content == "random" else common.make_text(length, rng.random()))
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def quiet():
+    # the sender and receiver print progress; keep the benchmark's own output readable
+    logging.disable(logging.CRITICAL)
+    sys.stdout = open(os.devnull, "w")
+
+
+def run_receiver(workdir, ready, cpu):
+    quiet()
+    os.chdir(workdir)  # the output file is written to the working directory
+    import receiver
+    server_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server_sock.bind((receiver.HOST, receiver.RECEIVER_PORT))
+    receiver.tune_socket(server_sock)
+    ready.set()
+    started = time.process_time()
+    receiver.serve_connection(server_sock)
+    cpu.put(time.process_time() - started)
+    server_sock.close()
+
+
+def run_netem(bottleneck, handshake, stop, stats):
+    quiet()
+    import netem
+    corrupt_forward, corrupt_reverse = HANDSHAKE_CORRUPTION[handshake]
+    delay = BOTTLENECK_DELAY if bottleneck else 0.0
+    forward = netem.LinkProfile(rate=bottleneck, delay=delay, queue_limit=BOTTLENECK_QUEUE,
+                                corrupt_datagrams=corrupt_forward, corrupt_byte=SEQ_NUM_BYTE)
+    reverse = netem.LinkProfile(delay=delay, corrupt_datagrams=corrupt_reverse, corrupt_byte=ACK_NUM_BYTE)
+    proxy = netem.UdpProxy((netem.HOST, NETEM_PORT), (netem.HOST, netem.TARGET_PORT), forward, reverse)
+    while not stop.is_set():
+        proxy.serve(1.0, stats_interval=1.0)
+    stats.put(dict(proxy.forward.stats))
+    proxy.close()
+
+
+def run_sender(data_file, settings, results):
+    quiet()
+    import sender
+    random.seed(settings.pop("seed"))
+    for name, value in settings.items():
+        setattr(sender, name, value)
+    started, cpu_started = time.monotonic(), time.process_time()
+    metrics = sender.start_sender(data_file, 0)
+    results.put((time.monotonic() - started, time.process_time() - cpu_started,
+                 metrics.to_dict() if metrics is not None else None))
+
+
+def run_transfer(data_file, size, loss, arq, cc, mss=MSS, window=WINDOW_SEGMENTS, seed=SEED, timeout=RUN_TIMEOUT,
+                 content="random", compression="none", pacing="on", bottleneck=0, handshake="intact"):
+    workdir = tempfile.mkdtemp(prefix="rtlp-bench-")
+    output = os.path.join(workdir, "received_packets.txt")
+    ready = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    receiver_cpu = multiprocessing.Queue()
+    settings = {
+        "MSS": mss, "WINDOW_SIZE": window, "CWND_MAX": window * mss, "SEND_BUFFER_SEGMENTS": 2 * window,
+        "LOSS_PROBABILITY": loss, "ARQ_MODE": arq, "CONGESTION_CONTROL": cc, "seed": seed,
+        "COMPRESSION": () if compression == "none" else (compression,), "PACING": pacing == "on",
+    }
+    receiver_process = multiprocessing.Process(target=run_receiver, args=(workdir, ready, receiver_cpu))
+    receiver_process.start()
+    ready.wait(10)
+    netem_stop, netem_stats = multiprocessing.Event(), multiprocessing.Queue()
+    netem_process = None
+    if bottleneck or handshake != "intact":
+        settings["RECEIVER_PORT"] = NETEM_PORT
+        netem_process = multiprocessing.Process(target=run_netem, args=(bottleneck, handshake, netem_stop, netem_stats))
+        netem_process.start()
+        time.sleep(0.5)  # lets it bind its port
+    sender_process = multiprocessing.Process(target=run_sender, args=(data_file, settings, results))
+    sender_process.start()
+    result = {"size": size, "loss": loss, "arq": arq, "cc": cc, "mss": mss, "window": window, "content": content,
+              "compression": compression, "pacing": pacing, "bottleneck": bottleneck, "handshake": handshake}
+    try:
+        completion, sender_cpu, metrics = results.get(timeout=timeout)
+    except Exception:  # queue.Empty: the run hung
+        completion, sender_cpu, metrics = None, None, None
+    try:
+        receiver_seconds = receiver_cpu.get(timeout=30)
+    except Exception:
+        receiver_seconds = None
+    for process in (sender_process, receiver_process):
+        process.join(10)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+    bottleneck_drops = None
+    if netem_process is not None:
+        netem_stop.set()
+        try:
+            bottleneck_drops = netem_stats.get(timeout=10)["queue_dropped"]
+        except Exception:
+            pass
+        netem_process.join()
+    ok = metrics is not None and os.path.exists(output) and os.path.getsize(output) == size
+    ok = ok and file_digest(output) == file_digest(data_file)
+    result.update({
+        "ok": ok,
+        "completion_seconds": completion,
+        "goodput_bytes_per_second": metrics["goodput"] if metrics else None,
+        "transfer_seconds": metrics["duration"] if metrics else None,
+        "segments_sent": metrics["counters"]["segments_sent"] if metrics else None,
+        "retransmissions": metrics["counters"]["segments_retransmitted"] if metrics else None,
+        "timeouts": metrics["counters"]["timeouts"] if metrics else None,
+        "payload_bytes_on_wire": metrics["counters"]["bytes_sent"] if metrics else None,
+        "segments_compressed": metrics["counters"]["segments_compressed"] if metrics else None,
+        "sender_cpu_seconds": sender_cpu,
+        "receiver_cpu_seconds": receiver_seconds,
+        "bottleneck_drops": bottleneck_drops,
+    })
+    if os.path.exists(output):
+        os.remove(output)
+    os.rmdir(workdir)
+    return result
+
+
+def describe(result, size_text):
+    line = (f"{size_text:>6} {result['content']:6} {result['compression']:5} pacing={result['pacing']:3} "
+            f"link={result['bottleneck'] or '-':<8} loss={result['loss']:<5} {result['arq']:17} {result['cc']:8} ")
+    goodput = result["goodput_bytes_per_second"]
+    if goodput is None:
+        return line + "  no result"
+    line += (f"{result['completion_seconds']:8.2f} s {goodput / 1e6:8.2f} MB/s {result['retransmissions']:7} retx "
+             f"{result['payload_bytes_on_wire'] / result['size']:6.1%} wire {result['sender_cpu_seconds']:7.2f} s cpu")
+    if result["bottleneck"]:
+        line += f" {result['bottleneck_drops']} drops"
+    if result["handshake"] != "intact":
+        line += f" corrupted {result['handshake']}"
+    return line + ("" if result["ok"] else "  FAILED")
+
+
+def run(sizes, loss_rates, arq_modes, controllers, mss=MSS, window=WINDOW_SEGMENTS, seed=SEED, timeout=RUN_TIMEOUT,
+        contents=CONTENTS, compressions=COMPRESSION, pacing_modes=PACING, bottlenecks=BOTTLENECKS,
+        handshakes=HANDSHAKES):
+    results = []
+    with tempfile.TemporaryDirectory(prefix="rtlp-bench-data-") as data_dir:
+        for size_text, content in itertools.product(sizes, contents):
+            size = parse_size(size_text)
+            data_file = os.path.join(data_dir, f"{size}.{content}")
+            make_file(data_file, size, seed, content)
+            for loss, arq, cc, compression, pacing, bottleneck, handshake in itertools.product(
+                    loss_rates, arq_modes, controllers, compressions, pacing_modes, bottlenecks, handshakes):
+                result = run_transfer(data_file, size, loss, arq, cc, mss, window, seed, timeout, content, compression,
+                                      pacing, bottleneck, handshake)
+                results.append(result)
+                print(describe(result, size_text))
+            os.remove(data_file)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end loopback transfer benchmarks.")
+    parser.add_argument("--sizes", nargs="+", default=list(SIZES), help="file sizes, e.g. 1M 100M 1G")
+    parser.add_argument("--loss", nargs="+", type=float, default=list(LOSS_RATES), help="emulated loss rates")
+    parser.add_argument("--arq", nargs="+", default=list(ARQ_MODES), choices=ARQ_MODES)
+    parser.add_argument("--cc", nargs="+", default=list(CONTROLLERS), choices=CONTROLLERS)
+    parser.add_argument("--content", nargs="+", default=list(CONTENTS), choices=("random", "text"))
+    parser.add_argument("--compression", nargs="+", default=list(COMPRESSION),
+                        choices=("none", "zlib", "lz4", "zstd"), help="codec offered by the sender")
+    parser.add_argument("--pacing", nargs="+", default=list(PACING), choices=PACING)
+    parser.add_argument("--bottleneck", nargs="+", type=int, default=list(BOTTLENECKS),
+                        help="bytes/s of an emulated link (0 = plain loopback)")
+    parser.add_argument("--handshake", nargs="+", default=list(HANDSHAKES), choices=list(HANDSHAKE_CORRUPTION),
+                        help="handshake segment corrupted on its way")
+    parser.add_argument("--mss", type=int, default=MSS)
+    parser.add_argument("--window", type=int, default=WINDOW_SEGMENTS, help="sender window in segments")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--timeout", type=float, default=RUN_TIMEOUT, help="seconds before a run is abandoned")
+    parser.add_argument("--output", help="JSON results file (default: e2e-<commit>.json)")
+    args = parser.parse_args()
+    results = run(args.sizes, args.loss, args.arq, args.cc, args.mss, args.window, args.seed, args.timeout,
+                  args.content, args.compression, args.pacing, args.bottleneck, args.handshake)
+    settings = {"sizes": args.sizes, "loss": args.loss, "arq": args.arq, "cc": args.cc, "mss": args.mss,
+                "window": args.window, "seed": args.seed, "content": args.content, "compression": args.compression,
+                "pacing": args.pacing, "bottleneck": args.bottleneck, "handshake": args.handshake}
+    common.write_results(args.output or common.default_output("e2e"), "e2e", settings, results)
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,102 @@
+import argparse
+import random
+import timeit
+import common
+from compression import CODECS
+from header import (ReliableTransportLayerProtocolHeader, SegmentView, WIRE_BINARY, WIRE_TEXT, OPT_SACK, OPT_TIMESTAMP,
+                    encode_sack_blocks, encode_timestamp, sum16)
+
+# usage: python bench/micro.py [--payload BYTES] [--repeat N] [--output results.json]
+# Operations per second of the header codec and checksum. Every case builds or decodes a
+# fresh header, so the per-object payload checksum cache does not flatter the numbers.
+# decode_binary and decode_text call each format's decoder directly on the same header
+# and payload, so they compare the formats alone. The view_ cases decode into a SegmentView, as the receive paths do; view_binary alone
+# is what a segment dropped on its sequence number costs.
+# The compress_/decompress_ cases time each installed codec on one segment of text; with
+# the e2e suite's --content text runs they weigh CPU cost against bytes kept off the wire.
+
+PAYLOAD_SIZE = 1400  # bytes of payload per segment
+REPEAT = 5  # timings per case; the best one is reported
+
+
+def cases(payload_size):
+    payload = random.Random(0).randbytes(payload_size)
+    text_payload = bytes(byte % 95 + 32 for byte in payload).decode()  # printable, for the text format
+    options = {OPT_TIMESTAMP: encode_timestamp(123456789, 987654321)}
+
+    def segment(data=payload, wire_options=options):
+        return ReliableTransportLayerProtocolHeader(8001, 8000, 4000000000, 1234, 64, 1400, app_data=data,
+                                                    options=wire_options)
+
+    binary = segment().to_bytes(WIRE_BINARY)
+    plain_binary = segment(text_payload, None).to_bytes(WIRE_BINARY)  # what text holds, in the binary format
+    text = segment(text_payload, None).to_bytes(WIRE_TEXT)
+    ack_options = dict(options)
+    ack_options[OPT_SACK] = encode_sack_blocks([(10, 20), (30, 40), (50, 60), (70, 80)])
+    resent = segment()
+    seq_nums = [4000000000, 4000001400]
+    ack_template = ReliableTransportLayerProtocolHeader(8000, 8001, 55, 4000000000, 64, 1400, ack=True,
+                                                        options=ack_options)
+
+    # name -> (function, payload bytes it processes per call)
+    timed = {
+        "encode_binary": (lambda: segment().to_bytes(WIRE_BINARY), payload_size),
+        "encode_text": (lambda: segment(text_payload, None).to_bytes(WIRE_TEXT), payload_size),
+        "decode_binary": (lambda: ReliableTransportLayerProtocolHeader.from_binary_bytes(plain_binary), payload_size),
+        "decode_text": (lambda: ReliableTransportLayerProtocolHeader.from_text_bytes(text), payload_size),
+        "decode_verify_binary": (lambda: ReliableTransportLayerProtocolHeader.from_bytes(binary).verify_checksum(),
+                                 payload_size),
+        "view_binary": (lambda: SegmentView(binary), 0),
+        "view_verify_binary": (lambda: SegmentView(binary).verify_checksum(), payload_size),
+        "checksum_sum16": (lambda: sum16(payload), payload_size),
+        "checksum_reference": (resent.calculateChecksumReference, payload_size),
+        "checksum_incremental": (lambda: resent.update_fields(seq_num=seq_nums[resent.seq_num & 1]), 0),
+        "encode_ack_sack": (lambda: ReliableTransportLayerProtocolHeader(
+            8000, 8001, 55, 4000000000, 64, 1400, ack=True, options=ack_options).to_bytes(WIRE_BINARY), 0),
+        "encode_ack_template": (lambda: ack_template.update_fields(
+            56, seq_nums[ack_template.ack_num & 1], 64, ack_options) or ack_template.to_bytes(WIRE_BINARY), 0),
+    }
+    prose = common.make_text(payload_size)
+    for codec in CODECS.values():
+        compressed = codec.compress(prose)
+        timed[f"compress_{codec.name}"] = (lambda codec=codec: codec.compress(prose), payload_size)
+        timed[f"decompress_{codec.name}"] = (
+            lambda codec=codec, compressed=compressed: codec.decompress(compressed, payload_size), payload_size)
+    return timed
+
+
+def measure(function, repeat):
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat, number)) / number
+    return best
+
+
+def run(payload_size=PAYLOAD_SIZE, repeat=REPEAT, only=None):
+    results = []
+    for name, (function, processed) in cases(payload_size).items():
+        if only and name not in only:
+            continue
+        seconds = measure(function, repeat)
+        result = {"name": name, "payload": payload_size, "ops_per_second": 1 / seconds, "ns_per_op": seconds * 1e9}
+        if processed:
+            result["bytes_per_second"] = processed / seconds
+        results.append(result)
+        print(f"{name:24} {1 / seconds:14,.0f} ops/s {seconds * 1e9:12,.0f} ns/op")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Header codec and checksum microbenchmarks.")
+    parser.add_argument("--payload", type=int, default=PAYLOAD_SIZE, help="payload bytes per segment")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--only", nargs="*", help="run only these cases")
+    parser.add_argument("--output", help="JSON results file (default: micro-<commit>.json)")
+    args = parser.parse_args()
+    results = run(args.payload, args.repeat, args.only)
+    settings = {"payload": args.payload, "repeat": args.repeat}
+    common.write_results(args.output or common.default_output("micro"), "micro", settings, results)
+
+
+if __name__ == "__main__":
+    main()
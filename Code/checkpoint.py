@@ -0,0 +1,72 @@
+import collections
+import hashlib
+import json
+import os
+
+# Resumable transfers (header.OPT_RESUME).
+#
+# The sender names the file it sends with a key (its path, size and modification time,
+# hashed), so a key only matches while the file is unchanged. The receiver checkpoints its
+# progress in a sidecar next to the output file: the key, how many bytes from the start of
+# the file are on disk, and the SHA-256 of those bytes. When a SYN offers the key of a
+# checkpoint, the receiver hashes the output file's first bytes again and, if they still
+# match, tells the sender to start at that offset instead of byte zero.
+
+SIDECAR_SUFFIX = ".resume"
+KEY_SIZE = 16
+OFFSET_SIZE = 8  # bytes of the offset in a SYN-ACK
+READ_SIZE = 1024 * 1024
+
+Checkpoint = collections.namedtuple("Checkpoint", "key offset digest")
+
+
+def transfer_key(path):
+    status = os.stat(path)
+    identity = f"{os.path.abspath(path)}|{status.st_size}|{status.st_mtime_ns}"
+    return hashlib.blake2b(identity.encode(), digest_size=KEY_SIZE).digest()
+
+
+def sidecar_path(output_path):
+    return output_path + SIDECAR_SUFFIX
+
+
+def load(output_path):
+    # the checkpoint of an output file, None when there is none or it cannot be read
+    try:
+        with open(sidecar_path(output_path)) as file:
+            fields = json.load(file)
+        return Checkpoint(bytes.fromhex(fields["key"]), int(fields["offset"]), bytes.fromhex(fields["digest"]))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save(output_path, key, offset, digest):
+    # written to a temporary file and renamed, so a crash leaves the old checkpoint or the new one
+    path = sidecar_path(output_path)
+    with open(path + ".tmp", "w") as file:
+        json.dump({"key": key.hex(), "offset": offset, "digest": digest.hex()}, file)
+    os.replace(path + ".tmp", path)
+
+
+def remove(output_path):
+    try:
+        os.remove(sidecar_path(output_path))
+    except FileNotFoundError:
+        pass
+
+
+def verify(output_path, checkpoint):
+    # SHA-256 object of the output's first checkpoint.offset bytes, None if they are not the checkpointed ones
+    digest = hashlib.sha256()
+    remaining = checkpoint.offset
+    try:
+        with open(output_path, "rb") as file:
+            while remaining:
+                chunk = file.read(min(READ_SIZE, remaining))
+                if not chunk:
+                    return None  # the file is shorter than the checkpoint
+                digest.update(chunk)
+                remaining -= len(chunk)
+    except OSError:
+        return None
+    return digest if digest.digest() == checkpoint.digest else None
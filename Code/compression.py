@@ -0,0 +1,134 @@
+import collections
+import zlib
+
+try:
+    import lz4.block as lz4_block
+except ImportError:  # optional: pip install lz4
+    lz4_block = None
+try:
+    import zstandard
+except ImportError:  # optional: pip install zstandard
+    zstandard = None
+
+# Payload compression, negotiated in the handshake (header.OPT_COMPRESSION).
+#
+# Every data segment is compressed on its own, so it decodes whatever order it arrives in
+# and however often it is resent. Sequence numbers keep counting the original bytes, so
+# windows, ACKs and SACK blocks do not change; only the payload on the wire gets shorter.
+# A segment is sent compressed only when that makes it clearly smaller, and the sender
+# stops trying for a while when the data does not compress (see AdaptiveCompressor).
+
+# codec ids, as carried by OPT_COMPRESSION
+CODEC_ZLIB = 1
+CODEC_LZ4 = 2
+CODEC_ZSTD = 3
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+MIN_SAVING = 0.05  # fraction of a segment compression has to save for the segment to be sent compressed
+ADAPT_MISSES = 8  # segments in a row that did not compress before the sender stops trying
+ADAPT_SKIP = 16  # segments then sent without trying; doubled each time the data still does not compress
+ADAPT_MAX_SKIP = 4096
+
+Codec = collections.namedtuple("Codec", "name compress decompress")
+
+
+def _zlib_compress(data):
+    # raw deflate: no zlib header or checksum, the segment checksum covers the payload
+    return zlib.compress(data, ZLIB_LEVEL, -zlib.MAX_WBITS)
+
+
+def _zlib_decompress(data, limit):
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    payload = decompressor.decompress(data, limit)
+    if decompressor.unconsumed_tail or not decompressor.eof:
+        raise ValueError(f"compressed payload larger than {limit} bytes or truncated")
+    return payload
+
+
+def _lz4_compress(data):
+    return lz4_block.compress(data, store_size=True)
+
+
+def _lz4_decompress(data, limit):
+    # the block starts with its original size (4 bytes, little endian)
+    if len(data) < 4 or int.from_bytes(bytes(data[:4]), "little") > limit:
+        raise ValueError(f"compressed payload larger than {limit} bytes or truncated")
+    return lz4_block.decompress(data)
+
+
+def _zstd_compress(data):
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+def _zstd_decompress(data, limit):
+    if zstandard.frame_content_size(data) > limit:
+        raise ValueError(f"compressed payload larger than {limit} bytes")
+    return zstandard.ZstdDecompressor().decompress(data, max_output_size=limit)
+
+
+# codec id -> Codec, only the ones whose library is installed
+CODECS = {CODEC_ZLIB: Codec("zlib", _zlib_compress, _zlib_decompress)}
+if lz4_block is not None:
+    CODECS[CODEC_LZ4] = Codec("lz4", _lz4_compress, _lz4_decompress)
+if zstandard is not None:
+    CODECS[CODEC_ZSTD] = Codec("zstd", _zstd_compress, _zstd_decompress)
+
+CODEC_IDS = {"zlib": CODEC_ZLIB, "lz4": CODEC_LZ4, "zstd": CODEC_ZSTD}
+
+
+def available(names):
+    # ids of the named codecs that can be used here, in the given order
+    return [CODEC_IDS[name] for name in names if CODEC_IDS.get(name) in CODECS]
+
+
+def choose(offered):
+    # the first codec the peer offered (its preference) that is available here, None if none is
+    return next((codec_id for codec_id in offered if codec_id in CODECS), None)
+
+
+def decompress(codec_id, data, limit):
+    # original payload of a compressed segment; ValueError if it is malformed or longer than limit
+    try:
+        return CODECS[codec_id].decompress(data, limit)
+    except ValueError:
+        raise
+    except Exception as error:  # zlib.error, LZ4BlockError, ZstdError
+        raise ValueError(f"malformed compressed payload: {error}") from None
+
+
+class AdaptiveCompressor:
+    """
+    Compresses the segments of one connection and gives up on data that does not compress.
+
+    Each segment that does not shrink by MIN_SAVING is sent as it is and counts as a miss.
+    After ADAPT_MISSES misses in a row the next segments are sent without trying: ADAPT_SKIP
+    of them at first, twice as many each time the data still does not compress afterwards,
+    up to ADAPT_MAX_SKIP. A segment that compresses resets the backoff.
+    """
+
+    def __init__(self, codec_id):
+        self.codec_id = codec_id
+        self._compress = CODECS[codec_id].compress
+        self.misses = 0
+        self.skip = 0  # segments left to send without trying
+        self.backoff = ADAPT_SKIP
+
+    #returns the payload to send and whether it is compressed
+    def compress(self, payload):
+        if self.skip:
+            self.skip -= 1
+            if not self.skip:
+                self.misses = ADAPT_MISSES - 1  # one more miss and the next backoff starts
+            return payload, False
+        compressed = self._compress(payload)
+        if len(compressed) <= len(payload) * (1 - MIN_SAVING):
+            self.misses = 0
+            self.backoff = ADAPT_SKIP
+            return compressed, True
+        self.misses += 1
+        if self.misses >= ADAPT_MISSES:
+            self.misses = 0
+            self.skip = self.backoff
+            self.backoff = min(self.backoff * 2, ADAPT_MAX_SKIP)
+        return payload, False
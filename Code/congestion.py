@@ -0,0 +1,339 @@
+import collections
+
+SLOW_START = "SLOW_START"
+CONGESTION_AVOIDANCE = "CONGESTION_AVOIDANCE"
+FAST_RECOVERY = "FAST_RECOVERY"
+DUPLICATE_ACK_THRESHOLD = 3  # duplicate ACKs that trigger a fast retransmit
+
+
+class CongestionController:
+    """
+    Interface of a congestion control algorithm. Windows are in bytes.
+
+    The sender reports events and reads back `window` (bytes allowed in flight) and
+    `pacing_rate` (bytes per second, None when the algorithm does not pace):
+
+      on_ack(acked_bytes, rtt, now)      new data acknowledged outside recovery
+      enter_recovery(flight_bytes, now)  fast retransmit after DUPLICATE_ACK_THRESHOLD duplicate ACKs
+      on_duplicate_ack()                 another duplicate ACK during recovery
+      on_partial_ack(acked_bytes, now)   new data acknowledged during recovery, short of the
+                                         recovery point; returns True to stay in recovery and
+                                         retransmit the next hole, False to leave it
+      exit_recovery(now)                 everything outstanding at the loss was acknowledged
+      on_timeout(flight_bytes, now)      retransmission timer expired
+    """
+
+    name = "base"
+
+    def __init__(self, mss, max_window, initial_window=None):
+        self.mss = mss
+        self.max_window = max_window
+        self.cwnd = initial_window or mss
+        self.ssthresh = max_window
+        self.state = SLOW_START
+        self.pacing_rate = None
+
+    @property
+    def window(self):
+        return max(self.mss, min(int(self.cwnd), self.max_window))
+
+    @property
+    def in_recovery(self):
+        return self.state == FAST_RECOVERY
+
+    def on_ack(self, acked_bytes, rtt, now):
+        raise NotImplementedError
+
+    def enter_recovery(self, flight_bytes, now):
+        raise NotImplementedError
+
+    def on_duplicate_ack(self):
+        pass
+
+    def on_partial_ack(self, acked_bytes, now):
+        return False
+
+    def exit_recovery(self, now):
+        pass
+
+    def on_timeout(self, flight_bytes, now):
+        self.ssthresh = max(flight_bytes // 2, 2 * self.mss)
+        self.cwnd = self.mss
+        self.state = SLOW_START
+
+
+class Reno(CongestionController):
+    """
+    Slow start adds the acknowledged bytes (doubling once per RTT), congestion avoidance adds
+    about one MSS per RTT, and a fast retransmit halves the window. Reno leaves fast recovery
+    on the first ACK of new data.
+    """
+
+    name = "reno"
+
+    def on_ack(self, acked_bytes, rtt, now):
+        if self.state == SLOW_START:
+            self.cwnd += acked_bytes
+            if self.cwnd >= self.ssthresh:
+                self.state = CONGESTION_AVOIDANCE
+        else:
+            self.cwnd += self.mss * acked_bytes / self.cwnd
+        self.cwnd = min(self.cwnd, self.max_window)
+
+    def enter_recovery(self, flight_bytes, now):
+        self.ssthresh = max(flight_bytes // 2, 2 * self.mss)
+        self.cwnd = self.ssthresh + DUPLICATE_ACK_THRESHOLD * self.mss
+        self.state = FAST_RECOVERY
+
+    def on_duplicate_ack(self):
+        # every duplicate ACK means another segment left the network
+        self.cwnd = min(self.cwnd + self.mss, self.max_window)
+
+    def exit_recovery(self, now):
+        self.cwnd = self.ssthresh
+        self.state = CONGESTION_AVOIDANCE
+
+
+class NewReno(Reno):
+    """
+    Reno with RFC 6582 partial ACK handling: fast recovery lasts until everything that was
+    outstanding at the loss is acknowledged, and each partial ACK retransmits the next hole.
+    """
+
+    name = "newreno"
+
+    def on_partial_ack(self, acked_bytes, now):
+        # deflate by what was acknowledged, then allow one new segment
+        self.cwnd = max(self.cwnd - acked_bytes + self.mss, self.mss)
+        return True
+
+
+class Cubic(NewReno):
+    """
+    CUBIC (RFC 8312): after a loss the window grows along W(t) = C (t - K)^3 + W_max, in
+    segments, so it is flat around the previous maximum and probes quickly away from it.
+    The TCP friendly estimate keeps it at least as fast as Reno on short RTTs.
+    """
+
+    name = "cubic"
+    C = 0.4
+    BETA = 0.7
+
+    def __init__(self, mss, max_window, initial_window=None):
+        super().__init__(mss, max_window, initial_window)
+        self.w_max = 0.0  # segments
+        self.epoch_start = None
+        self.k = 0.0
+        self.w_est = 0.0  # segments
+
+    def on_ack(self, acked_bytes, rtt, now):
+        if self.state == SLOW_START:
+            super().on_ack(acked_bytes, rtt, now)
+            return
+        segments = self.cwnd / self.mss
+        if self.epoch_start is None:
+            self.epoch_start = now
+            if segments < self.w_max:
+                self.k = ((self.w_max - segments) / self.C) ** (1 / 3)
+            else:
+                self.k = 0.0
+                self.w_max = segments
+            self.w_est = segments
+        t = now - self.epoch_start + (rtt or 0.0)
+        target = self.C * (t - self.k) ** 3 + self.w_max
+        self.w_est += 3 * (1 - self.BETA) / (1 + self.BETA) * (acked_bytes / self.mss) / segments
+        target = max(target, self.w_est)
+        if target > segments:
+            segments += (target - segments) / segments * (acked_bytes / self.mss)
+        else:
+            segments += 0.01 * (acked_bytes / self.mss) / segments
+        self.cwnd = min(segments * self.mss, self.max_window)
+
+    def reduce(self):
+        segments = self.cwnd / self.mss
+        # fast convergence: give up bandwidth faster when the maximum keeps shrinking
+        self.w_max = segments * (1 + self.BETA) / 2 if segments < self.w_max else segments
+        self.epoch_start = None
+        return max(int(self.cwnd * self.BETA), 2 * self.mss)
+
+    def enter_recovery(self, flight_bytes, now):
+        self.ssthresh = self.reduce()
+        self.cwnd = self.ssthresh + DUPLICATE_ACK_THRESHOLD * self.mss
+        self.state = FAST_RECOVERY
+
+    def on_timeout(self, flight_bytes, now):
+        self.ssthresh = self.reduce()
+        self.cwnd = self.mss
+        self.state = SLOW_START
+
+
+class BbrLite(CongestionController):
+    """
+    Simplified rate based controller in the style of BBR.
+
+    It estimates the bottleneck bandwidth (the highest delivery rate over the last
+    BW_WINDOW_ROUNDS round trips) and the minimum RTT, paces at gain * bandwidth and caps
+    the data in flight at CWND_GAIN * bandwidth * min RTT. Startup paces at STARTUP_GAIN
+    times the estimate with at most the measured BDP in flight until the bandwidth stops
+    growing or a segment is lost, drain empties the queue startup built, and then probe
+    bandwidth cycles the pacing gain. When the minimum RTT has not been seen again for
+    MIN_RTT_WINDOW, probe RTT holds four segments in flight for PROBE_RTT_DURATION so the
+    queue drains and the minimum is measured afresh rather than taken from a queued sample.
+    Otherwise loss only matters on a timeout.
+
+    A round trip ends once the data that was in flight when it started is delivered, so
+    stalls do not age the model. Rate samples taken during recovery or across an ACK stall
+    are app-limited: they may raise the estimate but never expire older samples.
+    """
+
+    name = "bbr"
+    STARTUP_GAIN = 2.885
+    CWND_GAIN = 2.0
+    PROBE_GAINS = (1.25, 0.75, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0)
+    BW_WINDOW_ROUNDS = 10
+    MIN_RTT_WINDOW = 10.0  # seconds
+    PROBE_RTT_DURATION = 0.2  # seconds
+
+    STARTUP = "STARTUP"
+    DRAIN = "DRAIN"
+    PROBE_BW = "PROBE_BW"
+    PROBE_RTT = "PROBE_RTT"
+
+    def __init__(self, mss, max_window, initial_window=None):
+        super().__init__(mss, max_window, initial_window or 4 * mss)
+        self.state = self.STARTUP
+        self.delivered = 0
+        self.delivery_samples = collections.deque()  # (time, delivered bytes)
+        self.bw_samples = collections.deque()  # (round, delivery rate)
+        self.min_rtt = None
+        self.min_rtt_stamp = 0.0
+        self.probe_rtt_end = None
+        self.probe_min_rtt = float("inf")
+        self.prior_state = None  # state to return to after probe RTT
+        self.round = 0
+        self.next_round_delivered = 0  # delivered count that ends the current round
+        self.full_bw = 0.0
+        self.full_bw_rounds = 0
+        self.cycle_index = 0
+        self.cycle_start = 0.0
+
+    @property
+    def bandwidth(self):
+        return max((rate for _, rate in self.bw_samples), default=0.0)
+
+    def on_ack(self, acked_bytes, rtt, now):
+        self.update(acked_bytes, rtt, now, app_limited=False)
+
+    def update(self, acked_bytes, rtt, now, app_limited):
+        self.delivered += acked_bytes
+        if rtt is not None:
+            if self.state == self.PROBE_RTT:
+                self.probe_min_rtt = min(self.probe_min_rtt, rtt)
+            elif self.min_rtt is None or rtt <= self.min_rtt:
+                self.min_rtt = rtt
+                self.min_rtt_stamp = now
+        if self.min_rtt is None:
+            return
+        self.check_probe_rtt(now)
+
+        # delivery rate over roughly the last round trip
+        self.delivery_samples.append((now, self.delivered))
+        while len(self.delivery_samples) > 2 and now - self.delivery_samples[1][0] >= self.min_rtt:
+            self.delivery_samples.popleft()
+        start_time, start_delivered = self.delivery_samples[0]
+        if now > start_time:
+            rate = (self.delivered - start_delivered) / (now - start_time)
+            # an interval spanning a stall in the ACKs says nothing about the bottleneck
+            app_limited = app_limited or now - start_time > 2 * self.min_rtt
+            if not app_limited or rate > self.bandwidth:
+                self.bw_samples.append((self.round, rate))
+
+        if self.delivered >= self.next_round_delivered:
+            self.round += 1
+            # the round ends when what may be in flight now has been delivered too
+            in_flight = self.window
+            if self.pacing_rate:
+                in_flight = min(in_flight, self.pacing_rate * self.min_rtt)
+            self.next_round_delivered = self.delivered + max(in_flight, self.mss)
+            self.end_of_round(now)
+        if not app_limited:
+            while self.bw_samples and self.bw_samples[0][0] < self.round - self.BW_WINDOW_ROUNDS:
+                self.bw_samples.popleft()
+        self.update_model(now)
+
+    def check_probe_rtt(self, now):
+        if self.state == self.PROBE_RTT:
+            if now >= self.probe_rtt_end:
+                # the queue has drained, so the probe's lowest sample replaces the stale minimum
+                if self.probe_min_rtt < float("inf"):
+                    self.min_rtt = self.probe_min_rtt
+                self.min_rtt_stamp = now
+                self.state = self.prior_state
+                self.cycle_index = 0
+        elif now - self.min_rtt_stamp > self.MIN_RTT_WINDOW:
+            self.prior_state = self.state
+            self.state = self.PROBE_RTT
+            self.probe_rtt_end = now + self.PROBE_RTT_DURATION
+            self.probe_min_rtt = float("inf")
+
+    def end_of_round(self, now):
+        bandwidth = self.bandwidth
+        if self.state == self.STARTUP:
+            # the pipe is full once three rounds in a row grow the bandwidth by less than 25%
+            if bandwidth >= self.full_bw * 1.25:
+                self.full_bw = bandwidth
+                self.full_bw_rounds = 0
+            else:
+                self.full_bw_rounds += 1
+                if self.full_bw_rounds >= 3:
+                    self.state = self.DRAIN
+        elif self.state == self.DRAIN:
+            self.state = self.PROBE_BW
+            self.cycle_index = 0
+            self.cycle_start = now
+        elif self.state == self.PROBE_BW:
+            self.cycle_index = (self.cycle_index + 1) % len(self.PROBE_GAINS)
+
+    def update_model(self, now):
+        bandwidth = self.bandwidth
+        if bandwidth <= 0:
+            return
+        if self.state == self.STARTUP:
+            # ACK spacing already shows the bottleneck rate, so more than the measured BDP in
+            # flight would only fill the queue
+            pacing_gain, cwnd_gain = self.STARTUP_GAIN, 1.0
+        elif self.state == self.DRAIN:
+            pacing_gain, cwnd_gain = 1 / self.STARTUP_GAIN, self.CWND_GAIN
+        elif self.state == self.PROBE_RTT:
+            pacing_gain, cwnd_gain = 1.0, 0.0  # the floor of four segments
+        else:
+            pacing_gain, cwnd_gain = self.PROBE_GAINS[self.cycle_index], self.CWND_GAIN
+        bdp = bandwidth * self.min_rtt
+        self.pacing_rate = pacing_gain * bandwidth
+        self.cwnd = min(max(cwnd_gain * bdp, 4 * self.mss), self.max_window)
+
+    def enter_recovery(self, flight_bytes, now):
+        # the model, not loss, sets the rate; holes are simply retransmitted. Loss in startup
+        # means the queue is already full, so it ends startup at once instead of after three
+        # more rounds of overflowing it
+        if self.state == self.STARTUP and self.bandwidth > 0:
+            self.state = self.DRAIN
+            self.update_model(now)
+
+    def on_partial_ack(self, acked_bytes, now):
+        self.update(acked_bytes, None, now, app_limited=True)
+        return True
+
+    def on_timeout(self, flight_bytes, now):
+        # restart from one segment; the next ACK rebuilds the window from the kept model
+        self.cwnd = self.mss
+
+
+CONTROLLERS = {controller.name: controller for controller in (Reno, NewReno, Cubic, BbrLite)}
+
+
+def make_controller(name, mss, max_window, initial_window=None):
+    try:
+        return CONTROLLERS[name](mss, max_window, initial_window)
+    except KeyError:
+        raise ValueError(f"Unknown congestion control {name!r}, expected one of {sorted(CONTROLLERS)}") from None
@@ -0,0 +1,298 @@
+import sys
+from congestion import CONTROLLERS, make_controller, DUPLICATE_ACK_THRESHOLD
+from rtt import RttEstimator
+from timers import TimerHeap
+
+# usage: python congestion_sim.py [number of competing flows] [simulated seconds]
+# Deterministic simulation of flows sharing one bottleneck link: no sockets and no wall clock,
+# so the same parameters always give the same numbers.
+MSS = 1448
+LINK_RATE = 1_250_000  # bytes per second at the bottleneck (10 Mbit/s)
+BASE_RTT = 0.04  # seconds of propagation delay, there and back
+BUFFER_BDP = 1.0  # bottleneck buffer, in bandwidth-delay products
+MAX_WINDOW = 4 * 1024 * 1024  # large enough that only the network limits the window
+FLOWS = 4
+DURATION = 30.0  # simulated seconds
+START_SPACING = 0.5  # seconds between the starts of consecutive flows
+
+
+class Simulation:
+    """
+    Event loop in virtual time, built on TimerHeap with explicit deadlines.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.events = TimerHeap()
+
+    def at(self, deadline, callback, key=None):
+        self.events.schedule(deadline, callback, key)
+
+    def after(self, delay, callback, key=None):
+        self.events.schedule(self.now + delay, callback, key)
+
+    def cancel(self, key):
+        self.events.cancel(key)
+
+    def run(self, until):
+        while True:
+            deadline = self.events.next_deadline()
+            if deadline is None or deadline > until:
+                break
+            self.now = deadline
+            self.events.run_expired(deadline)
+        self.now = until
+
+
+class Bottleneck:
+    """
+    Drop-tail FIFO in front of a link of `rate` bytes per second. Packets leaving the link
+    reach their flow after half the base RTT; ACKs travel back uncongested.
+    """
+
+    def __init__(self, sim, rate, buffer_bytes, base_rtt):
+        self.sim = sim
+        self.rate = rate
+        self.buffer_bytes = buffer_bytes
+        self.one_way = base_rtt / 2
+        self.queue_bytes = 0
+        self.busy_until = 0.0
+        self.drops = 0
+
+    def enqueue(self, flow, index, sent_at):
+        if self.queue_bytes + MSS > self.buffer_bytes:
+            self.drops += 1
+            flow.drops += 1
+            return
+        self.queue_bytes += MSS
+        self.busy_until = max(self.busy_until, self.sim.now) + MSS / self.rate
+        self.sim.at(self.busy_until, lambda: self.dequeue(flow, index, sent_at))
+
+    def dequeue(self, flow, index, sent_at):
+        self.queue_bytes -= MSS
+        self.sim.after(self.one_way, lambda: flow.receive(index, sent_at))
+
+
+class Flow:
+    """
+    Bulk sender and receiver of one connection, with segments counted by index.
+
+    The receiver sends a cumulative ACK (the next index it expects) per segment and echoes
+    the send time of the segment that triggered it, like the timestamp option, so every ACK
+    of new data gives an unambiguous RTT sample. Each ACK also names the segment that
+    triggered it, so the sender knows which segments above the cumulative ACK arrived, as
+    SACK blocks tell it. The sender follows the same rules as SendWindow in sender.py:
+    fast retransmit after DUPLICATE_ACK_THRESHOLD duplicate ACKs and partial ACK handling
+    left to the controller. A timeout marks lost only the segments that were out for a
+    whole RTO without being acknowledged or SACKed, as the sender's per-segment timers
+    would, and resends them ahead of new data as the window allows (RFC 6675).
+    Retransmissions therefore track the drops instead of whole windows.
+    """
+
+    def __init__(self, sim, link, name, controller, start):
+        self.sim = sim
+        self.link = link
+        self.name = name
+        self.controller = controller
+        self.start = start
+        self.rtt = RttEstimator()
+        self.snd_una = 0  # oldest unacknowledged segment
+        self.next_index = 0  # next segment never sent
+        self.highest_sent = -1  # anything at or below it that is sent again is a retransmission
+        self.duplicate_acks = 0
+        self.recovery_point = None
+        self.timeout_point = -1  # highest segment sent when the timer last expired
+        self.sacked = set()  # segments above snd_una the receiver has
+        self.lost = set()  # segments a timeout gave up on, waiting to be sent again
+        self.sent_at = {}  # segment -> when it was last sent
+        self.next_send_time = 0.0  # earliest time pacing allows the next segment
+        self.send_pending = False
+        # receiver side
+        self.expected = 0
+        self.out_of_order = set()
+        self.delivered_bytes = 0
+        self.drops = 0
+        self.retransmissions = 0
+        sim.at(start, self.try_send)
+
+    @property
+    def flight_bytes(self):
+        outstanding = self.next_index - self.snd_una - len(self.lost)
+        if not self.controller.in_recovery:
+            outstanding -= len(self.sacked)  # Reno-style fast recovery inflates the window for these
+        return outstanding * MSS
+
+    def transmit(self, index):
+        if index <= self.highest_sent:
+            self.retransmissions += 1
+        self.highest_sent = max(self.highest_sent, index)
+        self.lost.discard(index)
+        self.sent_at[index] = self.sim.now
+        if self.controller.pacing_rate:
+            self.next_send_time = max(self.next_send_time, self.sim.now) + MSS / self.controller.pacing_rate
+        if ("rto", self.name) not in self.sim.events:
+            self.arm_timer()
+        self.link.enqueue(self, index, self.sim.now)
+
+    def arm_timer(self):
+        self.sim.after(self.rtt.timeout, self.on_timeout, key=("rto", self.name))
+
+    #sends while the window has room; with pacing, waits for the next slot instead of bursting
+    def try_send(self):
+        if self.send_pending:
+            return
+        while self.flight_bytes + MSS <= self.controller.window:
+            if self.controller.pacing_rate and self.next_send_time > self.sim.now:
+                self.send_pending = True
+                self.sim.at(self.next_send_time, self.paced_send, key=("pace", self.name))
+                return
+            if self.lost:
+                self.transmit(min(self.lost))
+            else:
+                self.transmit(self.next_index)
+                self.next_index += 1
+
+    def paced_send(self):
+        self.send_pending = False
+        self.try_send()
+
+    def receive(self, index, sent_at):
+        if index == self.expected:
+            self.expected += 1
+            self.delivered_bytes += MSS
+            while self.expected in self.out_of_order:
+                self.out_of_order.remove(self.expected)
+                self.expected += 1
+                self.delivered_bytes += MSS
+        elif index > self.expected:
+            self.out_of_order.add(index)
+        ack = self.expected
+        self.sim.after(self.link.one_way, lambda: self.on_ack(ack, sent_at, index))
+
+    #received: the segment that triggered the ACK; above ack it is SACKed, as new data
+    def on_ack(self, ack, echoed, received):
+        now = self.sim.now
+        newly_sacked = received > ack and received not in self.sacked
+        if newly_sacked:
+            self.sacked.add(received)
+            self.lost.discard(received)  # a late original arrived after all
+        if ack <= self.snd_una:
+            if self.next_index > self.snd_una:
+                self.on_duplicate_ack(now)
+            if newly_sacked:
+                self.rtt.sample(now - echoed)
+                if self.recovery_point is None:
+                    self.controller.on_ack(MSS, self.rtt.srtt, now)
+            self.try_send()
+            return
+        acked_bytes = MSS if newly_sacked else 0
+        for index in range(self.snd_una, ack):
+            self.lost.discard(index)
+            self.sent_at.pop(index, None)
+            if index in self.sacked:
+                self.sacked.remove(index)  # counted when its SACK arrived
+            else:
+                acked_bytes += MSS
+        self.rtt.sample(now - echoed)
+        self.snd_una = ack
+        self.next_index = max(self.next_index, ack)
+        self.duplicate_acks = 0
+
+        if self.recovery_point is None:
+            self.controller.on_ack(acked_bytes, self.rtt.srtt, now)
+        elif self.snd_una > self.recovery_point:
+            self.recovery_point = None
+            self.controller.exit_recovery(now)
+        elif self.controller.on_partial_ack(acked_bytes, now):
+            self.transmit(self.snd_una)
+        else:
+            self.recovery_point = None
+            self.controller.exit_recovery(now)
+
+        if self.next_index > self.snd_una:
+            self.arm_timer()
+        else:
+            self.sim.cancel(("rto", self.name))
+        self.try_send()
+
+    def on_duplicate_ack(self, now):
+        self.duplicate_acks += 1
+        if self.recovery_point is not None:
+            self.controller.on_duplicate_ack()
+        elif self.duplicate_acks == DUPLICATE_ACK_THRESHOLD and self.snd_una > self.timeout_point:
+            # RFC 6582: duplicate ACKs for data sent before a timeout are not a new loss
+            self.recovery_point = self.next_index - 1
+            self.controller.enter_recovery(self.flight_bytes, now)
+            self.transmit(self.snd_una)
+
+    def on_timeout(self):
+        now = self.sim.now
+        timeout = self.rtt.timeout
+        self.rtt.backoff()
+        self.controller.on_timeout(self.flight_bytes, now)
+        self.recovery_point = None
+        self.timeout_point = self.next_index - 1
+        self.duplicate_acks = 0
+        # newer segments may still be on their way; try_send() resends the lost ones first
+        for index in range(self.snd_una, self.next_index):
+            if index not in self.sacked and now - self.sent_at[index] >= timeout:
+                self.lost.add(index)
+        self.arm_timer()
+        self.try_send()
+
+
+#Jain's fairness index: 1 when every flow gets the same throughput, 1/n when one flow gets everything
+def jain_index(throughputs):
+    total = sum(throughputs)
+    squares = sum(x * x for x in throughputs)
+    return total * total / (len(throughputs) * squares) if squares else 0.0
+
+
+#runs `algorithms` (one name per flow) over one bottleneck and returns per-flow results
+def simulate(algorithms, duration=DURATION, rate=LINK_RATE, base_rtt=BASE_RTT, buffer_bdp=BUFFER_BDP,
+             start_spacing=START_SPACING):
+    sim = Simulation()
+    link = Bottleneck(sim, rate, max(int(rate * base_rtt * buffer_bdp), 2 * MSS), base_rtt)
+    flows = [
+        Flow(sim, link, i, make_controller(name, MSS, MAX_WINDOW), i * start_spacing)
+        for i, name in enumerate(algorithms)
+    ]
+    sim.run(duration)
+    results = []
+    for flow in flows:
+        active = duration - flow.start
+        results.append({
+            "algorithm": flow.controller.name,
+            "delivered": flow.delivered_bytes,
+            "throughput": flow.delivered_bytes / active if active > 0 else 0.0,
+            "drops": flow.drops,
+            "retransmissions": flow.retransmissions,
+            "srtt": flow.rtt.srtt,
+        })
+    return results
+
+
+#share of the link's capacity over the whole run that carried data; per-flow throughputs are
+#over each flow's own active time, so their sum overstates it when flows start late
+def utilization(results, duration, rate=LINK_RATE):
+    return sum(result["delivered"] for result in results) / (rate * duration)
+
+
+def report(title, results, duration, rate=LINK_RATE):
+    throughputs = [result["throughput"] for result in results]
+    print(title)
+    for i, result in enumerate(results):
+        srtt = f"{result['srtt'] * 1000:.1f} ms" if result["srtt"] is not None else "-"
+        print(f"  flow {i} {result['algorithm']:>8}: {result['throughput'] / 1e3:9.1f} kB/s"
+              f"  drops {result['drops']:5}  retransmissions {result['retransmissions']:5}  srtt {srtt}")
+    print(f"  utilization {utilization(results, duration, rate):.1%}  Jain fairness {jain_index(throughputs):.3f}")
+
+
+if __name__ == "__main__":
+    flows = int(sys.argv[1]) if len(sys.argv) > 1 else FLOWS
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else DURATION
+    for name in CONTROLLERS:
+        report(f"{name}, 1 flow", simulate([name], duration), duration)
+        if flows > 1:
+            report(f"{name}, {flows} flows", simulate([name] * flows, duration), duration)
+    report("mixed", simulate(list(CONTROLLERS), duration), duration)
@@ -1,8 +1,144 @@
+import sys
 import zlib
 import struct
+from array import array
+
+# Wire formats. The binary format is the default; the comma separated text format is
+# kept as a legacy mode and is negotiated by the format the SYN is sent in.
+WIRE_BINARY = "binary"
+WIRE_TEXT = "text"
+
+# Binary layout (network byte order, fixed offsets):
+#   version(1) flags(1) options_length(1) pad(1) source_port(2) dest_port(2)
+#   seq_num(4) ack_num(4) sending_window(2) mss(2) checksum(2) payload_length(2)
+# followed by options_length bytes of options and payload_length bytes of payload.
+# Options are kind(1) length(1) value(length) entries; the legacy text format has none.
+# The checksum covers every other byte of the datagram: the fields both formats have (see
+# calculateChecksum) plus the words only this layout has (see layout_sum).
+BINARY_VERSION = 3
+HEADER_STRUCT = struct.Struct("!BBBxHHIIHHHH")
+HEADER_SIZE = HEADER_STRUCT.size
+
+# Largest datagram/segment that fits the path without IP fragmentation
+PATH_MTU = 1500
+IP_UDP_OVERHEAD = 28  # IPv4 (20) + UDP (8)
+MAX_DATAGRAM_SIZE = PATH_MTU - IP_UDP_OVERHEAD
+MAX_MSS = MAX_DATAGRAM_SIZE - HEADER_SIZE
+MAX_OPTIONS_SIZE = 255  # options_length is one byte; also covers the longest text header
+
+# Flag bits (same values as the packed flags field of the text format)
+FLAG_FIN = 0x01
+FLAG_ACK = 0x02
+FLAG_SYN = 0x04
+
+# Option kinds
+OPT_SELECTIVE_REPEAT = 1  # SYN/SYN-ACK: use Selective Repeat instead of Go-Back-N
+OPT_SACK_PERMITTED = 2  # SYN/SYN-ACK: the peer understands SACK blocks
+OPT_SACK = 3  # ACK: ranges [start, end) of sequence numbers received above the cumulative ACK
+
+OPT_TIMESTAMP = 4  # SYN/SYN-ACK: timestamps permitted; data/ACK: TSval and TSecr (microseconds, 32 bits)
+OPT_DIGEST = 5  # FIN: SHA-256 of the whole transferred file, checked by the receiver
+OPT_WINDOW_SCALE = 6  # SYN/SYN-ACK: shift (1 byte) applied to every later sending_window of the sender of the option
+OPT_RANGE = 7  # SYN: the data is one range of a file sent over parallel connections; SYN-ACK: accepted (empty)
+OPT_FAST_OPEN = 8  # SYN: the payload is the first data segment; SYN-ACK: it was accepted (both empty)
+OPT_COMPRESSION = 9  # SYN: codec ids offered (compression.py), preferred first; SYN-ACK: the one chosen; data: the payload is compressed with it (empty)
+OPT_RESUME = 10  # SYN: key of the file (checkpoint.py), offering to resume it; SYN-ACK: offset (8 bytes) to resume from, 0 for the start
+
+SACK_BLOCK = struct.Struct("!II")
+TIMESTAMP = struct.Struct("!II")
+RANGE = struct.Struct("!IQQ")  # transfer id, offset of the range in the file, size of the whole file
+SACK_MAX_BLOCKS = 4
+MAX_WINDOW = 0xFFFF  # largest sending_window the field holds
+MAX_WINDOW_SCALE = 14  # as in TCP, keeps scaled windows below 2**30
+
+
+def sum16(data):
+    """
+    Sums data as big-endian 16-bit words modulo 2^16 (an odd trailing byte is
+    padded with zero). Same arithmetic as calculateChecksumReference(), done in bulk.
+
+    The protocol's checksum is this plain sum, complemented: carries out of bit 15 are
+    dropped, not folded back in as in the Internet checksum (RFC 1071). Every fast path
+    (sum16, update_checksum, SegmentView) keeps to that, so they match the reference.
+    """
+    view = memoryview(data).cast("B")
+    even = len(view) & ~1
+    words = array("H")
+    words.frombytes(view[:even])
+    if sys.byteorder == "little":
+        words.byteswap()
+    total = sum(words)
+    if even != len(view):
+        total += view[even] << 8
+    return total & 0xFFFF
+
+
+def update_checksum(checksum, old_word, new_word):
+    # RFC 1624 style incremental update for a single 16-bit word: HC' = ~(~HC - m + m'),
+    # modulo 2^16 without end-around carry like the checksum itself (see sum16)
+    return ~((~checksum & 0xFFFF) - old_word + new_word) & 0xFFFF
+
+
+def layout_sum(version, flags, options_length, pad, payload_length):
+    """
+    Sum of the binary layout's words that the text format does not have: version and the
+    flags bits above SYN/ACK/FIN (header_sum() counts those three), options_length with
+    the pad byte, and payload_length. Added to the checksum of a header when it is sent in
+    the binary format, so a bit flipped in any of them is caught as well.
+    """
+    return (version << 8) + (flags & ~(FLAG_SYN | FLAG_ACK | FLAG_FIN)) + (options_length << 8) + pad + payload_length
+
+
+def datagram_size(mss):
+    # largest datagram a peer with this MSS can send, i.e. the receive buffer it needs
+    return HEADER_SIZE + MAX_OPTIONS_SIZE + mss
+
+
+def window_scale_for(buffer_size):
+    # smallest shift that lets a window of buffer_size bytes fit the 16-bit field
+    shift = 0
+    while buffer_size >> shift > MAX_WINDOW and shift < MAX_WINDOW_SCALE:
+        shift += 1
+    return shift
+
+
+def encode_options(options):
+    return b"".join(bytes((kind, len(value))) + bytes(value) for kind, value in options.items())
+
+
+def decode_options(data):
+    options = {}
+    i = 0
+    while i + 2 <= len(data):
+        kind, length = data[i], data[i + 1]
+        options[kind] = bytes(data[i + 2:i + 2 + length])
+        i += 2 + length
+    return options
+
+
+def encode_sack_blocks(blocks):
+    return b"".join(SACK_BLOCK.pack(start & 0xFFFFFFFF, end & 0xFFFFFFFF) for start, end in blocks[:SACK_MAX_BLOCKS])
+
+
+def decode_sack_blocks(value):
+    return [SACK_BLOCK.unpack_from(value, i) for i in range(0, len(value) - SACK_BLOCK.size + 1, SACK_BLOCK.size)]
+
+
+def encode_timestamp(tsval, tsecr=0):
+    return TIMESTAMP.pack(tsval & 0xFFFFFFFF, tsecr & 0xFFFFFFFF)
+
+
+def encode_range(transfer_id, offset, total_size):
+    return RANGE.pack(transfer_id & 0xFFFFFFFF, offset, total_size)
+
+
+def _split32(value):
+    # a 32-bit field as the two 16-bit words the checksum covers
+    return (value >> 16) & 0xFFFF, value & 0xFFFF
+
 
 class ReliableTransportLayerProtocolHeader:
-    def __init__(self, source_port_num, dest_port_num, seq_num, ack_num, sending_window, mss, syn=False, ack=False, fin=False, app_data=""):
+    def __init__(self, source_port_num, dest_port_num, seq_num, ack_num, sending_window, mss, syn=False, ack=False, fin=False, app_data="", options=None):
         self.syn = syn
         self.ack = ack
         self.fin = fin
@@ -11,11 +147,104 @@ class ReliableTransportLayerProtocolHeader:
         self.seq_num = seq_num
         self.ack_num = ack_num
         self.sending_window = sending_window
-        self.app_data = app_data
+        self.app_data = app_data  # str or any bytes-like object (memoryview when decoded)
+        self._payload_sum = None  # (app_data, sum16 of its bytes), reused by every checksum pass
         self.mss = mss
+        self.options = dict(options) if options else {}  # option kind -> value bytes
+        self._encoded_options = (b"", 0)  # (options as sent, their sum16), set by calculateChecksum()
+        self.wire_format = WIRE_BINARY  # format the header was decoded from
         self.checksum = self.calculateChecksum()
 
+    @property
+    def payload(self):
+        # app_data as bytes-like, without copying when it already is one
+        if isinstance(self.app_data, str):
+            return self.app_data.encode()
+        return self.app_data
+
+    @property
+    def payload_length(self):
+        return len(self.payload)
+
+    @property
+    def sack_blocks(self):
+        value = self.options.get(OPT_SACK)
+        return decode_sack_blocks(value) if value else []
+
+    @property
+    def timestamp(self):
+        # (TSval, TSecr) carried by the timestamp option, None when absent
+        value = self.options.get(OPT_TIMESTAMP)
+        return TIMESTAMP.unpack(value) if value and len(value) == TIMESTAMP.size else None
+
+    @property
+    def data_range(self):
+        # (transfer id, offset, total size) carried by the range option, None when absent
+        value = self.options.get(OPT_RANGE)
+        return RANGE.unpack(value) if value and len(value) == RANGE.size else None
+
+    @property
+    def flags(self):
+        return (int(self.syn) << 2 | int(self.ack) << 1 | int(self.fin)) & 0xFF
+
+    def header_sum(self):
+        # sum of the header words covered by the checksum (see calculateChecksumReference)
+        return (
+            (self.source_port_num & 0xFFFF)
+            + (self.dest_port_num & 0xFFFF)
+            + ((self.seq_num >> 16) & 0xFFFF) + (self.seq_num & 0xFFFF)
+            + ((self.ack_num >> 16) & 0xFFFF) + (self.ack_num & 0xFFFF)
+            + (self.sending_window & 0xFFFF)
+            + (self.mss & 0xFFFF)
+            + self.flags
+        )
+
+    def payload_sum(self):
+        # the payload never changes once a header is built, so it is summed only once
+        cached = self._payload_sum
+        if cached is None or cached[0] is not self.app_data:
+            cached = (self.app_data, sum16(self.payload))
+            self._payload_sum = cached
+        return cached[1]
+
+    def encode_options(self):
+        # options never change once a header is built, except through update_fields()
+        encoded = encode_options(self.options) if self.options else b""
+        self._encoded_options = (encoded, sum16(encoded) if encoded else 0)
+        return self._encoded_options
+
     def calculateChecksum(self):
+        options_sum = self.encode_options()[1]
+        return ~(self.header_sum() + options_sum + self.payload_sum()) & 0xFFFF
+
+    def update_fields(self, seq_num=None, ack_num=None, sending_window=None, options=None):
+        """
+        Changes seq_num, ack_num, sending_window and/or the options and patches the
+        checksum incrementally, without another pass over the payload (used when
+        resending a header, and by the receiver's reused ACK header).
+        """
+        # the checksum is a plain sum, so the changed words can be swapped out in one step
+        old_sum = new_sum = 0
+        if seq_num is not None:
+            old_sum += sum(_split32(self.seq_num))
+            new_sum += sum(_split32(seq_num))
+            self.seq_num = seq_num
+        if ack_num is not None:
+            old_sum += sum(_split32(self.ack_num))
+            new_sum += sum(_split32(ack_num))
+            self.ack_num = ack_num
+        if sending_window is not None:
+            old_sum += self.sending_window & 0xFFFF
+            new_sum += sending_window & 0xFFFF
+            self.sending_window = sending_window
+        if options is not None:
+            old_sum += self._encoded_options[1]
+            self.options = dict(options)
+            new_sum += self.encode_options()[1]
+        self.checksum = update_checksum(self.checksum, old_sum, new_sum)
+
+    def calculateChecksumReference(self):
+        # Original word-by-word implementation, kept as the reference for calculateChecksum()
         # Convert all fields to 16-bit values (truncate or split as necessary)
         fields = [
             self.source_port_num & 0xFFFF,
@@ -32,15 +261,9 @@ class ReliableTransportLayerProtocolHeader:
         def wraparound_add(val1, val2):
             return (val1 + val2) & 0xFFFF
 
-        # Include application data as 16-bit chunks
-        app_data_bytes = self.app_data.encode()  # Convert string to bytes
-        for i in range(0, len(app_data_bytes), 2):
-            if i + 1 < len(app_data_bytes):
-                # Combine two bytes into a 16-bit value
-                fields.append((app_data_bytes[i] << 8) + app_data_bytes[i + 1])
-            else:
-                # Add padding if app_data length is odd
-                fields.append(app_data_bytes[i] << 8)
+        # Include options and then application data as 16-bit chunks
+        for chunk in (encode_options(self.options), self.payload):
+            fields.extend(self._words_reference(chunk))
 
         # Calculate the sum of all fields with wraparound
         checksum = 0
@@ -52,17 +275,102 @@ class ReliableTransportLayerProtocolHeader:
 
         return checksum
 
-    def to_bytes(self):
-        # Combine all fields into a single byte stream
+    @staticmethod
+    def _words_reference(app_data_bytes):
+        fields = []
+        for i in range(0, len(app_data_bytes), 2):
+            if i + 1 < len(app_data_bytes):
+                # Combine two bytes into a 16-bit value
+                fields.append((app_data_bytes[i] << 8) + app_data_bytes[i + 1])
+            else:
+                # Add padding if app_data length is odd
+                fields.append(app_data_bytes[i] << 8)
+        return fields
+
+    def to_bytes(self, wire_format=WIRE_BINARY):
+        return b"".join(self.to_buffers(wire_format))
+
+    def to_buffers(self, wire_format=WIRE_BINARY):
+        # [header with options, payload]: lets sendmsg() gather the datagram without copying the payload
+        if wire_format == WIRE_TEXT:
+            return self.to_text_buffers()
+
+        payload = self.payload
+        options = self._encoded_options[0]
+        checksum = update_checksum(self.checksum, 0, layout_sum(BINARY_VERSION, 0, len(options), 0, len(payload)))
+        header = HEADER_STRUCT.pack(
+            BINARY_VERSION,
+            self.flags,
+            len(options),
+            self.source_port_num & 0xFFFF,
+            self.dest_port_num & 0xFFFF,
+            self.seq_num & 0xFFFFFFFF,
+            self.ack_num & 0xFFFFFFFF,
+            self.sending_window & 0xFFFF,
+            self.mss & 0xFFFF,
+            checksum,
+            len(payload),
+        )
+        return [header + options, payload]
+
+    def to_text_bytes(self):
+        return b"".join(self.to_text_buffers())
+
+    def to_text_buffers(self):
+        # Legacy format: comma separated fields, a '|' and then the raw payload
+        if self.options:
+            raise ValueError("Header options cannot be sent in the text wire format")
         flags = self.syn << 2 | self.ack << 1 | self.fin  # a single byte to represent all flags
-        header = f"{self.source_port_num},{self.dest_port_num},{self.seq_num},{self.ack_num},{self.sending_window},{self.mss},{flags},{self.checksum}|{self.app_data}"
-        return header.encode('utf-8')
+        header = f"{self.source_port_num},{self.dest_port_num},{self.seq_num},{self.ack_num},{self.sending_window},{self.mss},{flags},{self.checksum}|"
+        return [header.encode('utf-8'), self.payload]
 
     @staticmethod
     def from_bytes(data):
-        # Decode the byte stream back to the header and payload
-        decoded_header = data.decode('utf-8')
-        header, payload = decoded_header.split('|')
+        # The first byte tells the formats apart: text headers start with an ASCII digit
+        if data[:1] == bytes((BINARY_VERSION,)):
+            return ReliableTransportLayerProtocolHeader.from_binary_bytes(data)
+        return ReliableTransportLayerProtocolHeader.from_text_bytes(data)
+
+    @staticmethod
+    def from_binary_bytes(data):
+        view = memoryview(data)
+        if len(view) < HEADER_SIZE:
+            raise ValueError(f"Datagram too short for header: {len(view)} bytes")
+        (version, flags, options_length, source_port_num, dest_port_num, seq_num, ack_num,
+         sending_window, mss, checksum, payload_length) = HEADER_STRUCT.unpack_from(view)
+        if version != BINARY_VERSION:
+            raise ValueError(f"Unsupported header version {version}")
+
+        start = HEADER_SIZE + options_length
+        payload = view[start:start + payload_length]  # zero-copy slice of the datagram
+        if len(payload) != payload_length:
+            raise ValueError("Truncated payload")
+
+        header = ReliableTransportLayerProtocolHeader(
+            source_port_num=source_port_num,
+            dest_port_num=dest_port_num,
+            seq_num=seq_num,
+            ack_num=ack_num,
+            sending_window=sending_window,
+            mss=mss,
+            syn=(flags & FLAG_SYN) >> 2,
+            ack=(flags & FLAG_ACK) >> 1,
+            fin=flags & FLAG_FIN,
+            app_data=payload,
+            options=decode_options(view[HEADER_SIZE:start]) if options_length else None,
+        )
+        # keep the checksum that was sent, less the layout words, so verify_checksum() can detect corruption
+        header.checksum = update_checksum(checksum, layout_sum(version, flags, options_length, view[3], payload_length), 0)
+        return header
+
+    @staticmethod
+    def from_text_bytes(data):
+        # Split on the first '|' only, so payloads may contain '|' themselves
+        data = bytes(data)
+        separator = data.find(b'|')
+        if separator < 0:
+            raise ValueError("Missing header separator")
+        header, payload = data[:separator].decode('utf-8'), memoryview(data)[separator + 1:]
 
         # Extract all header fields, separated by commas
         source_port_num, dest_port_num, seq_num, ack_num, sending_window, mss, flags, checksum = map(int, header.split(','))
@@ -71,7 +379,7 @@ class ReliableTransportLayerProtocolHeader:
         syn, ack, fin = (flags & 4) >> 2, (flags & 2) >> 1, (flags & 1)
 
         # Create a new header and return it
-        return ReliableTransportLayerProtocolHeader(
+        header = ReliableTransportLayerProtocolHeader(
             source_port_num=source_port_num,
             dest_port_num=dest_port_num,
             seq_num=seq_num,
@@ -83,7 +391,81 @@ class ReliableTransportLayerProtocolHeader:
             fin=fin,
             app_data=payload,
         )
-    
+        header.checksum = checksum
+        header.wire_format = WIRE_TEXT
+        return header
+
     def verify_checksum(self):
         calculated_checksum = self.calculateChecksum()
         return calculated_checksum == self.checksum
+
+
+class SegmentView:
+    """
+    Read-only view of a received binary datagram, used on the receive paths instead of
+    a full header object.
+
+    The fixed fields are unpacked with one struct call. The options are decoded, the
+    payload sliced and the checksum verified only when asked for, each at most once, so
+    a segment that the sequence number alone rules out (see ReceiverConnection.redundant)
+    costs neither a checksum pass nor a copy. The view points into the datagram: options
+    and payload must be read while its buffer still holds it.
+    """
+
+    __slots__ = ("_view", "_options_end", "_options", "_verified", "flags", "syn", "ack", "fin",
+                 "source_port_num", "dest_port_num", "seq_num", "ack_num", "sending_window", "mss",
+                 "checksum", "payload_length")
+
+    wire_format = WIRE_BINARY
+
+    def __init__(self, data):
+        view = memoryview(data)
+        if len(view) < HEADER_SIZE:
+            raise ValueError(f"Datagram too short for header: {len(view)} bytes")
+        (version, flags, options_length, self.source_port_num, self.dest_port_num, self.seq_num, self.ack_num,
+         self.sending_window, self.mss, checksum, self.payload_length) = HEADER_STRUCT.unpack_from(view)
+        if version != BINARY_VERSION:
+            raise ValueError(f"Unsupported header version {version}")
+        # the checksum that was sent, less the layout words, as in from_binary_bytes()
+        self.checksum = update_checksum(checksum, layout_sum(version, flags, options_length, view[3], self.payload_length), 0)
+        self._options_end = HEADER_SIZE + options_length
+        if len(view) < self._options_end + self.payload_length:
+            raise ValueError("Truncated payload")
+        self.flags = flags & (FLAG_SYN | FLAG_ACK | FLAG_FIN)
+        self.syn = (flags & FLAG_SYN) >> 2
+        self.ack = (flags & FLAG_ACK) >> 1
+        self.fin = flags & FLAG_FIN
+        self._view = view
+        self._options = None
+        self._verified = None
+
+    @staticmethod
+    def from_bytes(data):
+        # a view of a binary datagram, a full header for the legacy text format
+        if data[:1] == bytes((BINARY_VERSION,)):
+            return SegmentView(data)
+        return ReliableTransportLayerProtocolHeader.from_text_bytes(data)
+
+    @property
+    def options(self):
+        if self._options is None:
+            self._options = decode_options(self._view[HEADER_SIZE:self._options_end]) if self._options_end > HEADER_SIZE else {}
+        return self._options
+
+    @property
+    def payload(self):
+        # zero-copy slice of the datagram
+        return self._view[self._options_end:self._options_end + self.payload_length]
+
+    app_data = payload
+    sack_blocks = ReliableTransportLayerProtocolHeader.sack_blocks
+    timestamp = ReliableTransportLayerProtocolHeader.timestamp
+    data_range = ReliableTransportLayerProtocolHeader.data_range
+    header_sum = ReliableTransportLayerProtocolHeader.header_sum
+
+    def verify_checksum(self):
+        # the options are summed as they arrived, without decoding them
+        if self._verified is None:
+            options_sum = sum16(self._view[HEADER_SIZE:self._options_end]) if self._options_end > HEADER_SIZE else 0
+            self._verified = ~(self.header_sum() + options_sum + sum16(self.payload)) & 0xFFFF == self.checksum
+        return self._verified
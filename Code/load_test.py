@@ -0,0 +1,46 @@
+import asyncio
+import logging
+import multiprocessing
+import sys
+import time
+import receiver_server
+
+# usage: python load_test.py [number of senders] [file to send]
+SENDERS = 20
+FILE = "data.txt"
+FIRST_SENDER_PORT = 9000  # sender i binds FIRST_SENDER_PORT + i
+
+
+#runs one sender in its own process, on its own port
+def run_sender(port, file_path):
+    logging.disable(logging.INFO)
+    import sender
+    sender.SENDER_PORT = port
+    sender.DATA_FILE = file_path
+    sender.start_sender()
+
+
+async def run_load_test(senders, file_path):
+    transport, protocol = await receiver_server.serve()
+    start = time.monotonic()
+    processes = [
+        multiprocessing.Process(target=run_sender, args=(FIRST_SENDER_PORT + i, file_path))
+        for i in range(senders)
+    ]
+    for process in processes:
+        process.start()
+    loop = asyncio.get_running_loop()
+    for process in processes:
+        await loop.run_in_executor(None, process.join)
+    elapsed = time.monotonic() - start
+    transport.close()
+
+    print(f"Senders: {senders}, completed connections: {protocol.completed}, still open: {len(protocol.connections)}")
+    print(f"Bytes delivered: {protocol.bytes_received} in {elapsed:.2f} s")
+    print(f"Aggregate goodput: {protocol.bytes_received / elapsed / 1e3:.2f} kB/s")
+
+
+if __name__ == "__main__":
+    senders = int(sys.argv[1]) if len(sys.argv) > 1 else SENDERS
+    file_path = sys.argv[2] if len(sys.argv) > 2 else FILE
+    asyncio.run(run_load_test(senders, file_path))
@@ -0,0 +1,158 @@
+import bisect
+import collections
+import json
+import logging
+import time
+
+# Log level below DEBUG for per-packet messages. Hot paths check a flag taken from
+# tracing() once per connection, so with tracing off a packet costs no logging call at all.
+TRACE = 5
+logging.addLevelName(TRACE, "TRACE")
+
+# upper bounds (seconds) of the RTT histogram buckets, as in a Prometheus histogram
+RTT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float("inf"))
+
+# counters kept by every connection; a side only moves the ones that apply to it
+COUNTERS = (
+    "segments_sent",  # data segments put on the wire, retransmissions included
+    "segments_retransmitted",
+    "bytes_sent",
+    "acks_received",
+    "duplicate_acks",
+    "fast_retransmits",
+    "timeouts",
+    "segments_received",
+    "segments_delivered",  # handed to the output in order
+    "bytes_delivered",
+    "out_of_order",  # received ahead of a gap
+    "duplicate_segments",  # received again after delivery or buffering
+    "out_of_window",  # received past the right edge of the advertised window
+    "window_probes",  # zero window probes sent (sender) or answered (receiver)
+    "segments_compressed",  # sent or received with a compressed payload
+    "bytes_saved",  # payload bytes compression kept off the wire
+    "checksum_failures",
+    "acks_sent",
+)
+
+PROMETHEUS_PREFIX = "rtlp"
+WINDOW_SERIES_LIMIT = 10000  # newest window samples kept in memory; TRACE_FILE streams all of them
+
+
+def tracing(logger):
+    # True when per-packet messages of this logger would be emitted
+    return logger.isEnabledFor(TRACE)
+
+
+class ConnectionMetrics:
+    """
+    Counters and measurements of one connection.
+
+    Counters are plain attributes (metrics.segments_sent += 1), the cheapest update Python
+    has. RTTs go into a fixed bucket histogram and the congestion window into a
+    (time, cwnd, ssthresh) series. Goodput is the useful payload (bytes_delivered on the
+    receiver, bytes acknowledged on the sender) over the time between start() and stop().
+    The window series is a ring of the newest WINDOW_SERIES_LIMIT samples.
+    """
+
+    def __init__(self, role, peer=None):
+        self.role = role
+        self.peer = peer
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        self.bytes_acked = 0
+        self.rtt_buckets = [0] * len(RTT_BUCKETS)
+        self.rtt_sum = 0.0
+        self.rtt_count = 0
+        self.window_series = collections.deque(maxlen=WINDOW_SERIES_LIMIT)  # (seconds since start, cwnd, ssthresh)
+        self.started = None
+        self.stopped = None
+
+    def start(self, now=None):
+        if self.started is None:
+            self.started = time.monotonic() if now is None else now
+
+    def stop(self, now=None):
+        self.stopped = time.monotonic() if now is None else now
+
+    def observe_rtt(self, rtt):
+        self.rtt_buckets[bisect.bisect_left(RTT_BUCKETS, rtt)] += 1
+        self.rtt_sum += rtt
+        self.rtt_count += 1
+
+    def record_window(self, cwnd, ssthresh=None, now=None):
+        now = time.monotonic() if now is None else now
+        self.start(now)
+        self.window_series.append((now - self.started, cwnd, ssthresh))
+
+    @property
+    def duration(self):
+        if self.started is None:
+            return 0.0
+        end = self.stopped if self.stopped is not None else time.monotonic()
+        return max(end - self.started, 0.0)
+
+    @property
+    def goodput(self):
+        # useful bytes per second
+        useful = self.bytes_delivered if self.role == "receiver" else self.bytes_acked
+        duration = self.duration
+        return useful / duration if duration else 0.0
+
+    def counters(self):
+        return {name: getattr(self, name) for name in COUNTERS}
+
+    def to_dict(self):
+        return {
+            "role": self.role,
+            "peer": self.peer,
+            "duration": self.duration,
+            "goodput": self.goodput,
+            "bytes_acked": self.bytes_acked,
+            "counters": self.counters(),
+            "rtt": {
+                "buckets": {str(bound): count for bound, count in zip(RTT_BUCKETS, self.rtt_buckets)},
+                "sum": self.rtt_sum,
+                "count": self.rtt_count,
+            },
+            "window_series": list(self.window_series),
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=1)
+
+    def to_prometheus(self):
+        # text exposition format; series are summarised by their last value
+        labels = f'role="{self.role}"'
+        if self.peer is not None:
+            labels += f',peer="{self.peer}"'
+        lines = []
+        for name, value in self.counters().items():
+            metric = f"{PROMETHEUS_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{{{labels}}} {value}")
+        metric = f"{PROMETHEUS_PREFIX}_rtt_seconds"
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, count in zip(RTT_BUCKETS, self.rtt_buckets):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"{metric}_sum{{{labels}}} {self.rtt_sum}")
+        lines.append(f"{metric}_count{{{labels}}} {self.rtt_count}")
+        gauges = [("goodput_bytes_per_second", self.goodput), ("duration_seconds", self.duration)]
+        if self.window_series:
+            _, cwnd, ssthresh = self.window_series[-1]
+            gauges.append(("cwnd_bytes", cwnd))
+            if ssthresh is not None:
+                gauges.append(("ssthresh_bytes", ssthresh))
+        for name, value in gauges:
+            metric = f"{PROMETHEUS_PREFIX}_{name}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric}{{{labels}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        # JSON for *.json paths, Prometheus text for anything else
+        text = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        with open(path, "w") as file:
+            file.write(text)
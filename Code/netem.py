@@ -0,0 +1,265 @@
+import argparse
+import random
+import selectors
+import socket
+import time
+from header import MAX_DATAGRAM_SIZE
+from timers import TimerHeap
+
+# usage: python netem.py [--listen PORT] [--target PORT] [--seed N] [impairments...]
+# Run it between the two ends and point the sender at the listen port, e.g.
+#   python receiver.py; python netem.py --listen 8002 --target 8000 --loss 0.05 --delay 0.02
+# with sender.RECEIVER_PORT = 8002. Both directions go through the same impairments unless
+# --reverse-* options are given.
+HOST = '127.0.0.1'
+LISTEN_PORT = 8002
+TARGET_PORT = 8000
+SEED = 1
+STATS_INTERVAL = 5.0  # seconds between statistics lines
+
+
+class LinkProfile:
+    """
+    Impairments of one direction of the emulated link. Probabilities are per datagram.
+
+      loss            independent loss
+      burst_*         Gilbert-Elliott burst loss: a good and a bad state, with loss
+                      probabilities burst_good_loss / burst_bad_loss and per datagram
+                      transition probabilities burst_enter (good -> bad) and burst_exit
+                      (bad -> good). burst_enter = 0 turns it off.
+      corruption      flip one random bit of the datagram
+      corrupt_datagrams  numbers (from 1) of datagrams that are always corrupted, e.g.
+                      (1,) for the first SYN and (2,) for the handshake ACK after it;
+                      corrupt_byte picks the byte whose bit 4 they get flipped (e.g. 11,
+                      in the sequence number), None for a random bit as above
+      duplication     deliver a second copy
+      reorder         hold the datagram back by reorder_delay so later ones overtake it
+      delay, jitter   one-way latency, plus a uniform random extra in [0, jitter]
+      rate            bandwidth cap in bytes per second (0 = unlimited), with a drop-tail
+                      queue of queue_limit bytes in front of it
+    """
+
+    def __init__(self, loss=0.0, burst_enter=0.0, burst_exit=0.3, burst_good_loss=0.0, burst_bad_loss=1.0,
+                 corruption=0.0, duplication=0.0, reorder=0.0, reorder_delay=0.01, delay=0.0, jitter=0.0,
+                 rate=0, queue_limit=64 * 1024, corrupt_datagrams=(), corrupt_byte=None):
+        self.loss = loss
+        self.burst_enter = burst_enter
+        self.burst_exit = burst_exit
+        self.burst_good_loss = burst_good_loss
+        self.burst_bad_loss = burst_bad_loss
+        self.corruption = corruption
+        self.duplication = duplication
+        self.reorder = reorder
+        self.reorder_delay = reorder_delay
+        self.delay = delay
+        self.jitter = jitter
+        self.rate = rate
+        self.queue_limit = queue_limit
+        self.corrupt_datagrams = frozenset(corrupt_datagrams)
+        self.corrupt_byte = corrupt_byte
+
+
+class ImpairedLink:
+    """
+    One direction of the emulated link. transmit() decides the fate of a datagram and
+    returns the (delivery time, bytes) pairs to deliver, so it can sit behind a socket
+    (UdpProxy below) or be used in-process with a simulated clock.
+
+    Every decision comes from a random.Random seeded by the caller and the order of the
+    datagrams, so the same seed and the same traffic give the same losses, corruptions and
+    delays on every run.
+    """
+
+    def __init__(self, profile, seed=SEED):
+        self.profile = profile
+        self.rng = random.Random(seed)
+        self.bad_state = False  # Gilbert-Elliott state
+        self.busy_until = 0.0  # when the bandwidth limited link finishes what is queued
+        self.stats = dict.fromkeys(("datagrams", "delivered", "lost", "burst_lost", "queue_dropped",
+                                    "corrupted", "duplicated", "reordered"), 0)
+
+    def lost(self):
+        profile = self.profile
+        if profile.burst_enter:
+            if self.bad_state:
+                self.bad_state = self.rng.random() >= profile.burst_exit
+            else:
+                self.bad_state = self.rng.random() < profile.burst_enter
+            if self.rng.random() < (profile.burst_bad_loss if self.bad_state else profile.burst_good_loss):
+                self.stats["burst_lost"] += 1
+                return True
+        if self.rng.random() < profile.loss:
+            self.stats["lost"] += 1
+            return True
+        return False
+
+    def corrupt(self, data, byte=None):
+        data = bytearray(data)
+        if byte is not None and byte < len(data):
+            data[byte] ^= 0x10
+        elif data:
+            bit = self.rng.randrange(len(data) * 8)
+            data[bit // 8] ^= 1 << (bit % 8)
+        self.stats["corrupted"] += 1
+        return bytes(data)
+
+    def transmit(self, data, now):
+        profile = self.profile
+        rng = self.rng
+        self.stats["datagrams"] += 1
+        if self.lost():
+            return []
+
+        #bandwidth cap: serialize behind whatever is queued, drop when the queue is full
+        if profile.rate:
+            backlog = max(self.busy_until - now, 0.0) * profile.rate
+            if backlog + len(data) > profile.queue_limit:
+                self.stats["queue_dropped"] += 1
+                return []
+            self.busy_until = max(self.busy_until, now) + len(data) / profile.rate
+            departure = self.busy_until
+        else:
+            departure = now
+
+        copies = 1
+        if rng.random() < profile.duplication:
+            copies = 2
+            self.stats["duplicated"] += 1
+        forced = self.stats["datagrams"] in profile.corrupt_datagrams
+        deliveries = []
+        for _ in range(copies):
+            if forced:
+                payload = self.corrupt(data, profile.corrupt_byte)
+            else:
+                payload = self.corrupt(data) if rng.random() < profile.corruption else data
+            deliver_at = departure + profile.delay
+            if profile.jitter:
+                deliver_at += rng.uniform(0, profile.jitter)
+            if rng.random() < profile.reorder:
+                deliver_at += profile.reorder_delay
+                self.stats["reordered"] += 1
+            deliveries.append((deliver_at, payload))
+            self.stats["delivered"] += 1
+        return deliveries
+
+
+class UdpProxy:
+    """
+    UDP relay between clients and one target, with an ImpairedLink per direction.
+
+    Every client gets its own upstream socket, so the target sees one address per client
+    (the asyncio receiver server keeps working with many senders) and the replies can be
+    routed back to the right client.
+    """
+
+    def __init__(self, listen_addr, target_addr, forward, reverse, seed=SEED):
+        self.target_addr = target_addr
+        self.forward = ImpairedLink(forward, seed)
+        self.reverse = ImpairedLink(reverse, seed + 1)
+        self.selector = selectors.DefaultSelector()
+        self.timers = TimerHeap()
+        self.listen_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listen_sock.bind(listen_addr)
+        self.listen_sock.setblocking(False)
+        self.selector.register(self.listen_sock, selectors.EVENT_READ, None)
+        self.upstream = {}  # client address -> socket towards the target
+
+    def upstream_for(self, client_addr):
+        sock = self.upstream.get(client_addr)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((self.listen_sock.getsockname()[0], 0))
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ, client_addr)
+            self.upstream[client_addr] = sock
+        return sock
+
+    def relay(self, link, data, sock, addr):
+        now = time.monotonic()
+        for deliver_at, payload in link.transmit(data, now):
+            self.timers.schedule(deliver_at, lambda payload=payload: self.send(sock, payload, addr))
+
+    @staticmethod
+    def send(sock, payload, addr):
+        try:
+            sock.sendto(payload, addr)
+        except OSError:
+            pass  # the other end went away; the emulated network just loses it
+
+    def read_all(self, sock, client_addr):
+        while True:
+            try:
+                data, addr = sock.recvfrom(MAX_DATAGRAM_SIZE)
+            except (BlockingIOError, ConnectionRefusedError):
+                return
+            if client_addr is None:
+                self.relay(self.forward, data, self.upstream_for(addr), self.target_addr)
+            else:
+                self.relay(self.reverse, data, self.listen_sock, client_addr)
+
+    def serve(self, duration=None, stats_interval=STATS_INTERVAL):
+        end = None if duration is None else time.monotonic() + duration
+        next_stats = time.monotonic() + stats_interval
+        while end is None or time.monotonic() < end:
+            timeout = self.timers.timeout(default=stats_interval)
+            if end is not None:
+                timeout = min(timeout, max(end - time.monotonic(), 0.0))
+            for key, _ in self.selector.select(timeout):
+                self.read_all(key.fileobj, key.data)
+            self.timers.run_expired()
+            if stats_interval and time.monotonic() >= next_stats:
+                print(f"forward {self.forward.stats}")
+                print(f"reverse {self.reverse.stats}")
+                next_stats += stats_interval
+
+    def close(self):
+        self.selector.close()
+        self.listen_sock.close()
+        for sock in self.upstream.values():
+            sock.close()
+
+
+def profile_from_args(args, prefix=""):
+    fields = {}
+    for name in ("loss", "burst_enter", "burst_exit", "burst_good_loss", "burst_bad_loss", "corruption",
+                 "duplication", "reorder", "reorder_delay", "delay", "jitter", "rate", "queue_limit",
+                 "corrupt_datagrams", "corrupt_byte"):
+        value = getattr(args, prefix + name)
+        if value is None and prefix:
+            value = getattr(args, name)
+        if value is not None:
+            fields[name] = value
+    return LinkProfile(**fields)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Deterministic UDP network emulator")
+    parser.add_argument("--listen", type=int, default=LISTEN_PORT, help="port the sender talks to")
+    parser.add_argument("--target", type=int, default=TARGET_PORT, help="port of the receiver")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run (default: forever)")
+    options = (("loss", float), ("burst-enter", float), ("burst-exit", float), ("burst-good-loss", float),
+               ("burst-bad-loss", float), ("corruption", float), ("duplication", float), ("reorder", float),
+               ("reorder-delay", float), ("delay", float), ("jitter", float), ("rate", int), ("queue-limit", int))
+    for name, kind in options:
+        parser.add_argument(f"--{name}", type=kind, default=None)
+        parser.add_argument(f"--reverse-{name}", type=kind, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--corrupt-datagrams", type=int, nargs="+", default=None, help="always corrupt these datagrams")
+    parser.add_argument("--reverse-corrupt-datagrams", type=int, nargs="+", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--corrupt-byte", type=int, default=None, help="byte flipped in those (default: a random bit)")
+    parser.add_argument("--reverse-corrupt-byte", type=int, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    proxy = UdpProxy((HOST, args.listen), (HOST, args.target),
+                     profile_from_args(args), profile_from_args(args, "reverse_"), args.seed)
+    try:
+        proxy.serve(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"forward {proxy.forward.stats}")
+        print(f"reverse {proxy.reverse.stats}")
+        proxy.close()
@@ -0,0 +1,62 @@
+import time
+
+# Pacing: instead of sending a whole window the moment it opens, the sender spreads its
+# segments over the round trip. The rate is gain * cwnd / SRTT (the congestion controller's
+# own pacing_rate when it has one), enforced by a token bucket on the monotonic clock.
+# The gain lets the window keep growing: twice the current rate in slow start, a little
+# above it afterwards, as Linux does.
+
+PACING_GAIN_SLOW_START = 2.0
+PACING_GAIN = 1.2
+PACING_BURST = 2  # segments that may always go out back to back
+PACING_QUANTUM = 0.001  # seconds of sending the bucket holds at most, so a late wakeup does not lose tokens
+
+
+class TokenBucket:
+    """
+    Byte tokens that accrue at `rate` bytes per second up to `depth` bytes.
+
+    delay(size) tells how long until size bytes may be sent and consume(size) spends them.
+    consume() may take the bucket below zero (a retransmission that cannot wait); later
+    segments then wait until it has refilled.
+    """
+
+    def __init__(self, rate, depth, now=None):
+        self.rate = rate
+        self.depth = depth
+        self.tokens = depth
+        self.stamp = time.monotonic() if now is None else now
+
+    def refill(self, now):
+        self.tokens = min(self.depth, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def set_rate(self, rate, depth, now=None):
+        # tokens earned so far count at the old rate
+        self.refill(time.monotonic() if now is None else now)
+        self.rate = rate
+        self.depth = depth
+
+    def delay(self, size, now=None):
+        # seconds until size bytes of tokens are available (0 when they are now)
+        self.refill(time.monotonic() if now is None else now)
+        if self.tokens >= size:
+            return 0.0
+        return (size - self.tokens) / self.rate
+
+    def consume(self, size):
+        self.tokens -= size
+
+
+def pacing_rate(congestion, srtt):
+    # bytes per second for a congestion controller and smoothed RTT, None before the first RTT sample
+    if congestion.pacing_rate:
+        return congestion.pacing_rate
+    if not srtt:
+        return None
+    gain = PACING_GAIN_SLOW_START if congestion.cwnd < congestion.ssthresh else PACING_GAIN
+    return gain * congestion.window / srtt
+
+
+def bucket_depth(rate, mss):
+    return max(PACING_BURST * mss, rate * PACING_QUANTUM)
@@ -0,0 +1,69 @@
+import argparse
+import concurrent.futures
+import logging
+import os
+import random
+import time
+import sender
+
+# usage: python parallel_sender.py <file> [--streams K]
+# Splits the file into K ranges and sends each over its own connection, one per process of
+# a pool, so the work spreads over K cores. Every connection is an ordinary sender.py
+# transfer from its own port whose SYN carries the range (OPT_RANGE); the receiver writes
+# each range at its offset of one output file. Run receiver_server.py with K workers so the
+# receiving side scales too.
+
+STREAMS = os.cpu_count() or 1
+MIN_RANGE_SIZE = 256 * 1024  # files smaller than STREAMS ranges of this size use fewer streams
+
+logger = logging.getLogger("ParallelSender")
+
+
+def split_ranges(size, streams, min_size=MIN_RANGE_SIZE):
+    # (offset, length) of at most streams nearly equal ranges covering size bytes
+    count = max(1, min(streams, size // min_size))
+    step = max(1, -(-size // count))
+    return [(offset, min(step, size - offset)) for offset in range(0, size, step)] or [(0, 0)]
+
+
+def send_range(job):
+    # runs in a pool worker; the connection binds an ephemeral port so workers do not collide
+    data_file, data_range = job
+    metrics = sender.start_sender(data_file, 0, data_range)
+    return None if metrics is None else metrics.to_dict()
+
+
+def send_parallel(data_file, streams=STREAMS):
+    """
+    Sends data_file over up to streams parallel connections. Returns the transfer id (the
+    receiver names the output after it), the metrics of each range (None for a range that
+    could not be sent) and the wall-clock time of the whole transfer.
+    """
+    total_size = os.path.getsize(data_file)
+    transfer_id = random.getrandbits(32)
+    jobs = [(data_file, (transfer_id, offset, length, total_size))
+            for offset, length in split_ranges(total_size, streams)]
+    logger.info(f"Sending {total_size} bytes as transfer {transfer_id:08x} over {len(jobs)} connections")
+    started = time.monotonic()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+        results = list(pool.map(send_range, jobs))
+    elapsed = time.monotonic() - started
+    return transfer_id, results, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send one file over parallel connections.")
+    parser.add_argument("file")
+    parser.add_argument("--streams", type=int, default=STREAMS, help="connections (and processes) to use")
+    args = parser.parse_args()
+
+    transfer_id, results, elapsed = send_parallel(args.file, args.streams)
+    failed = sum(result is None for result in results)
+    acked = sum(result["bytes_acked"] for result in results if result is not None)
+    logger.info(f"Transfer {transfer_id:08x}: {acked} bytes over {len(results)} connections in {elapsed:.2f} s, "
+                f"{acked / elapsed / 1e6 if elapsed else 0.0:.2f} MB/s" + (f", {failed} ranges FAILED" if failed else ""))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
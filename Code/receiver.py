@@ -1,177 +1,638 @@
 import socket
 import logging
-from header import ReliableTransportLayerProtocolHeader
-import random
+import os
+from header import ReliableTransportLayerProtocolHeader, SegmentView, WIRE_BINARY, OPT_SELECTIVE_REPEAT, OPT_SACK_PERMITTED, OPT_SACK, OPT_TIMESTAMP, OPT_DIGEST, OPT_WINDOW_SCALE, OPT_RANGE, OPT_FAST_OPEN, OPT_COMPRESSION, OPT_RESUME, MAX_WINDOW, encode_sack_blocks, encode_timestamp, datagram_size, window_scale_for
+from rtt import timestamp_now
+import selectors
 import time
+from timers import TimerHeap
+from sink import make_sink, PositionalSink, ResumedSink, FSYNC_ON_CLOSE
+from udpio import DatagramReader, DatagramWriter, tune_socket
+from metrics import ConnectionMetrics, TRACE, tracing
+from seqnum import seq_add, seq_diff, random_isn
+from compression import CODECS, choose, decompress
+import checkpoint
+from syncookie import make_cookie, check_cookie, COOKIE_SELECTIVE_REPEAT, COOKIE_SACK, COOKIE_TIMESTAMPS, COOKIE_WINDOW_SCALE
 
 HOST = '127.0.0.1'   #IP for both sender and receiver
-SENDER_PORT = 8001
-RECEIVER_PORT = 8000  
-WINDOW_SIZE = 4
+RECEIVER_PORT = 8000
 MSS = 15
-TIMEOUT = 180
+TIMEOUT = 180  # seconds without hearing from the sender before giving up
+FIN_TIMEOUT = 5  # seconds to wait for the ACK of our FIN-ACK
+EMULATED_DELAY = 0.0  # emulation only: seconds every reply is held before it is sent (0 = off)
+OUTPUT_FILE = "received_packets.txt"
+SELECTIVE_REPEAT_ENABLED = True  # agree to Selective Repeat when the sender asks for it
+RECEIVE_BUFFER_SIZE = 256 * 1024  # bytes of reassembly space per connection; its free part is the advertised window
+WINDOW_SCALE_ENABLED = True  # scale the advertised window when the sender offers it, so it can exceed 64 KiB
+FAST_OPEN_ENABLED = False  # accept a first data segment carried by the SYN (sender.FAST_OPEN); off by default,
+                           # as there is no fast open cookie: any SYN, even a spoofed one, would truncate the output
+COMPRESSION_ENABLED = True  # accept compressed payloads in a codec the sender offers (sender.COMPRESSION)
+RANGES_ENABLED = True  # accept ranges of parallel transfers (parallel_sender.py) and reassemble them
+RANGE_OUTPUT = "transfer_{:08x}.out"  # file, next to the output path, that the ranges of a transfer are written into
+EMULATED_READ_RATE = 0  # emulation only: bytes/s the application reads delivered data (0 = at once); fills the window
+SACK_ENABLED = True  # report buffered ranges in SACK blocks when the sender permits it
+TIMESTAMPS_ENABLED = True  # echo the sender's timestamps in ACKs when it offers them
+OUTPUT_SINK = "buffered"  # "buffered" (batched writes) or "mmap" (memory-mapped output file)
+SINK_BUFFER_SIZE = 256 * 1024  # bytes delivered between writes to the output file
+FSYNC_POLICY = FSYNC_ON_CLOSE  # sink.FSYNC_NEVER, FSYNC_ON_CLOSE or FSYNC_ON_FLUSH
+DIGEST_CHECK = True  # compare the output with the SHA-256 the sender puts in its FIN
+RESUME_ENABLED = True  # checkpoint whole-file transfers next to the output and let the sender resume them
+CHECKPOINT_INTERVAL = 4 * 1024 * 1024  # bytes delivered between checkpoints (one is also written when a transfer dies)
+METRICS_SUFFIX = None  # e.g. ".metrics.json" or ".prom": metrics written next to each output file
+DELAYED_ACK = True  # acknowledge in-order full segments in pairs instead of one ACK per segment
+ACK_EVERY = 2  # in-order full segments covered by one delayed ACK
+DELAYED_ACK_TIMEOUT = 0.005  # seconds a delayed ACK may wait for the next segment; below the sender's MIN_TIMEOUT
 
-logging.basicConfig(level=logging.DEBUG)
+# connection states
+LISTEN = "LISTEN"
+SYN_RECEIVED = "SYN_RECEIVED"
+ESTABLISHED = "ESTABLISHED"
+LAST_ACK = "LAST_ACK"  # FIN-ACK sent, waiting for the final ACK
+CLOSED = "CLOSED"
+
+LOG_LEVEL = logging.DEBUG  # metrics.TRACE adds a line per packet
+logging.basicConfig(level=LOG_LEVEL)
 logger = logging.getLogger("Receiver")
 
 
-#function that enables handshaking
-def handshake(server_sock):
+class ReceiverConnection:
+    """
+    State of one connection on the receiver side, identified by the sender's (ip, port).
 
-    global SENDER_PORT
-    connection_details = {
-        "Alive": False,
-        "senderSeqNum": 0,
-        "senderACKNum": 0,
-        "receiverSeqNum": 0,
-        "receiverACKNum": 0,
-        "sender_mss" : 0
-    }
+    The methods take decoded headers and return the headers to send back, so the same
+    object is driven by the blocking single-peer loop below and by the asyncio server
+    in receiver_server.py.
+    """
 
-    logger.info("Receiver: Waiting for SYN...")
-    data, addr = server_sock.recvfrom(1024)
-    data = ReliableTransportLayerProtocolHeader.from_bytes(data)
-
-    #setting a value for SENDER_PORT
-    SENDER_PORT = addr[1]
-
-    if addr == (HOST, SENDER_PORT) and data.syn == 1:
-        logger.info("Receiver: Received SYN, sending SYN-ACK...")
-        connection_details["Alive"] = True
-        connection_details["Port"] =  SENDER_PORT
-        connection_details["senderSeqNum"] = data.seq_num
-        connection_details["senderACKNum"] = data.seq_num + 1
-        connection_details["receiverSeqNum"] = random.randint(0, 2000)
-        connection_details["receiverACKNum"] = connection_details["senderSeqNum"] + 1
-        connection_details["sender_mss"] = data.mss
-        
-        syn_ack_packet = ReliableTransportLayerProtocolHeader(RECEIVER_PORT, SENDER_PORT, connection_details["receiverSeqNum"], connection_details["receiverACKNum"], WINDOW_SIZE, MSS, syn=1, ack=1)
-        server_sock.sendto(syn_ack_packet.to_bytes(), addr)
-        logger.info("Receiver: Sent SYN-ACK.")
-
-        # Wait for final ACK
-        data, addr = server_sock.recvfrom(1024)
-        data = ReliableTransportLayerProtocolHeader.from_bytes(data)
-        if addr == (HOST, SENDER_PORT) and data.ack == 1 and data.ack_num == connection_details["receiverSeqNum"] + 1:
+    def __init__(self, addr, output_path=None, local_port=None):
+        #the module settings are read now, so callers can still change OUTPUT_FILE and RECEIVER_PORT first
+        self.addr = addr
+        self.local_port = RECEIVER_PORT if local_port is None else local_port
+        self.output_path = OUTPUT_FILE if output_path is None else output_path
+        self.requested_output_path = self.output_path  # output_path before a range SYN changed it
+        self.state = LISTEN
+        self.alive = False
+        self.sender_seq_num = 0
+        self.receiver_seq_num = 0
+        self.receiver_ack_num = 0
+        self.sender_mss = 0
+        self.expected_seq_num = 0  # sequence number of the next byte to deliver
+        self.last_delivered_seq = 0  # sequence number of the last segment delivered in order
+        self.wire_format = WIRE_BINARY
+        self.selective_repeat = False
+        self.sack = False
+        self.timestamps = False
+        self.ts_recent = 0  # TSval of the segment being acknowledged, echoed as TSecr
+        self.ack_pending = 0  # in-order segments received since the last ACK
+        self.ack_deadline = None  # monotonic time the delayed ACK is due, None when none is waiting
+        self.ack_template = None  # ACK header reused for every ACK, patched in place
+        self.reorder_buffer = {}  # seq_num -> payload of segments received ahead of expected_seq_num
+        self.reorder_bytes = 0  # payload bytes in reorder_buffer
+        self.receive_buffer = RECEIVE_BUFFER_SIZE
+        self.window_scale = 0  # shift applied to the windows we advertise (0 unless the sender offered scaling)
+        self.unread = 0.0  # delivered bytes the emulated application has not read yet
+        self.read_at = time.monotonic()
+        self.bytes_received = 0
+        self.sink = None  # opened when the handshake completes (or on a fast open SYN), closed when the transfer ends
+        self.fast_open = False  # the SYN carried the first data segment and it was accepted
+        self.compression = None  # codec id of compressed payloads, None unless negotiated
+        self.transfer_key = None  # key of the file being received when the sender can resume it
+        self.resume_offset = 0  # bytes of the output kept from an earlier connection
+        self.resume_digest = None  # SHA-256 object of those bytes
+        self.next_checkpoint = 0  # bytes_received at which the next checkpoint is written
+        self.data_range = None  # (transfer id, offset, total size) when this is one range of a parallel transfer
+        self.digest_ok = None  # result of the end-of-transfer digest check, None if not checked
+        self.metrics = ConnectionMetrics("receiver", f"{addr[0]}:{addr[1]}")
+        self.trace = tracing(logger)  # per-packet log lines, checked once here
+        self.last_activity = time.monotonic()
+
+    #forgets the connection (a half-open one including the data a fast open SYN delivered)
+    def restart(self):
+        if self.sink is not None:
+            self.sink.close()
+        self.__init__(self.addr, self.requested_output_path, self.local_port)
+
+    def make_header(self, **fields):
+        return ReliableTransportLayerProtocolHeader(self.local_port, self.addr[1], self.receiver_seq_num,
+                                                    self.receiver_ack_num, self.advertised_window(fields.get("syn")), MSS, **fields)
+
+    #the sending_window field; the window in a SYN-ACK is never scaled
+    def advertised_window(self, syn=False):
+        return min(self.free_space() >> (0 if syn else self.window_scale), MAX_WINDOW)
+
+    #bytes of the receive buffer not taken by buffered segments or unread data
+    def free_space(self):
+        if self.unread:
+            now = time.monotonic()
+            self.unread = max(0.0, self.unread - EMULATED_READ_RATE * (now - self.read_at))
+            self.read_at = now
+        return max(0, self.receive_buffer - int(self.unread) - self.reorder_bytes)
+
+    #first step of the handshake (the SYN passed its checksum), returns the SYN-ACK to send
+    def accept_syn(self, header):
+        logger.info(f"Receiver: Received SYN from {self.addr}, sending SYN-ACK...")
+        self.negotiate(header)
+        if self.compression is not None:
+            logger.info(f"Receiver: payloads compressed with {CODECS[self.compression].name}")
+        if self.transfer_key is not None:
+            self.find_checkpoint()
+        self.state = SYN_RECEIVED
+        self.alive = True
+        #a resumed transfer does not start with the file's first segment
+        if not self.resume_offset and FAST_OPEN_ENABLED and OPT_FAST_OPEN in header.options:
+            # the payload is the first data segment, one after the handshake ACK's sequence number
+            logger.info(f"Receiver: SYN carries {len(header.payload)} bytes of data (fast open).")
+            self.fast_open = True
+            self.open_sink()
+            self.expected_seq_num = seq_add(header.seq_num, 2)
+            self.deliver(header.payload)
+        return self.syn_ack_packet()
+
+    #takes what the SYN offers; no resources are allocated yet
+    def negotiate(self, header):
+        self.data_range = header.data_range if RANGES_ENABLED else None
+        if self.data_range is not None:
+            transfer_id, offset, total_size = self.data_range
+            self.output_path = os.path.join(os.path.dirname(self.output_path), RANGE_OUTPUT.format(transfer_id))
+        self.sender_seq_num = header.seq_num
+        self.receiver_seq_num = random_isn()
+        self.receiver_ack_num = seq_add(header.seq_num, 1)
+        self.sender_mss = header.mss
+        self.receive_buffer = max(RECEIVE_BUFFER_SIZE, header.mss)
+        if WINDOW_SCALE_ENABLED and OPT_WINDOW_SCALE in header.options:
+            self.window_scale = window_scale_for(self.receive_buffer)
+        self.wire_format = header.wire_format  # answer in the format the SYN used
+        self.selective_repeat = SELECTIVE_REPEAT_ENABLED and OPT_SELECTIVE_REPEAT in header.options
+        self.sack = SACK_ENABLED and OPT_SACK_PERMITTED in header.options
+        self.timestamps = TIMESTAMPS_ENABLED and header.timestamp is not None
+        if self.timestamps:
+            self.ts_recent = header.timestamp[0]
+        if COMPRESSION_ENABLED and header.options.get(OPT_COMPRESSION):
+            self.compression = choose(header.options[OPT_COMPRESSION])
+        if RESUME_ENABLED and self.data_range is None and OPT_RESUME in header.options:
+            self.transfer_key = header.options[OPT_RESUME]
+
+    #takes up where an earlier connection stopped when the output still holds what its checkpoint says
+    def find_checkpoint(self):
+        saved = checkpoint.load(self.output_path)
+        if saved is None or saved.key != self.transfer_key or not saved.offset:
+            return
+        digest = checkpoint.verify(self.output_path, saved)
+        if digest is None:
+            logger.info(f"Receiver: {self.output_path} no longer matches its checkpoint, starting over.")
+            return
+        logger.info(f"Receiver: resuming {self.output_path} at byte {saved.offset}.")
+        self.resume_offset = saved.offset
+        self.resume_digest = digest
+
+    #what was negotiated, as the feature bits of a SYN cookie
+    def cookie_features(self):
+        return ((COOKIE_SELECTIVE_REPEAT if self.selective_repeat else 0) | (COOKIE_SACK if self.sack else 0)
+                | (COOKIE_TIMESTAMPS if self.timestamps else 0) | (COOKIE_WINDOW_SCALE if self.window_scale else 0))
+
+    #rebuilds the state accept_syn() would have left from a valid cookie (see connection_from_cookie)
+    def restore(self, header, sender_isn, cookie, features):
+        logger.info(f"Receiver: Valid SYN cookie from {self.addr}.")
+        self.state = SYN_RECEIVED
+        self.alive = True
+        self.sender_seq_num = sender_isn
+        self.receiver_seq_num = cookie
+        self.receiver_ack_num = seq_add(sender_isn, 1)
+        self.sender_mss = header.mss
+        self.receive_buffer = max(RECEIVE_BUFFER_SIZE, header.mss)
+        if features & COOKIE_WINDOW_SCALE:
+            self.window_scale = window_scale_for(self.receive_buffer)
+        self.wire_format = header.wire_format
+        self.selective_repeat = bool(features & COOKIE_SELECTIVE_REPEAT)
+        self.sack = bool(features & COOKIE_SACK)
+        self.timestamps = bool(features & COOKIE_TIMESTAMPS)
+        if self.timestamps and header.timestamp is not None:
+            self.ts_recent = header.timestamp[0]
+
+    def open_sink(self):
+        if self.sink is not None:
+            return
+        if self.data_range is not None:
+            transfer_id, offset, total_size = self.data_range
+            logger.info(f"Receiver: range at {offset} of a {total_size} byte transfer, into {self.output_path}")
+            self.sink = PositionalSink(self.output_path, offset, total_size, SINK_BUFFER_SIZE, FSYNC_POLICY, DIGEST_CHECK)
+        elif self.resume_offset:
+            self.sink = ResumedSink(self.output_path, self.resume_offset, self.resume_digest, SINK_BUFFER_SIZE, FSYNC_POLICY)
+        else:
+            #checkpoints need the running digest
+            self.sink = make_sink(OUTPUT_SINK, self.output_path, SINK_BUFFER_SIZE, FSYNC_POLICY,
+                                  DIGEST_CHECK or self.transfer_key is not None)
+            checkpoint.remove(self.output_path)  # whatever it described is overwritten
+        self.next_checkpoint = CHECKPOINT_INTERVAL
+
+    def syn_ack_packet(self):
+        options = {}
+        if self.selective_repeat:
+            options[OPT_SELECTIVE_REPEAT] = b""
+        if self.sack:
+            options[OPT_SACK_PERMITTED] = b""
+        if self.timestamps:
+            options[OPT_TIMESTAMP] = encode_timestamp(timestamp_now(), self.ts_recent)
+        if self.window_scale:
+            options[OPT_WINDOW_SCALE] = bytes((self.window_scale,))
+        if self.data_range is not None:
+            options[OPT_RANGE] = b""
+        if self.fast_open:
+            options[OPT_FAST_OPEN] = b""
+        if self.compression is not None:
+            options[OPT_COMPRESSION] = bytes((self.compression,))
+        if self.transfer_key is not None:
+            options[OPT_RESUME] = self.resume_offset.to_bytes(checkpoint.OFFSET_SIZE, "big")
+        return self.make_header(syn=1, ack=1, options=options)
+
+    #last step of the handshake, returns True if the ACK completes it
+    def accept_handshake_ack(self, header):
+        if header.ack == 1 and header.ack_num == seq_add(self.receiver_seq_num, 1) and header.verify_checksum():
             logger.info("Receiver: Received final ACK. Handshake complete.")
-            connection_details["senderSeqNum"] = data.seq_num + 2
-    return connection_details
-
-
-#writes down stuff in a file to verify the order is correct
-def log_received_packet(packet_data, file_path="received_packets.txt"):
-    try:
-        with open(file_path, "a") as file:
-            file.write(packet_data + "\n")
-    except Exception as e:
-        print(f"Error writing to file: {e}")
-
-
-def accept_fin(server_sock,connection_details):
-
-    print("Sending FINACK")
-    finack = ReliableTransportLayerProtocolHeader(
-        RECEIVER_PORT,
-        SENDER_PORT,
-        connection_details["receiverSeqNum"], 
-        connection_details["receiverACKNum"],
-        WINDOW_SIZE, 
-        MSS, 
-        fin=True, 
-        ack=True)
-
-    server_sock.sendto(finack.to_bytes(), (HOST, SENDER_PORT))
-
-    try:
-        time.sleep(5)
-        data,addr = server_sock.recvfrom(1024)
-        if (addr == (HOST,SENDER_PORT)):
-            data = ReliableTransportLayerProtocolHeader.from_bytes(data)
-            if (data.ack) :
-                print("ACK received for FINACK. Connection Terminated")
+            # the sender's first data segment comes one after its handshake ACK
+            self.establish(seq_add(header.seq_num, 1))
+            return True
+        return False
+
+    def establish(self, first_seq_num):
+        self.state = ESTABLISHED
+        self.metrics.start()
+        self.open_sink()
+        if not self.fast_open:
+            self.expected_seq_num = first_seq_num
+            # nothing delivered yet: acknowledge the segment before the first one
+            self.last_delivered_seq = seq_add(first_seq_num, -self.sender_mss)
+
+    #checks a data segment and returns the cumulative ACK to send (None if it was corrupted).
+    #In Go-Back-N only the expected segment is delivered; anything else just repeats the ACK
+    def accept_data(self, header):
+        metrics = self.metrics
+        metrics.segments_received += 1
+        seq_num = header.seq_num
+        if header.payload_length and self.redundant(seq_num, header.payload_length):
+            return self.cumulative_ack(seq_num)
+        if not header.verify_checksum():
+            metrics.checksum_failures += 1
+            if self.trace:
+                logger.log(TRACE, "Packet corrupt. Dropped.")
+            return None
+        if self.timestamps and header.timestamp is not None and not self.ack_pending:
+            # a delayed ACK echoes the oldest segment it covers, so the sender's RTT includes the delay
+            self.ts_recent = header.timestamp[0]
+        payload = header.payload
+        if not payload:
+            # zero window probe: only asks for our current window
+            metrics.window_probes += 1
+            return self.cumulative_ack(seq_num)
+        if OPT_COMPRESSION in header.options:
+            payload = self.decompress(header)
+            if payload is None:
+                return None
+            #redundant() saw the compressed length; the original one may not fit
+            if seq_diff(seq_num, self.expected_seq_num) + len(payload) > self.receive_buffer - int(self.unread):
+                metrics.out_of_window += 1
+                return self.cumulative_ack(seq_num)
+        if self.selective_repeat:
+            in_order = self.accept_data_selective_repeat(seq_num, payload)
+        else:
+            self.deliver(payload)  # redundant() let only the expected segment through
+            in_order = True
+        #anything unusual (a gap, a gap being filled, the short last segment) is acknowledged at once
+        if in_order and len(payload) >= self.sender_mss:
+            return self.delayed_ack(seq_num)
+        return self.cumulative_ack(seq_num)
+
+    #True for a data segment that is dropped on its sequence number alone, before the checksum
+    #is computed or the payload touched: one delivered or buffered already (our ACK was lost),
+    #one that is not the next under Go-Back-N, or one past the right edge of the window.
+    #Such a segment only gets our cumulative ACK again
+    def redundant(self, seq_num, length):
+        metrics = self.metrics
+        offset = seq_diff(seq_num, self.expected_seq_num)
+        if offset < 0 or seq_num in self.reorder_buffer:
+            metrics.duplicate_segments += 1
+            reason = "already received"
+        elif offset and not self.selective_repeat:
+            metrics.out_of_order += 1
+            reason = f"out of order. Was Expecting: {self.expected_seq_num}"
+        elif offset + length > self.receive_buffer - int(self.unread):
+            metrics.out_of_window += 1
+            reason = "beyond the receive window"
+        else:
+            return False
+        if self.trace:
+            logger.log(TRACE, f"Package {seq_num} {reason}. Dropped.")
+        return True
+
+    #Selective Repeat: buffers segments that arrive ahead of a gap and delivers contiguous runs
+    #(duplicates never get here, see redundant()).
+    #Returns True for the plain case, the expected segment with nothing buffered behind it
+    def accept_data_selective_repeat(self, seq_num, payload):
+        if seq_num == self.expected_seq_num:
+            self.deliver(payload)
+            if not self.reorder_buffer:
+                return True
+        else:
+            self.metrics.out_of_order += 1
+            # the payload may point into a reused receive buffer, so keep a copy
+            self.reorder_buffer[seq_num] = bytes(payload)
+            self.reorder_bytes += len(payload)
+        while self.expected_seq_num in self.reorder_buffer:
+            payload = self.reorder_buffer.pop(self.expected_seq_num)
+            self.reorder_bytes -= len(payload)
+            self.deliver(payload)
+        return False
+
+    #original payload of a compressed segment, None (and the segment dropped) if it cannot be decoded
+    def decompress(self, header):
+        if self.compression is None:
+            payload = None  # compression was never agreed on
+        else:
+            try:
+                payload = decompress(self.compression, header.payload, self.sender_mss)
+            except ValueError:
+                payload = None
+        if payload is None:
+            self.metrics.checksum_failures += 1
+            if self.trace:
+                logger.log(TRACE, f"Package {header.seq_num} has an undecodable compressed payload. Dropped.")
+            return None
+        self.metrics.segments_compressed += 1
+        self.metrics.bytes_saved += len(payload) - len(header.payload)
+        return payload
+
+    #in-order segment: every ACK_EVERY-th one is acknowledged, the others wait for the next
+    #segment or DELAYED_ACK_TIMEOUT (None while the ACK is held back; see flush_ack)
+    def delayed_ack(self, latest_seq_num):
+        self.ack_pending += 1
+        if not DELAYED_ACK or self.ack_pending >= ACK_EVERY:
+            return self.cumulative_ack(latest_seq_num)
+        if self.ack_deadline is None:
+            self.ack_deadline = time.monotonic() + DELAYED_ACK_TIMEOUT
+        return None
+
+    #the held back ACK once its deadline has passed, None if there is none or it is not due yet
+    def flush_ack(self, now=None):
+        if self.ack_deadline is None or (time.monotonic() if now is None else now) < self.ack_deadline:
+            return None
+        if self.state != ESTABLISHED:
+            self.ack_pending, self.ack_deadline = 0, None
+            return None
+        return self.cumulative_ack(self.last_delivered_seq)
+
+    #ACK whose ack_num is the last segment delivered in order, i.e. it acknowledges every
+    #segment up to and including it. SACK blocks report what is buffered above it
+    def cumulative_ack(self, latest_seq_num):
+        self.receiver_ack_num = self.last_delivered_seq
+        options = {}
+        if self.sack and self.reorder_buffer:
+            options[OPT_SACK] = encode_sack_blocks(self.sack_ranges(latest_seq_num))
+        if self.timestamps:
+            options[OPT_TIMESTAMP] = encode_timestamp(timestamp_now(), self.ts_recent)
+        return self.ack_packet(options)
+
+    #contiguous [start, end) byte ranges in the reorder buffer, the one holding the latest segment first
+    def sack_ranges(self, latest_seq_num):
+        ranges = []
+        expected = self.expected_seq_num
+        for seq_num in sorted(self.reorder_buffer, key=lambda seq_num: seq_diff(seq_num, expected)):
+            end = seq_add(seq_num, len(self.reorder_buffer[seq_num]))
+            if ranges and ranges[-1][1] == seq_num:
+                ranges[-1][1] = end
             else:
-                print("Connection continued")
-    except:
-        print('Connection timed out. Terminated. ')
-
-
-
-#function that sends an ack when a file is received
-def send_ack(server_socket, connnection_details):
-    print(f"Sending ACK for {connnection_details["receiverACKNum"]}")
-    ack = ReliableTransportLayerProtocolHeader(
-        RECEIVER_PORT,
-        SENDER_PORT, 
-        connnection_details["receiverSeqNum"],
-        connnection_details["receiverACKNum"] ,
-        WINDOW_SIZE,
-        MSS,
-        ack=True )
-    
-    #send ack to sender
-    server_socket.sendto(ack.to_bytes(), (HOST,SENDER_PORT))
-
-    #update own sequence number:
-    connnection_details["receiverSeqNum"] += 1
-
-
-#function that receives data 
-def receive_date(server_socket, connection_details):
-    intialSequenceNumber = connection_details["senderSeqNum"] - 1
-    expectedSequenceNumber = intialSequenceNumber 
-    print(f"expected sequence 1 = {expectedSequenceNumber}")
+                ranges.append([seq_num, end])
+        ranges.sort(key=lambda block: not 0 <= seq_diff(latest_seq_num, block[0]) < seq_diff(block[1], block[0]))
+        return ranges
+
+    #hands one in-order payload to the output and moves the expected sequence number
+    def deliver(self, payload):
+        self.sink.write(payload)
+        self.bytes_received += len(payload)
+        self.metrics.segments_delivered += 1
+        self.metrics.bytes_delivered += len(payload)
+        if EMULATED_READ_RATE:
+            self.free_space()  # reads what the application consumed so far
+            self.unread += len(payload)
+        self.last_delivered_seq = self.expected_seq_num
+        self.expected_seq_num = seq_add(self.expected_seq_num, len(payload))
+        if self.transfer_key is not None and self.bytes_received >= self.next_checkpoint:
+            self.checkpoint()
+
+    #records how much of the file is on disk, so a later connection can resume after it
+    def checkpoint(self):
+        self.sink.sync()
+        checkpoint.save(self.output_path, self.transfer_key, self.resume_offset + self.bytes_received, self.sink.digest())
+        self.next_checkpoint = self.bytes_received + CHECKPOINT_INTERVAL
+
+    #closes the output and, when the FIN carries the sender's digest, checks the file against it.
+    #Without a FIN the transfer died: its progress is checkpointed for the next connection
+    def finish(self, fin=None):
+        if self.sink is None or self.sink.closed:
+            return
+        if self.transfer_key is not None:
+            if fin is None:
+                self.checkpoint()
+            else:
+                checkpoint.remove(self.output_path)
+        self.sink.close()
+        self.metrics.stop()
+        logger.info(f"Receiver: {self.metrics.bytes_delivered} bytes from {self.addr} in {self.metrics.duration:.2f} s, "
+                    f"goodput {self.metrics.goodput / 1e3:.1f} kB/s, {self.metrics.checksum_failures} corrupt segments")
+        if METRICS_SUFFIX:
+            # ranges of one transfer share the output file, so their metrics are told apart by offset
+            at = f".{self.data_range[1]}" if self.data_range is not None else ""
+            self.metrics.dump(self.output_path + at + METRICS_SUFFIX)
+        expected = fin.options.get(OPT_DIGEST) if fin is not None else None
+        if expected is not None and self.sink.digest() is not None:
+            self.digest_ok = bytes(expected) == self.sink.digest()
+            if self.digest_ok:
+                logger.info(f"Receiver: {self.bytes_received} bytes received, digest verified.")
+            else:
+                logger.error(f"Receiver: {self.bytes_received} bytes received, digest MISMATCH.")
+
+    #ACK for receiver_ack_num, covering any held back one; advances our own sequence number.
+    #Every ACK is the same header object with its fields and checksum patched, so callers
+    #must serialize it before asking for the next one
+    def ack_packet(self, options=None):
+        self.metrics.acks_sent += 1
+        self.ack_pending, self.ack_deadline = 0, None
+        if self.trace:
+            logger.log(TRACE, f"Sending ACK for {self.receiver_ack_num}")
+        ack = self.ack_template
+        if ack is None:
+            ack = self.ack_template = self.make_header(ack=True, options=options)
+        else:
+            ack.update_fields(self.receiver_seq_num, self.receiver_ack_num, self.advertised_window(), options or {})
+        self.receiver_seq_num = seq_add(self.receiver_seq_num, 1)
+        return ack
+
+    def fin_ack_packet(self):
+        self.state = LAST_ACK
+        return self.make_header(fin=True, ack=True)
+
+    #drives the connection from any state, returns the list of headers to send back
+    def handle(self, header):
+        self.last_activity = time.monotonic()
+        if self.state == LISTEN:
+            # a corrupted SYN would set up the connection with a wrong ISN; the sender resends it
+            if header.syn and header.verify_checksum():
+                return [self.accept_syn(header)]
+        elif self.state == SYN_RECEIVED:
+            if header.syn:
+                if not header.verify_checksum():
+                    return []
+                if header.seq_num != self.sender_seq_num:
+                    # another ISN: a new attempt from the same port (the sender restarted), start over
+                    self.restart()
+                    return [self.accept_syn(header)]
+                # our SYN-ACK was lost; the sender retried (echo the new SYN's timestamp)
+                if self.timestamps and header.timestamp is not None:
+                    self.ts_recent = header.timestamp[0]
+                return [self.syn_ack_packet()]
+            if (not self.accept_handshake_ack(header) and header.ack_num == seq_add(self.receiver_seq_num, 1)
+                    and header.verify_checksum()):
+                # the final ACK was lost, but this segment acknowledges our SYN-ACK just the same
+                logger.info("Receiver: Handshake completed by a data segment.")
+                self.establish(seq_add(self.sender_seq_num, 2))
+                return self.handle(header)
+        elif self.state == ESTABLISHED:
+            if header.syn:
+                if not header.verify_checksum() or header.seq_num == self.sender_seq_num:
+                    return []  # corrupted, or an old duplicate of the SYN this connection began with
+                # the sender restarted: keep what was received (finish() checkpoints it) and
+                # start over, so the new SYN-ACK tells it where to resume
+                logger.info(f"Receiver: new SYN from {self.addr} during the transfer, starting over.")
+                self.finish()
+                self.restart()
+                return [self.accept_syn(header)]
+            if header.fin:
+                if not header.verify_checksum():
+                    return []
+                logger.info("Receiver: Received FIN, sending FIN-ACK...")
+                self.finish(header)
+                return [self.fin_ack_packet()]
+            ack = self.accept_data(header)
+            if ack is not None:
+                return [ack]
+        elif self.state == LAST_ACK:
+            if not header.verify_checksum():
+                return []
+            if header.fin:
+                return [self.make_header(fin=True, ack=True)]
+            if header.ack:
+                self.state = CLOSED
+                self.finish()
+        return []
+
+    @property
+    def closed(self):
+        return self.state == CLOSED
+
+
+#SYN-ACK whose sequence number is a SYN cookie; nothing about the sender is kept. Returns None
+#for a SYN that a cookie cannot stand for (a range of a parallel transfer); the sender retries it
+def stateless_syn_ack(addr, header, local_port=None):
+    connection = ReceiverConnection(addr, local_port=local_port)
+    connection.negotiate(header)
+    if connection.data_range is not None:
+        return None
+    connection.compression = None  # a cookie has no room for the codec or the resume key
+    connection.transfer_key = None
+    connection.receiver_seq_num = make_cookie(addr, header.seq_num, connection.cookie_features())
+    return connection.syn_ack_packet()
+
+
+#connection rebuilt from a handshake ACK (sequence number ISN + 1) or first data segment (ISN + 2)
+#that acknowledges a valid cookie; None for anything else
+def connection_from_cookie(addr, header, output_path=None, local_port=None):
+    if header.syn or header.fin or not header.verify_checksum():
+        return None
+    cookie = seq_add(header.ack_num, -1)
+    sender_isn = seq_add(header.seq_num, -1 if header.ack else -2)
+    features = check_cookie(cookie, addr, sender_isn)
+    if features is None:
+        return None
+    connection = ReceiverConnection(addr, output_path, local_port)
+    connection.restore(header, sender_isn, cookie, features)
+    return connection
+
+
+#serves a single sender from its SYN to the final ACK. The loop sleeps in select() until a
+#datagram arrives or a deadline is due (idle TIMEOUT, FIN_TIMEOUT while waiting for the last ACK,
+#or a delayed ACK). Each wakeup drains every waiting datagram and sends the replies in one burst
+def serve_connection(server_sock):
+    server_sock.setblocking(False)
+    reader = DatagramReader(server_sock)
+    writer = None
+    selector = selectors.DefaultSelector()
+    selector.register(server_sock, selectors.EVENT_READ)
+    timers = TimerHeap()
+    connection = None
+    idle_since = time.monotonic()
+    logger.info("Receiver: Waiting for SYN...")
+
+    def send(reply):
+        buffers = reply.to_buffers(connection.wire_format)
+        if EMULATED_DELAY:
+            timers.schedule_in(EMULATED_DELAY, lambda: writer.send(buffers))
+        else:
+            writer.queue(buffers)
+
+    def send_delayed_ack():
+        ack = connection.flush_ack()
+        if ack is not None:
+            send(ack)
+            writer.flush()
+
     while True:
-        try:
-            data, addr = server_socket.recvfrom(1024)
-            print(f"expected sequence 2 = {expectedSequenceNumber}")
-            #making sure they are the ones we are connected to
-            if (addr == (HOST,SENDER_PORT)):
-                #being able to read data
-                print(f"expected sequence 3 = {expectedSequenceNumber}")
-                data = ReliableTransportLayerProtocolHeader.from_bytes(data)
-
-                if(data.fin):
-                    print("Received FIN message. Moving on to ending connection")
-                    return [True,connection_details]
-                
-                if (data.seq_num == expectedSequenceNumber):
-                    print(f"expected sequence 4 = {expectedSequenceNumber}")
-                    if (data.verify_checksum()):
-                    #SET THE DETAILS RIGHT
-                        connection_details["receiverACKNum"] = expectedSequenceNumber
-                        print(f" Passing : {connection_details["receiverACKNum"]}")
-                        log_received_packet(data.app_data)
-                        print(f"Logged : {data.app_data}")
-                        send_ack(server_socket, connection_details)
-                        time.sleep(2)
-                        expectedSequenceNumber += connection_details["sender_mss"]
-                        connection_details["receiverACKNum"] = expectedSequenceNumber
-                    else:
-                        print("Packer corrupt. Dropped.")
-                else:
-                    print(f"Package {data.seq_num} out of order. Was Expecting: {expectedSequenceNumber}. Dropped.")
-        
-
-        except:
+        if connection is not None:
+            if connection.closed:
+                print("ACK received for FINACK. Connection Terminated")
+                break
+            idle_since = connection.last_activity
+        limit = FIN_TIMEOUT if connection is not None and connection.state == LAST_ACK else TIMEOUT
+        now = time.monotonic()
+        if now - idle_since >= limit:
             print("Socket Timed Out : Nothing Received")
-            return [False,connection_details]
-            
-        
+            break
+
+        if selector.select(min(timers.timeout(now, default=limit), idle_since + limit - now)):
+            for data, addr in reader.drain():
+                try:
+                    header = SegmentView.from_bytes(data)
+                except ValueError:
+                    continue
+                #the sender is whoever sent the first intact SYN; everyone else is ignored
+                if connection is None and header.syn and header.verify_checksum():
+                    connection = ReceiverConnection(addr)
+                    writer = DatagramWriter(server_sock, addr)
+                if connection is None or addr != connection.addr:
+                    continue
+                for reply in connection.handle(header):
+                    send(reply)
+                #once the MSS is negotiated, receive buffers only need to hold one segment
+                if connection.sender_mss and reader.datagram_size != datagram_size(connection.sender_mss):
+                    reader.resize(datagram_size(connection.sender_mss))
+            if writer is not None:
+                writer.flush()
+            if connection is not None and connection.ack_deadline is not None:
+                timers.schedule(connection.ack_deadline, send_delayed_ack, key="delayed_ack")
+        timers.run_expired()
+
+    selector.close()
+    if writer is not None:
+        writer.close()
+    if connection is not None:
+        connection.finish()
+    return connection
 
 
 def start_server():
     server_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     server_sock.bind((HOST, RECEIVER_PORT))
-    server_sock.settimeout(TIMEOUT)
-
-    connection_details = handshake(server_sock)
-
-    #if the connection was made successfully
-    if (connection_details["Alive"]):
-        received = receive_date(server_sock, connection_details)
-        if received[0]:
-            accept_fin(server_sock=server_sock, connection_details=received[1])
-        server_sock.close()
+    tune_socket(server_sock)
+    serve_connection(server_sock)
+    server_sock.close()
 
 if __name__ == "__main__":
     start_server()
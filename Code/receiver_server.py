@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from header import SegmentView, OPT_RESUME
+import receiver
+from receiver import ReceiverConnection, SYN_RECEIVED, stateless_syn_ack, connection_from_cookie
+from udpio import tune_socket
+
+OUTPUT_DIR = "received"  # one output file per connection is written here
+SWEEP_INTERVAL = 1.0  # seconds between checks for idle connections
+SYN_COOKIES = "pressure"  # "never", "always", or "pressure": once SYN_BACKLOG connections are half-open
+SYN_BACKLOG = 128  # half-open connections kept before SYNs are answered with cookies
+HALF_OPEN_TIMEOUT = 10  # seconds a connection may wait for the handshake ACK
+WORKERS = 1  # server processes sharing the port with SO_REUSEPORT (python receiver_server.py [workers])
+
+logger = logging.getLogger("ReceiverServer")
+
+
+class ReceiverServerProtocol(asyncio.DatagramProtocol):
+    """
+    UDP server that receives from many senders on one port.
+
+    Datagrams are demultiplexed by the sender's (ip, port); each sender gets its own
+    ReceiverConnection, created on its SYN and dropped once closed or idle for TIMEOUT.
+    Output files are named by the sender's IP and the transfer's resume key when it offers
+    one, so a transfer resumed from a new port picks up its checkpoint.
+    When SYN cookies are in use a SYN gets a stateless SYN-ACK instead, and the connection
+    is only created when a segment acknowledging a valid cookie comes back, so a flood of
+    SYNs costs no memory.
+    """
+
+    def __init__(self, output_dir=None, local_port=None, idle_timeout=None):
+        #the module settings are read now, so callers can still change them first
+        self.output_dir = OUTPUT_DIR if output_dir is None else output_dir
+        self.local_port = receiver.RECEIVER_PORT if local_port is None else local_port
+        self.idle_timeout = receiver.TIMEOUT if idle_timeout is None else idle_timeout
+        self.connections = {}
+        self.completed = 0  # connections that closed cleanly
+        self.bytes_received = 0  # payload bytes delivered by closed connections
+        self.transport = None
+        self._sweeper = None
+        self._ack_timers = {}  # addr -> timer handle of the connection's delayed ACK
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._sweeper = asyncio.get_running_loop().call_later(SWEEP_INTERVAL, self.sweep_idle)
+
+    def connection_lost(self, exc):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+        for timer in self._ack_timers.values():
+            timer.cancel()
+        for connection in self.connections.values():
+            connection.finish()
+
+    #a resumable transfer is named by its key, so a sender that restarts from another port finds
+    #its checkpoint again; anything else by the sender's address
+    def output_path(self, addr, header=None):
+        if receiver.RESUME_ENABLED and header is not None and header.syn and OPT_RESUME in header.options:
+            return os.path.join(self.output_dir, f"received_{addr[0]}_{bytes(header.options[OPT_RESUME]).hex()}.txt")
+        return os.path.join(self.output_dir, f"received_{addr[0]}_{addr[1]}.txt")
+
+    #drops an earlier connection still writing to output_path; finish() checkpoints it first
+    def release(self, output_path):
+        for addr, connection in list(self.connections.items()):
+            if connection.output_path == output_path:
+                logger.info(f"Connection {addr} replaced by a new one for {output_path}.")
+                connection.finish()
+                del self.connections[addr]
+
+    def datagram_received(self, data, addr):
+        try:
+            header = SegmentView.from_bytes(data)
+        except ValueError:
+            return
+
+        connection = self.connections.get(addr)
+        if connection is None:
+            if header.syn:
+                if not header.verify_checksum():
+                    return  # no state and no cookie for a corrupted SYN, the sender resends it
+                if self.use_cookies():
+                    reply = stateless_syn_ack(addr, header, self.local_port)
+                    if reply is not None:
+                        self.transport.sendto(reply.to_bytes(header.wire_format), addr)
+                    return
+                output_path = self.output_path(addr, header)
+                self.release(output_path)
+                connection = ReceiverConnection(addr, output_path, self.local_port)
+            else:
+                connection = connection_from_cookie(addr, header, self.output_path(addr), self.local_port)
+                if connection is None:
+                    return
+            self.connections[addr] = connection
+
+        for reply in connection.handle(header):
+            self.transport.sendto(reply.to_bytes(connection.wire_format), addr)
+        if connection.ack_deadline is not None and addr not in self._ack_timers:
+            self.schedule_ack(addr, connection.ack_deadline)
+
+        if connection.closed:
+            connection.finish()
+            self.completed += 1
+            self.bytes_received += connection.bytes_received
+            del self.connections[addr]
+
+    def schedule_ack(self, addr, deadline):
+        delay = max(0.0, deadline - time.monotonic())
+        self._ack_timers[addr] = asyncio.get_running_loop().call_later(delay, self.send_delayed_ack, addr)
+
+    def send_delayed_ack(self, addr):
+        del self._ack_timers[addr]
+        connection = self.connections.get(addr)
+        if connection is None:
+            return
+        ack = connection.flush_ack()
+        if ack is not None:
+            self.transport.sendto(ack.to_bytes(connection.wire_format), addr)
+        elif connection.ack_deadline is not None:
+            # the ACK this timer was for went out already and a newer one is waiting
+            self.schedule_ack(addr, connection.ack_deadline)
+
+    def use_cookies(self):
+        if SYN_COOKIES == "pressure":
+            half_open = sum(connection.state == SYN_RECEIVED for connection in self.connections.values())
+            return half_open >= SYN_BACKLOG
+        return SYN_COOKIES == "always"
+
+    def sweep_idle(self):
+        now = time.monotonic()
+        for addr, connection in list(self.connections.items()):
+            limit = HALF_OPEN_TIMEOUT if connection.state == SYN_RECEIVED else self.idle_timeout
+            if connection.last_activity < now - limit:
+                logger.info(f"Connection {addr} idle for {limit}s. Dropped.")
+                connection.finish()
+                del self.connections[addr]
+        self._sweeper = asyncio.get_running_loop().call_later(SWEEP_INTERVAL, self.sweep_idle)
+
+
+#with reuse_port several processes bind the port; the kernel hashes each sender's address to
+#one of them, so every datagram of a connection reaches the process holding its state
+async def serve(host=None, port=None, output_dir=None, reuse_port=False):
+    host = receiver.HOST if host is None else host
+    port = receiver.RECEIVER_PORT if port is None else port
+    output_dir = OUTPUT_DIR if output_dir is None else output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: ReceiverServerProtocol(output_dir, port), local_addr=(host, port), reuse_port=reuse_port or None)
+    tune_socket(transport.get_extra_info("socket"))
+    return transport, protocol
+
+
+async def run_server(reuse_port=False):
+    transport, protocol = await serve(reuse_port=reuse_port)
+    host, port = transport.get_extra_info("sockname")
+    logger.info(f"Receiver server {os.getpid()} listening on {host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        transport.close()
+
+
+def run_worker():
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_server(reuse_port=True))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else WORKERS
+    if workers > 1:
+        processes = [multiprocessing.Process(target=run_worker) for _ in range(workers)]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(run_server())
@@ -0,0 +1,63 @@
+import time
+
+# Default estimator parameters (RFC 6298)
+ALPHA = 0.125  # gain of the smoothed RTT
+BETA = 0.25  # gain of the RTT variation
+K = 4  # weight of the variation in the timeout
+INITIAL_TIMEOUT = 1.0  # seconds, before the first RTT sample
+MIN_TIMEOUT = 0.01
+MAX_TIMEOUT = 60.0
+BACKOFF_MULTIPLIER = 2
+MAX_BACKOFFS = 5
+
+
+class RttEstimator:
+    """
+    Jacobson/Karels round-trip time estimation and retransmission timeout.
+
+    sample() folds a measured RTT into SRTT/RTTVAR and recomputes the timeout as
+    SRTT + K * RTTVAR. backoff() multiplies the timeout after an expiry, at most
+    max_backoffs times in a row; the next valid sample clears the backoff. Callers apply
+    Karn's algorithm by not sampling segments that were retransmitted, unless the sample
+    comes from an echoed timestamp and is therefore unambiguous.
+    """
+
+    def __init__(self, alpha=ALPHA, beta=BETA, initial_timeout=INITIAL_TIMEOUT, min_timeout=MIN_TIMEOUT,
+                 max_timeout=MAX_TIMEOUT, multiplier=BACKOFF_MULTIPLIER, max_backoffs=MAX_BACKOFFS):
+        self.alpha = alpha
+        self.beta = beta
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.multiplier = multiplier
+        self.max_backoffs = max_backoffs
+        self.srtt = None
+        self.rttvar = None
+        self.base_timeout = initial_timeout  # timeout without backoff
+        self.backoffs = 0
+
+    def sample(self, rtt):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - self.beta) * self.rttvar + self.beta * abs(self.srtt - rtt)
+            self.srtt = (1 - self.alpha) * self.srtt + self.alpha * rtt
+        self.base_timeout = min(max(self.srtt + K * self.rttvar, self.min_timeout), self.max_timeout)
+        self.backoffs = 0
+
+    def backoff(self):
+        self.backoffs = min(self.backoffs + 1, self.max_backoffs)
+
+    @property
+    def timeout(self):
+        return min(self.base_timeout * self.multiplier ** self.backoffs, self.max_timeout)
+
+
+def timestamp_now():
+    # value for the TSval field of the timestamp option: a 32-bit microsecond clock
+    return int(time.monotonic() * 1_000_000) & 0xFFFFFFFF
+
+
+def timestamp_rtt(tsecr):
+    # seconds since the echoed TSval was taken (correct across the 32-bit wrap)
+    return ((timestamp_now() - tsecr) & 0xFFFFFFFF) / 1_000_000
@@ -0,0 +1,101 @@
+import hashlib
+import mmap
+import os
+from header import MAX_MSS
+
+HASH_CHUNK = 1024 * 1024  # bytes hash_through() hashes at a time, ahead of the segments sent
+
+
+class FileSegmenter:
+    """
+    Splits a file into MSS-sized byte segments without reading it into memory.
+
+    The file is memory-mapped and each segment is a memoryview slice of the mapping,
+    so a segment only costs memory while something (e.g. the send window) holds it.
+    Works for any file content, text or binary. offset and length restrict it to one
+    range of the file (offsets are then relative to the start of the range).
+
+    After start_digest() the SHA-256 is computed as sending goes: hash_through() hashes up
+    to the segments sent so far, and digest() whatever is left, so the first segment does
+    not wait for the whole file to be read.
+    """
+
+    def __init__(self, file_path, mss, offset=0, length=None):
+        if not 0 < mss <= MAX_MSS:
+            raise ValueError(f"MSS must be between 1 and {MAX_MSS} bytes, got {mss}")
+        self.mss = mss
+        self.file_path = file_path
+        self.offset = offset
+        with open(file_path, "rb") as file:
+            file_size = os.fstat(file.fileno()).st_size
+            if not 0 <= offset <= file_size:
+                raise ValueError(f"offset {offset} is outside the file ({file_size} bytes)")
+            self.size = file_size - offset if length is None else min(length, file_size - offset)
+            # mmap offsets must be multiples of the allocation granularity
+            map_offset = offset - offset % mmap.ALLOCATIONGRANULARITY
+            # mmap cannot map an empty file
+            self._map = mmap.mmap(file.fileno(), offset + self.size - map_offset, access=mmap.ACCESS_READ,
+                                  offset=map_offset) if self.size else None
+        if self._map is not None and hasattr(self._map, "madvise"):
+            self._map.madvise(mmap.MADV_SEQUENTIAL)
+        self._view = memoryview(self._map)[offset - map_offset:] if self._map is not None else memoryview(b"")
+        self._hash = None  # running SHA-256, None until start_digest()
+        self._hashed = 0  # bytes of the segments in it
+
+    def __len__(self):
+        # number of segments (the last one may be shorter than the MSS)
+        return (self.size + self.mss - 1) // self.mss
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("segment index out of range")
+        return self.segment_at(index * self.mss)
+
+    def __iter__(self):
+        for offset in range(0, self.size, self.mss):
+            yield self.segment_at(offset)
+
+    def segment_at(self, offset):
+        # segment starting at a byte offset of the file (zero-copy)
+        return self._view[offset:offset + self.mss]
+
+    def start_digest(self, prefix=None):
+        # prefix: SHA-256 object of the bytes before the segments (a resumed transfer), see prefix_hash()
+        self._hash = hashlib.sha256() if prefix is None else prefix
+        self._hashed = 0
+
+    def hash_through(self, end):
+        # adds the bytes up to offset end to the running digest, a HASH_CHUNK at a time
+        if self._hash is None or end <= self._hashed:
+            return
+        stop = min(self.size, max(end, self._hashed + HASH_CHUNK))
+        self._hash.update(self._view[self._hashed:stop])
+        self._hashed = stop
+
+    def prefix_hash(self, end):
+        # SHA-256 object of the first end bytes
+        return hashlib.sha256(self._view[:end])
+
+    def digest(self):
+        # SHA-256 of the file (or range), hashed straight from the mapping
+        if self._hash is None:
+            return hashlib.sha256(self._view).digest()
+        self.hash_through(self.size)
+        return self._hash.digest()
+
+    def close(self):
+        self._view.release()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # segments are still referenced; the mapping goes away with the last one
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,68 @@
+from array import array
+
+# segment states
+FREE = 0  # slot not used (acknowledged cumulatively, or never filled)
+IN_FLIGHT = 1  # sent, not acknowledged
+SACKED = 2  # acknowledged by a SACK block, still above the cumulative ACK
+
+
+class SendBuffer:
+    """
+    Fixed-size circular table of the segments between the oldest unacknowledged one and the
+    next one to send. Segment i lives in slot i % capacity.
+
+    The per-segment state is kept in parallel arrays (state, time of the last transmission,
+    retransmission count, file offset and length) allocated once, so memory is
+    O(capacity) however large the transfer is, and a slot is reused as soon as the
+    cumulative ACK passes its segment. The caller keeps the segments it tracks within
+    capacity of each other.
+    """
+
+    __slots__ = ("capacity", "state", "send_time", "retransmits", "offset", "length", "in_flight")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.state = bytearray(capacity)
+        self.send_time = array("d", bytes(8 * capacity))
+        self.retransmits = array("I", bytes(4 * capacity))
+        self.offset = array("q", bytes(8 * capacity))
+        self.length = array("I", bytes(4 * capacity))
+        self.in_flight = 0  # number of IN_FLIGHT slots
+
+    def add(self, index, offset, length):
+        slot = index % self.capacity
+        if self.state[slot] != FREE:
+            raise ValueError(f"slot of segment {index} is still in use")
+        self.state[slot] = IN_FLIGHT
+        self.retransmits[slot] = 0
+        self.offset[slot] = offset
+        self.length[slot] = length
+        self.in_flight += 1
+
+    def sent(self, index, now, retransmission=False):
+        slot = index % self.capacity
+        self.send_time[slot] = now
+        if retransmission:
+            self.retransmits[slot] += 1
+
+    def is_in_flight(self, index):
+        return self.state[index % self.capacity] == IN_FLIGHT
+
+    def is_sacked(self, index):
+        return self.state[index % self.capacity] == SACKED
+
+    def acknowledge(self, index):
+        # marks an in-flight segment acknowledged; False if it was not in flight
+        slot = index % self.capacity
+        if self.state[slot] != IN_FLIGHT:
+            return False
+        self.state[slot] = SACKED
+        self.in_flight -= 1
+        return True
+
+    def release(self, index):
+        # frees the slot once the cumulative ACK has passed the segment
+        slot = index % self.capacity
+        if self.state[slot] == IN_FLIGHT:
+            self.in_flight -= 1
+        self.state[slot] = FREE
@@ -1,11 +1,22 @@
 import socket
 import random
-from header import ReliableTransportLayerProtocolHeader
+from header import ReliableTransportLayerProtocolHeader, SegmentView, WIRE_BINARY, MAX_DATAGRAM_SIZE, OPT_SELECTIVE_REPEAT, OPT_SACK_PERMITTED, OPT_TIMESTAMP, OPT_DIGEST, OPT_WINDOW_SCALE, OPT_RANGE, OPT_FAST_OPEN, OPT_COMPRESSION, OPT_RESUME, MAX_WINDOW, MAX_WINDOW_SCALE, encode_timestamp, encode_range, datagram_size
+from segmenter import FileSegmenter
+from timers import TimerHeap
+from rtt import RttEstimator, timestamp_now, timestamp_rtt
+from congestion import make_controller, DUPLICATE_ACK_THRESHOLD
+from udpio import DatagramReader, DatagramWriter, tune_socket
+from metrics import ConnectionMetrics, TRACE, tracing
+from transfer_trace import TraceWriter, CWND, RTT, INFLIGHT, RETRANSMIT
+from sendbuffer import SendBuffer
+from seqnum import seq_add, seq_diff, seq_gt, seq_ge, random_isn
+from compression import AdaptiveCompressor, CODECS, available
+from pacing import TokenBucket, pacing_rate, bucket_depth
+from checkpoint import transfer_key
 import logging
 import time
-import copy
+import selectors
 import warnings
-import matplotlib.pyplot as plt
 warnings.filterwarnings("ignore")
 
 
@@ -14,65 +25,79 @@ HOST = '127.0.0.1'   #IP for both sender and receiver
 SENDER_PORT = 8001
 RECEIVER_PORT = 8000  
 WINDOW_SIZE = 9
-MSS = 15
+MSS = 15  # payload bytes per segment, up to header.MAX_MSS
 SOCKET_TIMEOUT = 20
-CURRENT_TIMEOUT = 60
-BETA = 0.8
-ALPHA = 0.125
-MAX_RETRIES = 5
-TIMEOUT_MULTIPLIER = 2
+INITIAL_TIMEOUT = 1.0  # retransmission timeout until the first RTT sample (seconds)
+MIN_TIMEOUT = 0.01
+MAX_TIMEOUT = 60  # upper bound of the retransmission timeout
+BETA = 0.25  # gain of the RTT variation estimate
+ALPHA = 0.125  # gain of the smoothed RTT
+MAX_RETRIES = 5  # also the most times in a row the retransmission timeout is backed off
+SYN_RETRIES = 5  # SYN retransmissions, INITIAL_TIMEOUT apart and doubling, before the handshake gives up
+TIMEOUT_MULTIPLIER = 2  # retransmission timeout backoff after each expiry
 LOSS_PROBABILITY = 0.0 # % of packet loss / corruption probability for simulation
-CWND_INIT = MSS  # Initial congestion window size
-CWND_MAX = WINDOW_SIZE * MSS  # Maximum congestion window size
-SLOW_START = "SLOW_START"
-CONGESTION_AVOIDANCE = "CONGESTION_AVOIDANCE"
-cwnd_values = []  # List to store CWND_INIT values for plotting
-cwnd_timestamps = []  # List to store timestamps corresponding to CWND values
-# Initialize state
-congestion_state = SLOW_START
-# Slow start threshold (ssthresh)
-ssthresh = CWND_MAX // 2  # Can be adjusted
-
-
-
-logging.basicConfig(level=logging.DEBUG)
+EMULATED_ACK_DELAY = 0.0  # emulation only: seconds each ACK is held before it is processed (0 = off)
+WIRE_FORMAT = WIRE_BINARY  # header format offered in the SYN (WIRE_TEXT for legacy receivers)
+GO_BACK_N = "GO_BACK_N"
+SELECTIVE_REPEAT = "SELECTIVE_REPEAT"
+ARQ_MODE = SELECTIVE_REPEAT  # requested in the SYN; falls back to GO_BACK_N if the receiver does not agree
+SACK_ENABLED = True  # offer SACK in the SYN so the receiver reports out of order ranges
+TIMESTAMPS_ENABLED = True  # offer timestamps in the SYN for unambiguous RTT samples
+FAST_OPEN = False  # send the first segment on the SYN (binary format), saving a round trip on short transfers
+WINDOW_SCALE_ENABLED = True  # offer window scaling in the SYN so the receiver can advertise more than 64 KiB
+COMPRESSION = ("zstd", "lz4", "zlib")  # codecs offered in the SYN, preferred first (those installed); () = off
+CWND_MAX = None  # Maximum congestion window size; None = the largest window the receiver can advertise (scaled)
+SEND_BUFFER_SEGMENTS = None  # segments tracked from the oldest unacknowledged one (at least CWND_MAX worth); None = twice that
+CONGESTION_CONTROL = "newreno"  # one of congestion.CONTROLLERS: reno, newreno, cubic, bbr
+RESUME = True  # offer to resume the file where an earlier, unfinished transfer of it stopped (whole files only)
+PACING = True  # spread segments over the RTT at the pacing rate instead of sending each window in one burst
+
+
+
+LOG_LEVEL = logging.DEBUG  # metrics.TRACE adds a line per packet
+logging.basicConfig(level=LOG_LEVEL)
 logger = logging.getLogger("Sender")
 
 
 
-# Read data from a file
-def read_data_from_file(file_path="data.txt"):
-    """
-    Reads and returns the content of a file.
-    """
-    try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            return file.read()
-    except FileNotFoundError:
-        print(f"File {file_path} not found.")
-        return ""
-    except UnicodeDecodeError:
-        print(f"Error decoding file {file_path}. Please check the file encoding.")
-        return ""
-
-
-# Replace DATA with content from data.txt
-DATA = read_data_from_file("data.txt")
+DATA_FILE = "data.txt"  # file sent to the receiver
+SEND_DIGEST = True  # put the SHA-256 of the file in the FIN so the receiver can check its copy
+METRICS_FILE = None  # where to write the connection's metrics at the end (*.json for JSON, else Prometheus text)
+TRACE_FILE = None  # stream cwnd/RTT/inflight/retransmit events here (*.csv or *.jsonl); plot with transfer_trace.py
+INITIAL_SEQUENCE = None  # ISN of the SYN; None picks a random one (e.g. 2**32 - 1000 to cross the wrap at once)
+PLOT_CWND = False  # show the cwnd plot when the transfer ends (imports matplotlib and needs a display)
 
 # 3 - way handhsake 
-def handshake(sender_socket):
+# data_range is (transfer id, offset, length, total size) when the data is one range of a parallel transfer.
+# first_segment, when given, rides on the SYN (fast open); connection_details["fast_open_acked"] tells if it was accepted.
+# resume_key (checkpoint.transfer_key) offers to resume; connection_details["resume_offset"] is where to start.
+# The SYN is resent with an exponentially growing timeout, at most SYN_RETRIES times
+def handshake(sender_socket, data_range=None, first_segment=None, resume_key=None):
 
     #intialises an empty details dictionary 
     connection_details = {
         "Alive": False,
         "IP": 0,
         "Port": 0,
+        "sender_port": sender_socket.getsockname()[1],  # what the socket got bound to (0 = any port)
         "receiverSeqNum": 0,
         "receiverACKNum": 0,
         "receiver_window": 0,
+        "window_scale": 0,
         "receiver_mss": 0,
         "senderSeqNum": 0,
-        "senderACKNum": 0
+        "senderACKNum": 0,
+        "wire_format": WIRE_FORMAT,
+        "arq_mode": GO_BACK_N,
+        "sack": False,
+        "timestamps": False,
+        "handshake_rtt": None,
+        "congestion_control": CONGESTION_CONTROL,
+        "pacing": PACING,
+        "digest": None,
+        "compression": None,  # codec id the receiver chose
+        "fast_open_acked": 0,  # segments delivered with the SYN
+        "resume_offset": 0  # bytes of the file the receiver already has
     }
 
     logger.info("Sender: Sending SYN to initiate handshake...")
@@ -80,215 +105,502 @@ def handshake(sender_socket):
     synbit = 1
 
     #choosing a sequence number
-    seq = random.randint(0,2000)
+    seq = random_isn() if INITIAL_SEQUENCE is None else INITIAL_SEQUENCE
 
     print(f"SEQUENCE NUMBER : {seq} at start")
     ack_num = 0
 
-    #send SYN message
-    message = ReliableTransportLayerProtocolHeader(SENDER_PORT, RECEIVER_PORT, seq, ack_num, WINDOW_SIZE, MSS, syn=synbit, app_data=app_data)
-    sender_socket.sendto(message.to_bytes(), (HOST, RECEIVER_PORT))
-
-    try:
-        data, addr = sender_socket.recvfrom(1024)
-        data = ReliableTransportLayerProtocolHeader.from_bytes(data)
-        if addr == (HOST, RECEIVER_PORT):
-            if data.syn == 1 and data.ack == 1 and data.ack_num == seq + 1:
-                logger.info("Sender: Received SYN-ACK, sending ACK...")
-
-                connection_details["Alive"] = True
-                connection_details["receiver_window"] = data.sending_window
-                connection_details["receiver_mss"] = data.mss
-                connection_details["Port"] = addr[1]
-                connection_details["receiverSeqNum"] = data.seq_num
-                connection_details["receiverACKNum"] = data.ack_num
-                connection_details["senderSeqNum"] = seq + 1
-                print("")
-                connection_details["senderACKNum"] = connection_details["receiverSeqNum"] + 1
-                print(f"SEQUENCE NUMBER : {connection_details["senderSeqNum"]} after handshake step 3")
-                ack_bit = 1
-                app_data = "Great! Let's connect"
-                message = ReliableTransportLayerProtocolHeader(SENDER_PORT, RECEIVER_PORT, connection_details["senderSeqNum"], connection_details["senderACKNum"], WINDOW_SIZE, MSS, ack=ack_bit, app_data=app_data)
-                sender_socket.sendto(message.to_bytes(), (HOST, RECEIVER_PORT))
-                logger.info("Sender: Sent ACK in response to SYNACK. 3-way handshake complete")
-                connection_details["senderSeqNum"] += 1 #since the next data will also be from sender
-    except:
-        #if it fails to receive anything back
-        return connection_details 
+    #options are only available in the binary format
+    options = {}
+    if ARQ_MODE == SELECTIVE_REPEAT and WIRE_FORMAT == WIRE_BINARY:
+        options[OPT_SELECTIVE_REPEAT] = b""
+    if SACK_ENABLED and WIRE_FORMAT == WIRE_BINARY:
+        options[OPT_SACK_PERMITTED] = b""
+    if WINDOW_SCALE_ENABLED and WIRE_FORMAT == WIRE_BINARY:
+        options[OPT_WINDOW_SCALE] = bytes((0,))  # we receive no data, so our own window is never scaled
+    if data_range is not None:
+        transfer_id, offset, _, total_size = data_range
+        options[OPT_RANGE] = encode_range(transfer_id, offset, total_size)
+    if COMPRESSION and WIRE_FORMAT == WIRE_BINARY and available(COMPRESSION):
+        options[OPT_COMPRESSION] = bytes(available(COMPRESSION))
+    if resume_key is not None and WIRE_FORMAT == WIRE_BINARY:
+        options[OPT_RESUME] = resume_key
+    if first_segment is not None and WIRE_FORMAT == WIRE_BINARY:
+        options[OPT_FAST_OPEN] = b""
+        app_data = first_segment
+
+    timeout = INITIAL_TIMEOUT
+    syn_ack = None
+    for attempt in range(SYN_RETRIES + 1):
+        if attempt:
+            logger.info(f"Sender: No SYN-ACK within {timeout:.1f} s, resending SYN...")
+            timeout = min(timeout * TIMEOUT_MULTIPLIER, MAX_TIMEOUT)
+        #a fresh timestamp each time, so the echo in the SYN-ACK says which SYN it answers
+        if TIMESTAMPS_ENABLED and WIRE_FORMAT == WIRE_BINARY:
+            options[OPT_TIMESTAMP] = encode_timestamp(timestamp_now())
+        #send SYN message
+        message = ReliableTransportLayerProtocolHeader(connection_details["sender_port"], RECEIVER_PORT, seq, ack_num, WINDOW_SIZE, MSS, syn=synbit, app_data=app_data, options=options)
+        syn_sent = time.monotonic()
+        try:
+            sender_socket.sendto(message.to_bytes(WIRE_FORMAT), (HOST, RECEIVER_PORT))
+        except OSError:
+            pass  # e.g. the receiver's port is not open yet; retry after the timeout
+        syn_ack = wait_for_syn_ack(sender_socket, seq, syn_sent + timeout)
+        if syn_ack is not None:
+            break
+    sender_socket.settimeout(SOCKET_TIMEOUT)
+    if syn_ack is None:
+        logger.error(f"Sender: No SYN-ACK after {SYN_RETRIES + 1} SYNs. Giving up.")
+        return connection_details
+
+    data = syn_ack
+    if data_range is not None and OPT_RANGE not in data.options:
+        logger.error("Sender: the receiver does not accept ranges of parallel transfers")
+        return connection_details
+    logger.info("Sender: Received SYN-ACK, sending ACK...")
+
+    connection_details["Alive"] = True
+    connection_details["receiver_window"] = data.sending_window
+    connection_details["receiver_mss"] = data.mss
+    connection_details["Port"] = RECEIVER_PORT
+    connection_details["receiverSeqNum"] = data.seq_num
+    connection_details["receiverACKNum"] = data.ack_num
+    connection_details["wire_format"] = data.wire_format  # receiver answers in the format it accepted
+    if OPT_SELECTIVE_REPEAT in data.options:
+        connection_details["arq_mode"] = SELECTIVE_REPEAT
+    connection_details["sack"] = OPT_SACK_PERMITTED in data.options
+    connection_details["timestamps"] = OPT_TIMESTAMP in data.options
+    if OPT_WINDOW_SCALE in data.options:
+        connection_details["window_scale"] = min(data.options[OPT_WINDOW_SCALE][0], MAX_WINDOW_SCALE)
+    chosen = data.options.get(OPT_COMPRESSION)
+    if chosen and OPT_COMPRESSION in options and chosen[0] in options[OPT_COMPRESSION]:
+        connection_details["compression"] = chosen[0]
+        logger.info(f"Sender: payloads compressed with {CODECS[chosen[0]].name}")
+    if data.options.get(OPT_RESUME) and OPT_RESUME in options:
+        connection_details["resume_offset"] = int.from_bytes(data.options[OPT_RESUME], "big")
+    if OPT_FAST_OPEN in data.options and OPT_FAST_OPEN in options:
+        connection_details["fast_open_acked"] = 1
+    #first RTT sample: the echoed timestamp, or the time since the SYN if it was not resent (Karn)
+    if data.timestamp is not None and data.timestamp[1]:
+        connection_details["handshake_rtt"] = timestamp_rtt(data.timestamp[1])
+    elif attempt == 0:
+        connection_details["handshake_rtt"] = time.monotonic() - syn_sent
+    connection_details["senderSeqNum"] = seq_add(seq, 1)
+    print("")
+    connection_details["senderACKNum"] = seq_add(connection_details["receiverSeqNum"], 1)
+    print(f"SEQUENCE NUMBER : {connection_details['senderSeqNum']} after handshake step 3")
+    ack_bit = 1
+    app_data = "Great! Let's connect"
+    message = ReliableTransportLayerProtocolHeader(connection_details["sender_port"], RECEIVER_PORT, connection_details["senderSeqNum"], connection_details["senderACKNum"], WINDOW_SIZE, MSS, ack=ack_bit, app_data=app_data)
+    sender_socket.sendto(message.to_bytes(connection_details["wire_format"]), (HOST, RECEIVER_PORT))
+    logger.info("Sender: Sent ACK in response to SYNACK. 3-way handshake complete")
+    connection_details["senderSeqNum"] = seq_add(connection_details["senderSeqNum"], 1) #since the next data will also be from sender
     return connection_details
 
 
-#converts data into MSS-sized chunks so that each chuck can be treated as a single packet
-# returns an array such that each index is a new packet's data
-def prepare_packets():
-    chunks = []
-    total_data_length = len(DATA)
-
-    for i in range(0, total_data_length, MSS):
-        chunk = DATA[i:i + MSS]
-        chunks.append(chunk)
-
-    return chunks
+#waits until deadline for the SYN-ACK answering the SYN with sequence number seq; anything else is ignored
+def wait_for_syn_ack(sender_socket, seq, deadline):
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        sender_socket.settimeout(remaining)
+        try:
+            data, addr = sender_socket.recvfrom(MAX_DATAGRAM_SIZE)
+        except socket.timeout:
+            return None
+        except ConnectionRefusedError:
+            #nobody listens yet; wait out this attempt's timeout before the next SYN
+            time.sleep(max(deadline - time.monotonic(), 0))
+            return None
+        try:
+            header = ReliableTransportLayerProtocolHeader.from_bytes(data)
+        except ValueError:
+            continue
+        if (addr == (HOST, RECEIVER_PORT) and header.syn == 1 and header.ack == 1
+                and header.ack_num == seq_add(seq, 1) and header.verify_checksum()):
+            return header
+
+
+#splits the file (or the range length bytes from offset) into MSS-sized segments so that each segment can be treated as a single packet
+# returns a segmenter such that each index is a new packet's data (read lazily from the file)
+def prepare_packets(file_path=None, offset=0, length=None):
+    file_path = DATA_FILE if file_path is None else file_path
+    try:
+        return FileSegmenter(file_path, MSS, offset, length)
+    except FileNotFoundError:
+        print(f"File {file_path} not found.")
+        return None
 
 
-def send_packet(sender_socket, connection_details, data, retransmission=False):
+#builds a data segment and queues it on the writer; it goes out with the writer's next burst
+def send_packet(writer, connection_details, data, retransmission=False, options=None):
     added = ""
     if retransmission:
         added = "(Retransmission)"
     if random.random() < LOSS_PROBABILITY:
         #simulating loss or corruption (half the time not sent, the other time corrupted )
         if random.random() < 0.5:
-            logger.debug(f"Client: {added} Simulating loss of packet {connection_details['senderSeqNum']}.")
+            logger.log(TRACE, f"Client: {added} Simulating loss of packet {connection_details['senderSeqNum']}.")
         else:
-            logger.debug(f"Client: {added} Simulating corruption of packet {connection_details['senderSeqNum']}.")
-            packet_header = ReliableTransportLayerProtocolHeader(SENDER_PORT, RECEIVER_PORT, connection_details["senderSeqNum"], connection_details["senderACKNum"], WINDOW_SIZE, MSS, app_data=data)
+            logger.log(TRACE, f"Client: {added} Simulating corruption of packet {connection_details['senderSeqNum']}.")
+            packet_header = ReliableTransportLayerProtocolHeader(connection_details["sender_port"], RECEIVER_PORT, connection_details["senderSeqNum"], connection_details["senderACKNum"], WINDOW_SIZE, MSS, app_data=data, options=options)
             packet_header.checksum +=  1
-            sender_socket.sendto(packet_header.to_bytes(), (HOST, RECEIVER_PORT))
+            writer.queue(packet_header.to_buffers(connection_details["wire_format"]))
         return
-    packet_header = ReliableTransportLayerProtocolHeader(SENDER_PORT, RECEIVER_PORT, connection_details["senderSeqNum"], connection_details["senderACKNum"], WINDOW_SIZE, MSS, app_data=data)
-    packet_bytes = packet_header.to_bytes()
-    sender_socket.sendto(packet_bytes, (HOST, RECEIVER_PORT))
-    logger.debug(f"Client: {added} Sent packet {connection_details['senderSeqNum']}.")
+    packet_header = ReliableTransportLayerProtocolHeader(connection_details["sender_port"], RECEIVER_PORT, connection_details["senderSeqNum"], connection_details["senderACKNum"], WINDOW_SIZE, MSS, app_data=data, options=options)
+    writer.queue(packet_header.to_buffers(connection_details["wire_format"]))
 
 
 
-#received acks, checks for corruption, and then updates it in the set holding all acked numbers
-def receive_ack(sender_socket, specific_cd, connection_details):
-    try:
-        time.sleep(5)
-        ack, addr = sender_socket.recvfrom(1024)
-        header = ReliableTransportLayerProtocolHeader.from_bytes(ack)
-        desiredAck = specific_cd["senderSeqNum"]
-        print(f"ACKed = {header.ack_num}")
-        print(f"Want ACK for = {desiredAck}")
-        #ack not corrupted
-        if(header.verify_checksum()):
-            # if the right person sent it
-            if(addr == (HOST,RECEIVER_PORT)):
-                #if the ack bit is set
-                if ((header.ack_num == desiredAck)):
-                    #We received an acknowledgment for this packet
-                    print(f"Received ACK for {desiredAck} BEFORE")
-                    connection_details["receiverACKNum"] = header.ack_num 
-                    connection_details["senderACKNum"] = connection_details["receiverSeqNum"] + connection_details["receiver_mss"]
-                    print(f"Received ACK for {desiredAck} AFTER")
-                    return True
-                else:
-                    print("Not an ACK message. Ignored.")
-                    return False
-            else:
-                print("Unrecognized sender. Discarded")
-                return False
+#reads the datagrams waiting on the (non-blocking) socket and returns the valid ACK headers.
+#ACKs carry no payload and their options are decoded (copied) here, so the headers outlive the reader's buffers
+def drain_acks(reader, metrics):
+    headers = []
+    for ack, addr in reader.drain():
+        try:
+            header = SegmentView.from_bytes(ack)
+        except ValueError:
+            continue
+        #ack not corrupted, from the right person and with the ack bit set
+        if not header.verify_checksum():
+            metrics.checksum_failures += 1
+            logger.log(TRACE, "Corrupted ACK. Discarded")
+        elif header.ack and addr == (HOST, RECEIVER_PORT):
+            header.options  # decoded now, while the buffer still holds the datagram
+            headers.append(header)
         else:
-            print("Corrupted ACK. Discarded")
-            return False
-    except Exception as e:
-        print(e) #this line is printing timed out message
-        print("Waiting to receive...")
-        return False
+            logger.log(TRACE, "Unexpected datagram. Discarded")
+    return headers
+
 
+class SendWindow:
+    """
+    Sliding window over the segments of one transfer (segments are named by their index).
+    Their state lives in a SendBuffer ring starting at base, by default twice the largest
+    window the receiver can advertise with the negotiated scale, as is the congestion window's cap.
+
+    ACKs are cumulative: ack_num is the last segment the receiver got in order, so it
+    acknowledges every segment up to it, and SACK blocks acknowledge ranges above it.
+    Go-Back-N keeps one timer for the oldest segment in flight and resends everything in
+    flight when it expires; Selective Repeat keeps a timer per segment and resends only
+    the segments whose timer expired. Timers use the RTO of an RttEstimator fed from ACKs.
+    DUPLICATE_ACK_THRESHOLD duplicate ACKs trigger a fast retransmit of the oldest segment;
+    how the window reacts is up to the connection's CongestionController.
+
+    Segments in flight are capped by min(cwnd, rwnd), rwnd being the (scaled) window of the
+    latest ACK. With pacing, new segments also wait for tokens of a bucket filled at the
+    pacing rate (see pacing.py); every transmission spends them. While the receiver's window is closed and nothing is in flight, a persist
+    timer sends empty probe segments, backed off like the RTO, until an ACK reopens it.
+    """
 
-#function that retransmits the entire window when the base times out
-def retransmit_window(sender_socket, base, last, sent_packets):
-    for i in range(base,last+MSS,MSS):
-        if(i in sent_packets):
-            print(f"Intending to Retransmit : {i}")
-            send_packet(sender_socket, sent_packets[i][1], sent_packets[i][2], retransmission=True)
-            sent_packets[i][0] = time.time() #resetting timer if it needs to be retransmitted again
+    def __init__(self, writer, connection_details, data, timers, tracer=None):
+        self.writer = writer
+        self.tracer = tracer  # TraceWriter or None
+        self.connection_details = connection_details
+        self.data = data
+        self.timers = timers
+        self.selective_repeat = connection_details["arq_mode"] == SELECTIVE_REPEAT
+        self.initial_sequence = connection_details["senderSeqNum"]
+        self.total_packets = len(data)
+        self.base = connection_details["fast_open_acked"]  # index of the oldest unacknowledged segment
+        self.next_index = self.base  # index of the next segment never sent
+        #the window is only ever limited by the receiver's, up to the largest it can advertise
+        self.window_scale = connection_details["window_scale"]
+        cwnd_max = CWND_MAX if CWND_MAX is not None else MAX_WINDOW << self.window_scale
+        window_segments = -(-cwnd_max // MSS)
+        buffer_segments = SEND_BUFFER_SEGMENTS if SEND_BUFFER_SEGMENTS is not None else 2 * window_segments
+        self.buffer = SendBuffer(max(buffer_segments, window_segments))
+        self.expired = []  # segments whose timer fired since the last handle_timeouts()
+        self.timestamps = connection_details["timestamps"]
+        codec = connection_details["compression"]
+        self.compressor = AdaptiveCompressor(codec) if codec is not None else None
+        self.rtt = RttEstimator(ALPHA, BETA, INITIAL_TIMEOUT, MIN_TIMEOUT, MAX_TIMEOUT, TIMEOUT_MULTIPLIER, MAX_RETRIES)
+        if connection_details["handshake_rtt"] is not None:
+            self.rtt.sample(connection_details["handshake_rtt"])
+        self.congestion = make_controller(connection_details["congestion_control"], MSS, cwnd_max)
+        self.pacing = connection_details["pacing"]
+        self.pacer = None  # TokenBucket, created with the first pacing rate
+        self.receive_window = connection_details["receiver_window"]  # rwnd in bytes; the SYN-ACK's is unscaled
+        self.probes = 0  # zero window probes sent since the window closed
+        self.last_ack_num = seq_add(self.seq_num(self.base), -MSS)  # highest cumulative ACK so far
+        self.duplicate_acks = 0
+        self.recovery_point = None  # highest segment sent when fast recovery started
+        self.metrics = ConnectionMetrics("sender", f"{HOST}:{RECEIVER_PORT}")
+        self.metrics.bytes_acked = min(self.base * MSS, data.size)  # delivered with the SYN
+        self.trace = tracing(logger)  # per-packet log lines, checked once here
+
+    @property
+    def done(self):
+        return self.base >= self.total_packets
+
+    @property
+    def flight_bytes(self):
+        return self.buffer.in_flight * MSS
+
+    #sequence number of a segment: every segment but the last is MSS bytes, so index * MSS is
+    #the file offset of its first byte
+    def seq_num(self, index):
+        return seq_add(self.initial_sequence, index * MSS)
+
+    def in_flight(self, index):
+        # only segments between base and next_index have a slot
+        return self.base <= index < self.next_index and self.buffer.is_in_flight(index)
+
+    #indexes of the segments in flight with start <= sequence number < end. Offsets are taken
+    #relative to base, which is always within a window of them, so wraparound does not matter
+    def in_flight_between(self, start, end):
+        base_offset = self.base * MSS
+        base_seq = self.seq_num(self.base)
+        first = max(self.base, -(-(base_offset + seq_diff(start, base_seq)) // MSS))
+        last = min(self.next_index, -(-(base_offset + seq_diff(end, base_seq)) // MSS))
+        is_in_flight = self.buffer.is_in_flight
+        return [index for index in range(first, last) if is_in_flight(index)]
+
+    def timer_key(self, index):
+        return ("rto", index) if self.selective_repeat else "rto"
+
+    def record_cwnd(self):
+        self.metrics.record_window(self.congestion.window, self.congestion.ssthresh)
+        if self.tracer is not None:
+            self.tracer.event(CWND, self.congestion.window, self.congestion.ssthresh)
+            self.tracer.event(INFLIGHT, self.flight_bytes)
+
+    #retransmission is None for a first transmission, otherwise why the segment is resent
+    def transmit(self, index, retransmission=None):
+        self.connection_details["senderSeqNum"] = self.seq_num(index)
+        segment = self.data.segment_at(self.buffer.offset[index % self.buffer.capacity])
+        metrics = self.metrics
+        options = {}
+        if self.compressor is not None:
+            payload, compressed = self.compressor.compress(segment)
+            if compressed:
+                options[OPT_COMPRESSION] = b""
+                metrics.segments_compressed += 1
+                metrics.bytes_saved += len(segment) - len(payload)
+                segment = payload
+        if self.timestamps:
+            options[OPT_TIMESTAMP] = encode_timestamp(timestamp_now())
+        send_packet(self.writer, self.connection_details, segment, retransmission, options)
+        self.buffer.sent(index, time.monotonic(), bool(retransmission))
+        metrics.segments_sent += 1
+        metrics.bytes_sent += len(segment)
+        if retransmission:
+            metrics.segments_retransmitted += 1
+            if self.tracer is not None:
+                self.tracer.event(RETRANSMIT, self.seq_num(index), retransmission)
+        if self.pacer is not None:
+            self.pacer.consume(len(segment))
+        if self.trace:
+            logger.log(TRACE, f"Client: {'(Retransmission) ' if retransmission else ''}Sent packet {self.seq_num(index)}.")
+        #the Go-Back-N timer keeps running while new segments are added behind the base
+        if self.selective_repeat or retransmission or self.timer_key(index) not in self.timers:
+            self.timers.schedule_in(self.rtt.timeout, lambda: self.expired.append(index), key=self.timer_key(index))
+
+    #sends new segments while the congestion window, the receiver's window and the send buffer have
+    #room and, with pacing, the token bucket allows it
+    def fill(self):
+        window = min(max(1, self.congestion.window // MSS), self.receive_window // MSS)
+        buffer = self.buffer
+        size = self.data.size
+        pacer = self.update_pacer() if self.pacing else None
+        while (self.next_index < self.total_packets and buffer.in_flight < window
+               and self.next_index - self.base < buffer.capacity):
+            if pacer is not None:
+                wait = pacer.delay(MSS)
+                if wait:
+                    #only wakes the send loop up, which calls fill() again
+                    self.timers.schedule_in(wait, lambda: None, key="pace")
+                    break
+            offset = self.next_index * MSS
+            buffer.add(self.next_index, offset, min(MSS, size - offset))
+            self.next_index += 1
+            self.transmit(self.next_index - 1)
+        self.data.hash_through(self.next_index * MSS)  # what went out joins the file's digest, if one is wanted
+        #nothing in flight will bring an ACK that reopens a closed window
+        if window == 0 and buffer.in_flight == 0 and not self.done and "persist" not in self.timers:
+            self.timers.schedule_in(min(self.rtt.timeout * 2 ** self.probes, MAX_TIMEOUT), self.probe, key="persist")
+
+    #the token bucket at the current pacing rate, None until there is a rate (no RTT sample yet)
+    def update_pacer(self):
+        rate = pacing_rate(self.congestion, self.rtt.srtt)
+        if rate is None:
+            return None
+        if self.pacer is None:
+            self.pacer = TokenBucket(rate, bucket_depth(rate, MSS))
+        else:
+            self.pacer.set_rate(rate, bucket_depth(rate, MSS))
+        return self.pacer
+
+    #zero window probe: an empty segment at the next sequence number, answered with an ACK
+    def probe(self):
+        if self.receive_window >= MSS or self.buffer.in_flight or self.next_index >= self.total_packets:
+            return
+        self.connection_details["senderSeqNum"] = self.seq_num(self.next_index)
+        send_packet(self.writer, self.connection_details, b"")
+        self.probes += 1
+        self.metrics.window_probes += 1
+        logger.debug(f"Zero window probe {self.probes}")
+        self.timers.schedule_in(min(self.rtt.timeout * 2 ** self.probes, MAX_TIMEOUT), self.probe, key="persist")
+
+    def on_ack(self, header):
+        now = time.monotonic()
+        self.metrics.acks_received += 1
+        buffer = self.buffer
+        #window updates from ACKs older than the latest one are stale
+        if seq_ge(header.ack_num, self.last_ack_num):
+            self.receive_window = header.sending_window << self.window_scale
+            if self.probes and self.receive_window >= MSS:
+                self.probes = 0
+                self.timers.cancel("persist")
+        newly_acked = self.in_flight_between(self.seq_num(self.base), seq_add(header.ack_num, 1))
+        for start, end in header.sack_blocks:
+            newly_acked += self.in_flight_between(start, end)
+        newly_acked = [index for index in newly_acked if buffer.acknowledge(index)]
+
+        advanced = seq_gt(header.ack_num, self.last_ack_num)
+        if advanced:
+            self.last_ack_num = header.ack_num
+            self.connection_details["receiverACKNum"] = header.ack_num
+            self.duplicate_acks = 0
+        elif buffer.in_flight or newly_acked:
+            self.on_duplicate_ack(now)
+
+        if newly_acked:
+            length = buffer.length
+            self.metrics.bytes_acked += sum(length[index % buffer.capacity] for index in newly_acked)
+            self.sample_rtt(header, newly_acked)
+            if self.selective_repeat:
+                for index in newly_acked:
+                    self.timers.cancel(self.timer_key(index))
+            #slots below the cumulative ACK are free for new segments
+            while self.base < self.next_index and buffer.is_sacked(self.base):
+                buffer.release(self.base)
+                self.base += 1
+            self.on_new_data_acked(len(newly_acked) * MSS, advanced, now)
+
+            #Go-Back-N: restart the timer for the new oldest segment, stop it when nothing is in flight
+            if not self.selective_repeat:
+                if buffer.in_flight:
+                    self.timers.schedule_in(self.rtt.timeout, lambda: self.expired.append(self.base), key="rto")
+                else:
+                    self.timers.cancel("rto")
+        self.record_cwnd()
+
+    def on_duplicate_ack(self, now):
+        self.duplicate_acks += 1
+        self.metrics.duplicate_acks += 1
+        if self.recovery_point is not None:
+            self.congestion.on_duplicate_ack()
+        elif self.duplicate_acks == DUPLICATE_ACK_THRESHOLD and self.in_flight(self.base):
+            logger.debug(f"Fast retransmit of {self.seq_num(self.base)}")
+            self.metrics.fast_retransmits += 1
+            self.recovery_point = self.next_index - 1
+            self.congestion.enter_recovery(self.flight_bytes, now)
+            self.transmit(self.base, retransmission="fast")
+
+    def on_new_data_acked(self, acked_bytes, advanced, now):
+        if self.recovery_point is None:
+            self.congestion.on_ack(acked_bytes, self.rtt.srtt, now)
+        elif self.base > self.recovery_point:
+            #everything outstanding at the loss is acknowledged
+            self.recovery_point = None
+            self.congestion.exit_recovery(now)
+        elif advanced:
+            #partial ACK: the next hole was lost as well
+            if self.congestion.on_partial_ack(acked_bytes, now):
+                if self.in_flight(self.base):
+                    self.transmit(self.base, retransmission="partial")
+            else:
+                self.recovery_point = None
+                self.congestion.exit_recovery(now)
+
+    #RTT sample from an ACK of new data: the echoed timestamp when there is one, otherwise the
+    #newest acknowledged segment that was sent only once (Karn's algorithm)
+    def sample_rtt(self, header, newly_acked):
+        rtt = None
+        if self.timestamps and header.timestamp is not None:
+            rtt = timestamp_rtt(header.timestamp[1])
+        else:
+            capacity = self.buffer.capacity
+            retransmits = self.buffer.retransmits
+            clean = [index for index in newly_acked if not retransmits[index % capacity]]
+            if clean:
+                rtt = time.monotonic() - self.buffer.send_time[max(clean) % capacity]
+        if rtt is not None:
+            self.rtt.sample(rtt)
+            self.metrics.observe_rtt(rtt)
+            if self.tracer is not None:
+                self.tracer.event(RTT, rtt)
+
+    def handle_timeouts(self):
+        if not self.expired:
+            return
+        expired, self.expired = self.expired, []
+        self.metrics.timeouts += 1
+        self.rtt.backoff()
+        self.congestion.on_timeout(self.flight_bytes, time.monotonic())
+        self.recovery_point = None
+        self.duplicate_acks = 0
+        self.record_cwnd()
+        if self.selective_repeat:
+            for index in expired:
+                if self.in_flight(index):
+                    self.transmit(index, retransmission="timeout")
+        else:
+            #Go-Back-N: resend the whole window
+            for index in range(self.base, self.next_index):
+                if self.buffer.is_in_flight(index):
+                    self.transmit(index, retransmission="timeout")
 
 
-#sends data to the receiver while sliding the window appropriately. Uses Go-Back-N for pipelining
+#sends data to the receiver while sliding the window. The loop sleeps in select() until an ACK
+#arrives or the next retransmission timer is due, so nothing waits longer than it has to.
+#Segments are sent in one burst per wakeup and every waiting ACK is read in one drain
 def send_data(sender_socket, connection_details, data):
-    global CWND_INIT, CWND_MAX, congestion_state,ssthresh, SLOW_START, CONGESTION_AVOIDANCE
-    cwnd_values.append(CWND_INIT) #Storing the first value at time 0
-    initial_sequence =  connection_details["senderSeqNum"] 
-    base = initial_sequence  # the sequence number of the first packet in the current sliding window
-    last = base + CWND_INIT # the sequence number of the last packet in the current window4
-    total_packets = len(data) # total number of packets to send
-    ending_sequence = initial_sequence + (MSS * (total_packets - 1))
-    print(f"Ending sequence: {ending_sequence}")
-    sent_packets = {}
-
-
-    while base < ending_sequence:
-        last = min(base + CWND_INIT, ending_sequence) 
-        print(f"Base = {base}, Last = {last}")
-        for seq_num in range(base,last + MSS,MSS):
-            #packet_size = len(data[seq_num]) #calculating the size of each packet for dynamic window sliding
-            if seq_num not in sent_packets:
-                print("Goes here")
-                connection_details["senderSeqNum"] = seq_num
-
-                #send the packet with that sequence number, ack number, etc 
-                send_packet(sender_socket=sender_socket, connection_details=connection_details, data=data[int((seq_num - initial_sequence)/MSS) ], retransmission=False)
-            
-                #storing this information for future use; along with the time it was sent. the last value is a bool storing whether or not it is acked
-                sent_packets[seq_num] = [time.time(), copy.deepcopy(connection_details), data[int((seq_num - initial_sequence)/MSS)], False]
-
-        retransmit  = True
-        initial_base = base
-        initial_last = last
-        print(f"Base = {base}, last = {last}")
-        while (((time.time() - sent_packets[initial_base][0]) < CURRENT_TIMEOUT) & (base < initial_last)):
-            print(f"Passed (Base) : {sent_packets[base][1]["senderSeqNum"]}")
-            print(f"Current base = {base}, initial_last = {initial_last}")
-            success = receive_ack(sender_socket,sent_packets[base][1], connection_details)
-            if success:
-                # Adjust congestion window based on the current state
-                if congestion_state == SLOW_START:
-                    if CWND_INIT < ssthresh:
-                        # Exponential growth in slow start
-                        #CWND_INIT += MSS
-                        print(f"Before Slow Start CWND chance: {CWND_INIT}")
-                        CWND_INIT = min(CWND_INIT * 2, CWND_MAX) #Exponential growth in slow start
-                        print(f"Slow Start: CWND_INIT = {CWND_INIT}")
-                    else:
-                        # Transition to congestion avoidance
-                        congestion_state = CONGESTION_AVOIDANCE
-                        print("Transition to Congestion Avoidance")
-                if congestion_state == CONGESTION_AVOIDANCE:
-                    # Linear growth in congestion avoidance
-                    #CWND_INIT += MSS * (MSS // CWND_INIT)
-                    print(f"Before Congestion Avoidance CWND chance: {CWND_INIT}")
-                    CWND_INIT += MSS
-                    print(f"Congestion Avoidance: CWND_INIT = {CWND_INIT}")
-
-                cwnd_values.append(CWND_INIT)
-                cwnd_timestamps.append(time.time())
-                retransmit = False
-                base += MSS
-                sent_packets[base][0] = time.time()  # Reset timer
-                if (base + CWND_INIT) <= ending_sequence:
-                    last = base + CWND_INIT
+    timers = TimerHeap()
+    writer = DatagramWriter(sender_socket, (HOST, RECEIVER_PORT))
+    reader = DatagramReader(sender_socket, datagram_size(connection_details["receiver_mss"]))
+    tracer = TraceWriter(TRACE_FILE) if TRACE_FILE else None
+    window = SendWindow(writer, connection_details, data, timers, tracer)
+    window.metrics.start()
+    window.record_cwnd() #Storing the first value at time 0
+    selector = selectors.DefaultSelector()
+    selector.register(sender_socket, selectors.EVENT_READ)
+    sender_socket.setblocking(False)
+
+    while not window.done:
+        window.fill()
+        writer.flush()
+        if selector.select(timers.timeout()):
+            for header in drain_acks(reader, window.metrics):
+                if EMULATED_ACK_DELAY:
+                    timers.schedule_in(EMULATED_ACK_DELAY, lambda header=header: window.on_ack(header))
                 else:
-                    last = ending_sequence
-            else:
-                # Handle retransmission (timeout or loss)
-                print("Packet loss detected, entering Slow Start")
-                ssthresh = max(CWND_INIT // 2, MSS)  # Update ssthresh
-                CWND_INIT = MSS  # Reset to one MSS
-                congestion_state = SLOW_START
-                cwnd_values.append(CWND_INIT)
-                cwnd_timestamps.append(time.time())
-                retransmit_window(sender_socket, base, last, sent_packets)
-
-
-        #if there are packets that haven't been acknowleged, retrasnmit the whole window
-
-        if retransmit:
-            #multiplicative decrease due to loss
-            CWND_INIT = max(MSS, CWND_INIT // 2)
-            print(f"Applying mutiplicative decrease : CWND_INIT = {CWND_INIT}")
-            cwnd_values.append(CWND_INIT)  # Track the current value of CWND_INIT
-            cwnd_timestamps.append(time.time())
-            retransmit_window(sender_socket, base, last, sent_packets)
-    
-   #values at the end (to show stagnation when it happens)
-    cwnd_values.append(CWND_INIT)
-    cwnd_timestamps.append(time.time())
-
-    # Normalize timestamps to start at 0
-    elapsed_time = [-10] + [t - cwnd_timestamps[0] for t in cwnd_timestamps]
+                    window.on_ack(header)
+        timers.run_expired()
+        window.handle_timeouts()
+
+    selector.close()
+    writer.close()
+    sender_socket.settimeout(SOCKET_TIMEOUT)
+    #the FIN takes the sequence number right after the last byte
+    connection_details["senderSeqNum"] = seq_add(window.initial_sequence, data.size)
+    window.metrics.stop()
+    window.record_cwnd() #values at the end (to show stagnation when it happens)
+    if tracer is not None:
+        tracer.close()
+    if PLOT_CWND:
+        plot_cwnd(window.metrics)
+    return window.metrics
+
+
+#plots the congestion window over the transfer
+def plot_cwnd(metrics):
+    import matplotlib.pyplot as plt  # only loaded when a plot is wanted
+
+    elapsed_time = [elapsed for elapsed, _, _ in metrics.window_series]
+    cwnd_values = [cwnd for _, cwnd, _ in metrics.window_series]
 
     plt.plot(elapsed_time, cwnd_values, marker='o')
     plt.title("CWND Size vs Time")
@@ -297,62 +609,107 @@ def send_data(sender_socket, connection_details, data):
     plt.grid(True)
     plt.show()
 
-    return
-
 
 #end the connection
 def terminate_connection(sender_socket, connection_details):
     logger.info("Sender: Sending FIN to terminate the connection...")
 
     seq_num = connection_details["senderSeqNum"]
-    ack_num = connection_details["receiverSeqNum"] + 1
+    ack_num = seq_add(connection_details["receiverSeqNum"], 1)
 
     fin_bit = 1
     app_data = "Goodbye! Closing connection."
+    #options (the file digest) only exist in the binary format
+    options = None
+    if connection_details["digest"] is not None and connection_details["wire_format"] == WIRE_BINARY:
+        options = {OPT_DIGEST: connection_details["digest"]}
     fin_packet = ReliableTransportLayerProtocolHeader(
-        SENDER_PORT, RECEIVER_PORT, seq_num+1, ack_num, WINDOW_SIZE, MSS, fin=fin_bit, app_data=app_data
+        connection_details["sender_port"], RECEIVER_PORT, seq_num, ack_num, WINDOW_SIZE, MSS, fin=fin_bit, app_data=app_data, options=options
     )
-    sender_socket.sendto(fin_packet.to_bytes(), (HOST, RECEIVER_PORT))
+    fin_bytes = fin_packet.to_bytes(connection_details["wire_format"])
+    sender_socket.sendto(fin_bytes, (HOST, RECEIVER_PORT))
 
     attempts = 0
     while attempts < MAX_RETRIES:
+        logger.info("Sender: Waiting for FIN-ACK from receiver...")
         try:
-            logger.info("Sender: Waiting for FIN-ACK from receiver...")
-            data, addr = sender_socket.recvfrom(1024)
-            data = ReliableTransportLayerProtocolHeader.from_bytes(data)
-
-            if addr == (HOST, RECEIVER_PORT) and data.fin == 1 and data.ack == 1:
-                logger.info("Sender: Received FIN-ACK, sending final ACK...")
-
-                ack_bit = 1
-                app_data = "Final ACK. Connection closed."
-                final_ack_packet = ReliableTransportLayerProtocolHeader(
-                    SENDER_PORT, RECEIVER_PORT, seq_num + 1, ack_num + 1, WINDOW_SIZE, MSS, ack=ack_bit, app_data=app_data
-                )
-                sender_socket.sendto(final_ack_packet.to_bytes(), (HOST, RECEIVER_PORT))
-                logger.info("Sender: Sent final ACK. Connection closed.")
-                break
-        except socket.timeout:
-            logger.info("Sender: Timeout, retrying FIN-ACK...")
+            data, addr = sender_socket.recvfrom(MAX_DATAGRAM_SIZE)
+        except (socket.timeout, ConnectionRefusedError) as error:
+            if isinstance(error, ConnectionRefusedError):
+                #the receiver's port is closed for now; wait out the timeout before the next FIN
+                time.sleep(sender_socket.gettimeout() or 0)
+            logger.info("Sender: Timeout, resending FIN...")
+            sender_socket.sendto(fin_bytes, (HOST, RECEIVER_PORT))
             attempts += 1
-            time.sleep(1)
+            continue
+        try:
+            data = ReliableTransportLayerProtocolHeader.from_bytes(data)
+        except ValueError:
+            continue
+
+        if addr == (HOST, RECEIVER_PORT) and data.fin == 1 and data.ack == 1 and data.verify_checksum():
+            logger.info("Sender: Received FIN-ACK, sending final ACK...")
+
+            ack_bit = 1
+            app_data = "Final ACK. Connection closed."
+            final_ack_packet = ReliableTransportLayerProtocolHeader(
+                connection_details["sender_port"], RECEIVER_PORT, seq_add(seq_num, 1), seq_add(ack_num, 1), WINDOW_SIZE, MSS, ack=ack_bit, app_data=app_data
+            )
+            sender_socket.sendto(final_ack_packet.to_bytes(connection_details["wire_format"]), (HOST, RECEIVER_PORT))
+            logger.info("Sender: Sent final ACK. Connection closed.")
+            break
     return
 
-#function that intiates connection, sends data, ends the connection and closes the socket
-def start_sender():
+#function that intiates connection, sends data, ends the connection and closes the socket.
+#data_range (transfer id, offset, length, total size) sends one range of the file, as parallel_sender.py does.
+#pacing overrides PACING for this connection. Returns the transfer's metrics, None if nothing was sent
+def start_sender(data_file=None, sender_port=None, data_range=None, pacing=None):
+    #the module settings are read now, so callers can still change DATA_FILE and SENDER_PORT first
+    data_file = DATA_FILE if data_file is None else data_file
+    sender_port = SENDER_PORT if sender_port is None else sender_port
     sender_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) 
-    sender_socket.bind((HOST, SENDER_PORT))
+    sender_socket.bind((HOST, sender_port))
+    tune_socket(sender_socket)
     sender_socket.settimeout(SOCKET_TIMEOUT)
 
+    offset, length = (data_range[1], data_range[2]) if data_range is not None else (0, None)
+    data = prepare_packets(data_file, offset, length)
+    first_segment = data[0] if FAST_OPEN and data is not None and len(data) else None
+    resume_key = transfer_key(data_file) if RESUME and data is not None and data_range is None else None
+
     #initiates 3-way handshake
-    connection_details = handshake(sender_socket)
+    connection_details = handshake(sender_socket, data_range, first_segment, resume_key)
+    metrics = None
 
     #if the connection was made successfully 
     if (connection_details["Alive"]):
-        data = prepare_packets()
-        send_data(sender_socket,connection_details,data)
+        if pacing is not None:
+            connection_details["pacing"] = pacing
+        if data is not None:
+            #the digest is of the whole file, even when resuming; it is hashed as the segments go out
+            prefix = None
+            resume_offset = connection_details["resume_offset"]
+            if 0 < resume_offset <= data.size:
+                logger.info(f"Sender: the receiver has the first {resume_offset} bytes, resuming there.")
+                prefix = data.prefix_hash(resume_offset) if SEND_DIGEST else None
+                data.close()
+                data = prepare_packets(data_file, resume_offset)
+            if SEND_DIGEST:
+                data.start_digest(prefix)
+            metrics = send_data(sender_socket,connection_details,data)
+            if SEND_DIGEST:
+                connection_details["digest"] = data.digest()
+            data.close()
+            logger.info(f"Sender: {metrics.bytes_acked} bytes in {metrics.duration:.2f} s, "
+                        f"{metrics.segments_retransmitted} retransmissions, goodput {metrics.goodput / 1e3:.1f} kB/s")
+            if METRICS_FILE:
+                metrics.dump(METRICS_FILE)
         terminate_connection(sender_socket, connection_details)
-        sender_socket.close()
+    elif data is not None:
+        data.close()
+    sender_socket.close()
+    return metrics
+
 #Starts the program
 if __name__ == "__main__":
     start_sender()
@@ -0,0 +1,42 @@
+import random
+
+# Sequence numbers are 32-bit serial numbers (RFC 1982) that wrap around. Data segments are
+# numbered by byte: a segment's sequence number is the initial one plus the file offset of
+# its first byte, modulo SEQ_MODULUS. Two numbers are only comparable when they are less
+# than half the space (2 GiB) apart, which any window is.
+SEQ_BITS = 32
+SEQ_MODULUS = 1 << SEQ_BITS
+SEQ_MASK = SEQ_MODULUS - 1
+SEQ_HALF = SEQ_MODULUS >> 1
+
+
+def seq_add(seq_num, count):
+    # sequence number count bytes after seq_num (count may be negative)
+    return (seq_num + count) & SEQ_MASK
+
+
+def seq_diff(a, b):
+    # signed distance from b to a, in (-2**31, 2**31]
+    distance = (a - b) & SEQ_MASK
+    return distance - SEQ_MODULUS if distance > SEQ_HALF else distance
+
+
+def seq_lt(a, b):
+    return seq_diff(a, b) < 0
+
+
+def seq_le(a, b):
+    return seq_diff(a, b) <= 0
+
+
+def seq_gt(a, b):
+    return seq_diff(a, b) > 0
+
+
+def seq_ge(a, b):
+    return seq_diff(a, b) >= 0
+
+
+def random_isn():
+    # initial sequence number anywhere in the space, so wraparound is routine rather than rare
+    return random.randrange(SEQ_MODULUS)
@@ -0,0 +1,205 @@
+import hashlib
+import mmap
+import os
+
+# fsync policies
+FSYNC_NEVER = "never"  # leave it to the OS
+FSYNC_ON_CLOSE = "close"  # once, when the transfer ends
+FSYNC_ON_FLUSH = "flush"  # after every batch written to the file
+
+BUFFER_SIZE = 256 * 1024  # bytes collected before one write()
+MMAP_INITIAL_SIZE = 1024 * 1024  # first size of a memory-mapped output file, doubled as needed
+
+
+class FileSink:
+    """
+    Writes the delivered payloads to a file, byte for byte, in batches.
+
+    Payloads are collected in a buffer and written with one write() per buffer_size
+    bytes instead of one open/write/close per segment. When digest is set a SHA-256 of
+    everything written is kept along the way, so the end-of-transfer check does not
+    have to read the file back.
+    """
+
+    file_mode = "wb"
+
+    def __init__(self, path, buffer_size=BUFFER_SIZE, fsync=FSYNC_ON_CLOSE, digest=False):
+        if fsync not in (FSYNC_NEVER, FSYNC_ON_CLOSE, FSYNC_ON_FLUSH):
+            raise ValueError(f"Unknown fsync policy {fsync!r}")
+        self.path = path
+        self.buffer_size = buffer_size
+        self.fsync = fsync
+        self.bytes_written = 0
+        self._hash = hashlib.sha256() if digest else None
+        self._buffer = bytearray()
+        self._file = self.open(path)
+        self.closed = False
+
+    def open(self, path):
+        return open(path, self.file_mode, buffering=0)
+
+    def write(self, payload):
+        self._buffer += payload
+        self.bytes_written += len(payload)
+        if self._hash is not None:
+            self._hash.update(payload)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            view = memoryview(self._buffer)
+            while view:
+                view = view[self._file.write(view):]
+            view.release()
+            self._buffer.clear()
+            if self.fsync == FSYNC_ON_FLUSH:
+                os.fsync(self._file.fileno())
+
+    def digest(self):
+        # SHA-256 of everything written so far, None when digest was not requested
+        return self._hash.digest() if self._hash is not None else None
+
+    def sync(self):
+        # puts everything written so far in the file (and on disk, unless the policy is FSYNC_NEVER)
+        self.flush()
+        if self.fsync != FSYNC_NEVER:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        if self.fsync != FSYNC_NEVER:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MmapSink(FileSink):
+    """
+    Writes the payloads straight into a memory-mapped output file.
+
+    The file is preallocated (initial_size, doubled whenever it fills up) so a payload is
+    a memory copy rather than a system call, and it is truncated to the bytes actually
+    received on close. flush() only matters for the FSYNC_ON_FLUSH policy, where it is
+    msync'ed every buffer_size bytes.
+    """
+
+    file_mode = "w+b"  # mmap needs the file open for reading as well
+
+    def __init__(self, path, buffer_size=BUFFER_SIZE, fsync=FSYNC_ON_CLOSE, digest=False,
+                 initial_size=MMAP_INITIAL_SIZE):
+        super().__init__(path, buffer_size, fsync, digest)
+        self._size = 0
+        self._map = None
+        self._unsynced = 0
+        self._resize(max(initial_size, mmap.PAGESIZE))
+
+    def _resize(self, size):
+        if self._map is not None:
+            self._map.close()
+        os.ftruncate(self._file.fileno(), size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._size = size
+
+    def write(self, payload):
+        end = self.bytes_written + len(payload)
+        if end > self._size:
+            self._resize(max(end, self._size * 2))
+        self._map[self.bytes_written:end] = payload
+        self.bytes_written = end
+        if self._hash is not None:
+            self._hash.update(payload)
+        self._unsynced += len(payload)
+        if self._unsynced >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.fsync == FSYNC_ON_FLUSH and self._unsynced:
+            self._map.flush()
+        self._unsynced = 0
+
+    def close(self):
+        if self.closed:
+            return
+        if self.fsync != FSYNC_NEVER:
+            self._map.flush()
+        self._map.close()
+        os.ftruncate(self._file.fileno(), self.bytes_written)
+        if self.fsync != FSYNC_NEVER:
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self.closed = True
+
+
+class PositionalSink(FileSink):
+    """
+    Writes one range of a file received over parallel connections.
+
+    Every connection of the transfer opens the same output file without truncating it
+    and writes its batches at their place with os.pwrite(), so the ranges land in one
+    file whatever order they arrive in, from any number of processes. The file is
+    extended to total_size up front. digest() covers this range only.
+    """
+
+    def __init__(self, path, offset, total_size, buffer_size=BUFFER_SIZE, fsync=FSYNC_ON_CLOSE, digest=False):
+        super().__init__(path, buffer_size, fsync, digest)
+        self.offset = offset
+        self._position = offset  # where the next batch goes
+        if os.fstat(self._file.fileno()).st_size < total_size:
+            os.ftruncate(self._file.fileno(), total_size)
+
+    def open(self, path):
+        return open(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), "r+b", buffering=0)
+
+    def flush(self):
+        if self._buffer:
+            view = memoryview(self._buffer)
+            while view:
+                written = os.pwrite(self._file.fileno(), view, self._position)
+                self._position += written
+                view = view[written:]
+            view.release()
+            self._buffer.clear()
+            if self.fsync == FSYNC_ON_FLUSH:
+                os.fsync(self._file.fileno())
+
+
+class ResumedSink(FileSink):
+    """
+    Continues an output file that an earlier connection left unfinished (see checkpoint.py).
+
+    The first offset bytes are kept, anything after them is cut off and writing goes on
+    from there. digest is the SHA-256 object of the kept bytes, so digest() still covers
+    the whole file.
+    """
+
+    def __init__(self, path, offset, digest, buffer_size=BUFFER_SIZE, fsync=FSYNC_ON_CLOSE):
+        self.offset = offset
+        super().__init__(path, buffer_size, fsync)
+        self._hash = digest
+
+    def open(self, path):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        os.ftruncate(fd, self.offset)
+        os.lseek(fd, self.offset, os.SEEK_SET)
+        return open(fd, "r+b", buffering=0)
+
+
+SINKS = {"buffered": FileSink, "mmap": MmapSink}
+
+
+def make_sink(kind, path, buffer_size=BUFFER_SIZE, fsync=FSYNC_ON_CLOSE, digest=False):
+    try:
+        sink_class = SINKS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown sink {kind!r}, expected one of {sorted(SINKS)}") from None
+    return sink_class(path, buffer_size, fsync, digest)
+
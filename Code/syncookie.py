@@ -0,0 +1,49 @@
+import hashlib
+import os
+import time
+
+# SYN cookies: the receiver's initial sequence number in a SYN-ACK encodes what it agreed to,
+# so it can answer a SYN without keeping any state and rebuild the connection when the
+# handshake ACK (or the first data segment) comes back acknowledging cookie + 1.
+#
+# Cookie layout (32 bits): time slot (2) | negotiated features (4) | keyed hash (26).
+# The hash covers the sender's address and ISN, the slot and the features, under a secret
+# drawn when the process starts. A cookie is accepted during its own slot and the next one.
+
+COOKIE_SLOT = 64  # seconds per time slot
+COOKIE_SLOTS = 2  # slots a cookie stays valid
+SLOT_BITS = 2
+FEATURE_BITS = 4
+HASH_BITS = 32 - SLOT_BITS - FEATURE_BITS
+SLOT_MASK = (1 << SLOT_BITS) - 1
+FEATURE_MASK = (1 << FEATURE_BITS) - 1
+HASH_MASK = (1 << HASH_BITS) - 1
+
+# feature bits
+COOKIE_SELECTIVE_REPEAT = 1
+COOKIE_SACK = 2
+COOKIE_TIMESTAMPS = 4
+COOKIE_WINDOW_SCALE = 8
+
+SECRET = os.urandom(16)
+
+
+def _hash(addr, sender_isn, slot, features, secret):
+    message = f"{addr[0]}|{addr[1]}|{sender_isn}|{slot}|{features}".encode()
+    return int.from_bytes(hashlib.blake2b(message, key=secret, digest_size=4).digest(), "big") & HASH_MASK
+
+
+def make_cookie(addr, sender_isn, features, now=None, secret=SECRET):
+    slot = int((time.time() if now is None else now) // COOKIE_SLOT)
+    return (slot & SLOT_MASK) << (32 - SLOT_BITS) | features << HASH_BITS | _hash(addr, sender_isn, slot, features, secret)
+
+
+def check_cookie(cookie, addr, sender_isn, now=None, secret=SECRET):
+    # the feature bits of a valid cookie, None when it is forged or expired
+    slot_bits = cookie >> (32 - SLOT_BITS)
+    features = (cookie >> HASH_BITS) & FEATURE_MASK
+    current = int((time.time() if now is None else now) // COOKIE_SLOT)
+    for slot in range(current, current - COOKIE_SLOTS, -1):
+        if slot & SLOT_MASK == slot_bits and _hash(addr, sender_isn, slot, features, secret) == cookie & HASH_MASK:
+            return features
+    return None
@@ -0,0 +1,60 @@
+import socket
+from header import ReliableTransportLayerProtocolHeader, SegmentView, WIRE_BINARY
+from receiver import ReceiverConnection, CLOSED, LAST_ACK
+import sender
+from seqnum import seq_add
+
+# Both sides of the connection teardown, with a bit flipped in some of the segments.
+
+SENDER = ("127.0.0.1", 8001)
+RECEIVER = (sender.HOST, sender.RECEIVER_PORT)
+
+
+class ScriptedSocket:
+    # hands out the given datagrams (or raises the given exceptions) and records what is sent
+    def __init__(self, *incoming):
+        self.incoming = list(incoming)
+        self.sent = []
+
+    def recvfrom(self, size):
+        item = self.incoming.pop(0) if self.incoming else socket.timeout()
+        if isinstance(item, Exception):
+            raise item
+        return item, RECEIVER
+
+    def sendto(self, data, addr):
+        self.sent.append(ReliableTransportLayerProtocolHeader.from_bytes(data))
+
+    def gettimeout(self):
+        return 0
+
+
+def fin_ack(corrupt=False):
+    header = ReliableTransportLayerProtocolHeader(8000, 8001, 500, 1001, 64, 15, fin=True, ack=True)
+    data = bytearray(header.to_bytes(WIRE_BINARY))
+    if corrupt:
+        data[9] ^= 0x10
+    return bytes(data)
+
+
+def test_sender_close_survives_refused_and_garbled_replies():
+    connection_details = {"senderSeqNum": 1000, "receiverSeqNum": 499, "digest": None, "wire_format": WIRE_BINARY,
+                          "sender_port": 8001}
+    sender_socket = ScriptedSocket(ConnectionRefusedError(), b"\x00garbage", fin_ack(corrupt=True), fin_ack())
+    sender.terminate_connection(sender_socket, connection_details)
+    fins = [header for header in sender_socket.sent if header.fin]
+    final_ack, = [header for header in sender_socket.sent if header.ack]
+    assert len(fins) == 2  # the first FIN and the one resent after the refusal; the corrupt FIN-ACK is ignored
+    assert final_ack.seq_num == 1001 and sender_socket.incoming == []
+
+
+def test_receiver_drops_corrupted_final_ack(tmp_path):
+    receiver = ReceiverConnection(SENDER, str(tmp_path / "out.bin"))
+    receiver.state = LAST_ACK
+    final_ack = bytearray(ReliableTransportLayerProtocolHeader(8001, 8000, 1001, seq_add(500, 1), 64, 15, ack=True).to_bytes())
+    final_ack[9] ^= 0x10
+    assert receiver.handle(SegmentView(bytes(final_ack))) == []
+    assert receiver.state == LAST_ACK
+    final_ack[9] ^= 0x10
+    receiver.handle(SegmentView(bytes(final_ack)))
+    assert receiver.state == CLOSED
@@ -0,0 +1,75 @@
+import random
+import pytest
+import compression
+from compression import CODECS, CODEC_LZ4, CODEC_ZLIB, CODEC_ZSTD, AdaptiveCompressor, available, choose, decompress
+from header import ReliableTransportLayerProtocolHeader, SegmentView, OPT_COMPRESSION
+from receiver import ReceiverConnection
+from seqnum import seq_add
+
+# The codecs, the choice between them when one is not installed, and compressed segments
+# through the receiver.
+
+TEXT = (b"the quick brown fox jumps over the lazy dog. " * 32)[:1400]  # one segment that compresses
+SENDER = ("127.0.0.1", 8001)
+ISN = 1000
+
+
+@pytest.mark.parametrize("codec_id", list(CODECS))
+def test_round_trip(codec_id):
+    compressed = CODECS[codec_id].compress(TEXT)
+    assert len(compressed) < len(TEXT)
+    assert bytes(decompress(codec_id, compressed, len(TEXT))) == TEXT
+    with pytest.raises(ValueError):
+        decompress(codec_id, compressed, len(TEXT) - 1)  # longer than a segment can be
+    with pytest.raises(ValueError):
+        decompress(codec_id, compressed[:len(compressed) // 2], len(TEXT))
+
+
+def test_missing_codecs_fall_back_to_what_is_installed(monkeypatch):
+    monkeypatch.setattr(compression, "CODECS", {CODEC_ZLIB: CODECS[CODEC_ZLIB]})
+    assert available(("zstd", "lz4", "zlib")) == [CODEC_ZLIB]
+    assert choose(bytes((CODEC_ZSTD, CODEC_ZLIB))) == CODEC_ZLIB
+    assert choose(bytes((CODEC_ZSTD, CODEC_LZ4))) is None
+
+
+def test_receiver_without_the_offered_codec_declines_compression(tmp_path, monkeypatch):
+    monkeypatch.setattr(compression, "CODECS", {CODEC_ZLIB: CODECS[CODEC_ZLIB]})
+    connection = ReceiverConnection(SENDER, str(tmp_path / "out.bin"))
+    syn = ReliableTransportLayerProtocolHeader(8001, 8000, ISN, 0, 64, 1400, syn=True,
+                                               options={OPT_COMPRESSION: bytes((CODEC_ZSTD,))})
+    syn_ack, = connection.handle(SegmentView(syn.to_bytes()))
+    assert OPT_COMPRESSION not in syn_ack.options and connection.compression is None
+
+
+def test_compressed_segments_are_written_out_as_sent(tmp_path):
+    connection = ReceiverConnection(SENDER, str(tmp_path / "out.bin"))
+    syn = ReliableTransportLayerProtocolHeader(8001, 8000, ISN, 0, 64, 1400, syn=True,
+                                               options={OPT_COMPRESSION: bytes((CODEC_ZLIB,))})
+    syn_ack, = connection.handle(SegmentView(syn.to_bytes()))
+    assert syn_ack.options[OPT_COMPRESSION] == bytes((CODEC_ZLIB,))
+    ack_num = seq_add(syn_ack.seq_num, 1)
+    connection.handle(SegmentView(ReliableTransportLayerProtocolHeader(8001, 8000, ISN + 1, ack_num, 64, 1400,
+                                                                       ack=True).to_bytes()))
+    compressor = AdaptiveCompressor(CODEC_ZLIB)
+    noise = random.Random(0).randbytes(1400)
+    for index, segment in enumerate((TEXT, noise)):
+        payload, compressed = compressor.compress(segment)
+        assert compressed == (segment is TEXT)
+        header = ReliableTransportLayerProtocolHeader(8001, 8000, ISN + 2 + index * 1400, ack_num, 64, 1400, app_data=payload,
+                                                      options={OPT_COMPRESSION: b""} if compressed else None)
+        connection.handle(SegmentView(header.to_bytes()))
+    connection.finish()
+    assert (tmp_path / "out.bin").read_bytes() == TEXT + noise
+    assert connection.metrics.bytes_saved > 0
+
+
+def test_adaptive_compressor_backs_off_on_data_that_does_not_compress():
+    compressor = AdaptiveCompressor(CODEC_ZLIB)
+    rng = random.Random(1)
+    tried = 0
+    for _ in range(compression.ADAPT_MISSES + compression.ADAPT_SKIP):
+        before = compressor.skip
+        compressor.compress(rng.randbytes(1400))
+        tried += not before
+    assert tried == compression.ADAPT_MISSES  # the rest were sent without trying
+    assert compressor.compress(TEXT)[1] is True  # tried again after the backoff, and it compresses
@@ -0,0 +1,19 @@
+from congestion_sim import LINK_RATE, simulate, utilization
+
+# The bottleneck simulator is deterministic, so its numbers can be checked exactly as run.
+
+
+def test_utilization_counts_late_starters_over_the_whole_run():
+    duration = 5.0
+    results = simulate(["reno", "reno"], duration, start_spacing=2.5)
+    # the late flow's own throughput is over half the run; added up naively it overstates the link
+    assert sum(result["throughput"] for result in results) / LINK_RATE > utilization(results, duration)
+    assert 0.5 < utilization(results, duration) <= 1.0
+
+
+def test_bbr_fills_an_uncontended_link():
+    duration = 10.0
+    results = simulate(["bbr"], duration)
+    assert utilization(results, duration) > 0.9
+    # startup keeps no more than the measured BDP in flight, so it never overflows the queue
+    assert results[0]["drops"] == 0
@@ -0,0 +1,113 @@
+import checkpoint
+from header import ReliableTransportLayerProtocolHeader, SegmentView, OPT_FAST_OPEN, OPT_RESUME
+import receiver
+from receiver import ReceiverConnection, ESTABLISHED, LISTEN, SYN_RECEIVED, stateless_syn_ack
+from seqnum import seq_add
+
+# The receiver's side of the handshake, driven with the datagrams a sender would send,
+# some of them with a bit flipped on the way.
+
+SENDER = ("127.0.0.1", 8001)
+ISN = 1000
+
+
+def datagram(seq_num, ack_num=0, syn=False, ack=False, app_data=b"", options=None):
+    header = ReliableTransportLayerProtocolHeader(8001, 8000, seq_num, ack_num, 64, 1400, syn=syn, ack=ack,
+                                                  app_data=app_data, options=options)
+    return header.to_bytes()
+
+
+def corrupted(data, byte):
+    # the seq_num field starts at byte 8 and ack_num at byte 12
+    data = bytearray(data)
+    data[byte] ^= 0x10
+    return SegmentView(data)
+
+
+def connection(tmp_path):
+    return ReceiverConnection(SENDER, str(tmp_path / "out.bin"))
+
+
+def test_corrupted_syn_is_dropped(tmp_path):
+    receiver = connection(tmp_path)
+    assert receiver.handle(corrupted(datagram(ISN, syn=True), 11)) == []
+    assert receiver.state == LISTEN
+    syn_ack, = receiver.handle(SegmentView(datagram(ISN, syn=True)))
+    assert syn_ack.ack_num == ISN + 1
+
+
+def test_corrupted_handshake_ack_is_dropped(tmp_path):
+    receiver = connection(tmp_path)
+    syn_ack, = receiver.handle(SegmentView(datagram(ISN, syn=True)))
+    handshake_ack = datagram(ISN + 1, seq_add(syn_ack.seq_num, 1), ack=True)
+    assert receiver.handle(corrupted(handshake_ack, 11)) == []
+    assert receiver.state == SYN_RECEIVED
+    receiver.handle(SegmentView(handshake_ack))
+    assert receiver.state == ESTABLISHED
+    assert receiver.expected_seq_num == ISN + 2
+    receiver.finish()
+
+
+def test_first_data_segment_completes_handshake_after_corrupted_ack(tmp_path):
+    receiver = connection(tmp_path)
+    syn_ack, = receiver.handle(SegmentView(datagram(ISN, syn=True)))
+    receiver.handle(corrupted(datagram(ISN + 1, seq_add(syn_ack.seq_num, 1), ack=True), 9))
+    receiver.handle(SegmentView(datagram(ISN + 2, seq_add(syn_ack.seq_num, 1), app_data=b"x" * 1400)))
+    assert receiver.state == ESTABLISHED
+    assert receiver.bytes_received == 1400
+    receiver.finish()
+
+
+def test_syn_with_another_isn_starts_over(tmp_path, monkeypatch):
+    monkeypatch.setattr("receiver.FAST_OPEN_ENABLED", True)
+    receiver = connection(tmp_path)
+    receiver.handle(SegmentView(datagram(ISN, syn=True, app_data=b"old", options={OPT_FAST_OPEN: b""})))
+    assert receiver.bytes_received == 3
+    syn_ack, = receiver.handle(SegmentView(datagram(5000, syn=True)))
+    assert syn_ack.ack_num == 5001
+    assert receiver.state == SYN_RECEIVED
+    assert receiver.bytes_received == 0 and not receiver.fast_open
+    assert receiver.output_path == str(tmp_path / "out.bin")
+
+
+def test_sender_restarted_mid_transfer_is_told_where_to_resume(tmp_path):
+    receiver = connection(tmp_path)
+    key = bytes(checkpoint.KEY_SIZE)
+    syn_ack, = receiver.handle(SegmentView(datagram(ISN, syn=True, options={OPT_RESUME: key})))
+    receiver.handle(SegmentView(datagram(ISN + 1, seq_add(syn_ack.seq_num, 1), ack=True)))
+    receiver.handle(SegmentView(datagram(ISN + 2, seq_add(syn_ack.seq_num, 1), app_data=b"x" * 1400)))
+    # a duplicate of the first SYN changes nothing
+    assert receiver.handle(SegmentView(datagram(ISN, syn=True, options={OPT_RESUME: key}))) == []
+    assert receiver.state == ESTABLISHED
+    syn_ack, = receiver.handle(SegmentView(datagram(5000, syn=True, options={OPT_RESUME: key})))
+    assert syn_ack.syn and syn_ack.ack and syn_ack.ack_num == 5001
+    assert int.from_bytes(syn_ack.options[OPT_RESUME], "big") == 1400
+    assert checkpoint.load(str(tmp_path / "out.bin")).offset == 1400
+    assert receiver.state == SYN_RECEIVED and receiver.resume_offset == 1400
+
+
+def test_fast_open_syn_is_refused_by_default(tmp_path):
+    out = tmp_path / "out.bin"
+    out.write_bytes(b"kept")
+    receiver = connection(tmp_path)
+    syn_ack, = receiver.handle(SegmentView(datagram(ISN, syn=True, app_data=b"spoofed", options={OPT_FAST_OPEN: b""})))
+    assert OPT_FAST_OPEN not in syn_ack.options
+    assert receiver.bytes_received == 0 and receiver.sink is None
+    assert out.read_bytes() == b"kept"
+
+
+def test_retried_syn_gets_the_same_syn_ack(tmp_path):
+    receiver = connection(tmp_path)
+    first, = receiver.handle(SegmentView(datagram(ISN, syn=True)))
+    again, = receiver.handle(SegmentView(datagram(ISN, syn=True)))
+    assert (again.seq_num, again.ack_num) == (first.seq_num, first.ack_num)
+
+
+def test_module_settings_are_read_when_the_connection_is_made(tmp_path, monkeypatch):
+    monkeypatch.setattr(receiver, "OUTPUT_FILE", str(tmp_path / "out.bin"))
+    monkeypatch.setattr(receiver, "RECEIVER_PORT", 8123)
+    connection = ReceiverConnection(SENDER)
+    assert (connection.output_path, connection.local_port) == (str(tmp_path / "out.bin"), 8123)
+    syn_ack, = connection.handle(SegmentView(datagram(ISN, syn=True)))
+    assert syn_ack.source_port_num == 8123
+    assert stateless_syn_ack(SENDER, SegmentView(datagram(ISN, syn=True))).source_port_num == 8123
@@ -0,0 +1,115 @@
+import random
+import pytest
+from header import (ReliableTransportLayerProtocolHeader, SegmentView, WIRE_BINARY, WIRE_TEXT, HEADER_SIZE,
+                    OPT_SACK, OPT_TIMESTAMP, encode_sack_blocks, encode_timestamp)
+
+# The wire codecs: binary and text round trips, what the binary checksum covers, and the
+# binary decoder against the text one (bench/micro.py times the two).
+
+CHECKSUM_BYTES = (20, 21)
+
+
+def random_header(rng, payload_size=None, options=True):
+    size = rng.randrange(0, 1401) if payload_size is None else payload_size
+    header_options = {}
+    if options and rng.random() < 0.5:
+        header_options[OPT_TIMESTAMP] = encode_timestamp(rng.getrandbits(32), rng.getrandbits(32))
+    if options and rng.random() < 0.5:
+        header_options[OPT_SACK] = encode_sack_blocks([(rng.getrandbits(32), rng.getrandbits(32))])
+    return ReliableTransportLayerProtocolHeader(
+        rng.getrandbits(16), rng.getrandbits(16), rng.getrandbits(32), rng.getrandbits(32), rng.getrandbits(16),
+        rng.getrandbits(16), syn=rng.getrandbits(1), ack=rng.getrandbits(1), fin=rng.getrandbits(1),
+        app_data=rng.randbytes(size).replace(b"\x00", b"|"), options=header_options)
+
+
+def fields(header):
+    return (header.source_port_num, header.dest_port_num, header.seq_num, header.ack_num, header.sending_window,
+            header.mss, header.flags, header.options, bytes(header.payload))
+
+
+@pytest.mark.parametrize("decode", [ReliableTransportLayerProtocolHeader.from_bytes, SegmentView.from_bytes])
+def test_binary_round_trip(decode):
+    rng = random.Random(1)
+    for _ in range(500):
+        header = random_header(rng)
+        decoded = decode(header.to_bytes(WIRE_BINARY))
+        assert decoded.wire_format == WIRE_BINARY
+        assert fields(decoded) == fields(header)
+        assert decoded.verify_checksum()
+
+
+def test_text_round_trip():
+    rng = random.Random(2)
+    for _ in range(200):
+        header = random_header(rng, options=False)
+        decoded = ReliableTransportLayerProtocolHeader.from_bytes(header.to_bytes(WIRE_TEXT))
+        assert decoded.wire_format == WIRE_TEXT
+        assert fields(decoded) == fields(header)
+        assert decoded.verify_checksum()
+
+
+@pytest.mark.parametrize("decode", [ReliableTransportLayerProtocolHeader.from_bytes, SegmentView.from_bytes])
+def test_every_header_bit_is_checked(decode):
+    # a payload ending in zero bytes: a shorter payload_length alone would still add up
+    header = ReliableTransportLayerProtocolHeader(8001, 8000, 4000000000, 1234, 64, 1400, ack=True,
+                                                  app_data=b"segment" + bytes(8),
+                                                  options={OPT_TIMESTAMP: encode_timestamp(1, 2)})
+    data = header.to_bytes(WIRE_BINARY)
+    for byte in range(HEADER_SIZE):
+        if byte in CHECKSUM_BYTES:
+            continue
+        for bit in range(8):
+            corrupted = bytearray(data)
+            corrupted[byte] ^= 1 << bit
+            try:
+                assert not decode(corrupted).verify_checksum(), (byte, bit)
+            except (ValueError, UnicodeDecodeError):
+                pass  # no longer a datagram of the binary format
+
+
+def test_binary_and_text_decoders_agree():
+    rng = random.Random(4)
+    for _ in range(200):
+        header = random_header(rng, options=False)
+        binary = ReliableTransportLayerProtocolHeader.from_binary_bytes(header.to_bytes(WIRE_BINARY))
+        text = ReliableTransportLayerProtocolHeader.from_text_bytes(header.to_bytes(WIRE_TEXT))
+        assert fields(binary) == fields(text) == fields(header)
+        assert binary.verify_checksum() and text.verify_checksum()
+
+
+# The fast checksum paths against calculateChecksumReference(), on payloads of every
+# parity including empty ones, with and without options.
+
+def fuzzed_headers(seed, count=300):
+    rng = random.Random(seed)
+    sizes = [0, 1, 2, 3, 1399, 1400] + [rng.randrange(0, 1401) for _ in range(count)]
+    return rng, [random_header(rng, size) for size in sizes]
+
+
+def test_checksum_matches_reference():
+    _, headers = fuzzed_headers(5)
+    for header in headers:
+        assert header.checksum == header.calculateChecksum() == header.calculateChecksumReference()
+
+
+def test_incremental_update_matches_reference():
+    rng, headers = fuzzed_headers(6)
+    for header in headers:
+        for _ in range(3):
+            changes = {name: rng.getrandbits(bits) for name, bits in
+                       (("seq_num", 32), ("ack_num", 32), ("sending_window", 16)) if rng.random() < 0.7}
+            if rng.random() < 0.5:
+                changes["options"] = random_header(rng, 0).options
+            header.update_fields(**changes)
+            assert header.checksum == header.calculateChecksumReference()
+
+
+def test_segment_view_matches_reference():
+    rng, headers = fuzzed_headers(7)
+    for header in headers:
+        view = SegmentView(header.to_bytes(WIRE_BINARY))
+        assert view.checksum == header.calculateChecksumReference()
+        assert view.verify_checksum()
+        corrupted = bytearray(header.to_bytes(WIRE_BINARY))
+        corrupted[CHECKSUM_BYTES[1]] ^= 1 << rng.randrange(8)
+        assert not SegmentView(corrupted).verify_checksum()
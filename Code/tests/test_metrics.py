@@ -0,0 +1,32 @@
+import json
+from metrics import ConnectionMetrics, RTT_BUCKETS
+
+# What a connection's metrics add up to, and the two formats they are dumped in.
+
+
+def test_goodput_and_rtt_histogram():
+    metrics = ConnectionMetrics("receiver", "127.0.0.1:8001")
+    metrics.start(now=10.0)
+    metrics.bytes_delivered = 5000
+    metrics.stop(now=12.0)
+    assert metrics.duration == 2.0 and metrics.goodput == 2500.0
+    for rtt in (0.0004, 0.003, 0.003, 100.0):
+        metrics.observe_rtt(rtt)
+    buckets = dict(zip(RTT_BUCKETS, metrics.rtt_buckets))
+    assert buckets[0.0005] == 1 and buckets[0.005] == 2 and buckets[float("inf")] == 1
+    assert metrics.rtt_count == 4
+
+
+def test_dumps(tmp_path):
+    metrics = ConnectionMetrics("sender", "127.0.0.1:8000")
+    metrics.segments_sent = 7
+    metrics.record_window(3000, 6000, now=1.0)
+    metrics.record_window(4500, 6000, now=1.5)
+    metrics.dump(str(tmp_path / "m.json"))
+    dumped = json.loads((tmp_path / "m.json").read_text())
+    assert dumped["counters"]["segments_sent"] == 7
+    assert dumped["window_series"] == [[0.0, 3000, 6000], [0.5, 4500, 6000]]
+    metrics.dump(str(tmp_path / "m.prom"))
+    text = (tmp_path / "m.prom").read_text()
+    assert 'rtlp_segments_sent_total{role="sender",peer="127.0.0.1:8000"} 7' in text
+    assert 'rtlp_cwnd_bytes{role="sender",peer="127.0.0.1:8000"} 4500' in text
@@ -0,0 +1,28 @@
+import pytest
+from congestion import make_controller
+from pacing import TokenBucket, pacing_rate, bucket_depth, PACING_BURST, PACING_GAIN, PACING_GAIN_SLOW_START
+
+# The token bucket and the rate it is filled at.
+
+MSS = 1400
+
+
+def test_token_bucket_spaces_segments_at_the_rate():
+    bucket = TokenBucket(14000, 2 * MSS, now=0.0)
+    assert bucket.delay(MSS, now=0.0) == 0.0
+    bucket.consume(MSS)
+    bucket.consume(MSS)
+    assert bucket.delay(MSS, now=0.0) == pytest.approx(0.1)
+    assert bucket.delay(MSS, now=0.1) == 0.0
+    bucket.consume(3 * MSS)  # a retransmission may overdraw it
+    assert bucket.delay(MSS, now=0.1) == pytest.approx(0.3)
+    assert bucket.delay(MSS, now=10.0) == 0.0 and bucket.tokens == 2 * MSS  # never more than the depth
+
+
+def test_pacing_rate_follows_the_window():
+    controller = make_controller("newreno", MSS, 1 << 20)
+    assert pacing_rate(controller, None) is None
+    assert pacing_rate(controller, 0.1) == pytest.approx(PACING_GAIN_SLOW_START * controller.window / 0.1)
+    controller.ssthresh = controller.cwnd
+    assert pacing_rate(controller, 0.1) == pytest.approx(PACING_GAIN * controller.window / 0.1)
+    assert bucket_depth(1000, MSS) == PACING_BURST * MSS
@@ -0,0 +1,63 @@
+from header import ReliableTransportLayerProtocolHeader, SegmentView
+import receiver
+from receiver import ReceiverConnection
+from seqnum import seq_add
+
+# The receiver's data path after the handshake, driven with the segments a sender would send.
+
+SENDER = ("127.0.0.1", 8001)
+ISN = 1000
+MSS = 1400
+
+
+def datagram(seq_num, app_data=b"", options=None):
+    header = ReliableTransportLayerProtocolHeader(8001, 8000, seq_num, 0, 64, MSS, app_data=app_data, options=options)
+    return SegmentView(header.to_bytes())
+
+
+def established(tmp_path, options=None):
+    connection = ReceiverConnection(SENDER, str(tmp_path / "out.bin"))
+    syn = ReliableTransportLayerProtocolHeader(8001, 8000, ISN, 0, 64, MSS, syn=True, options=options)
+    syn_ack, = connection.handle(SegmentView(syn.to_bytes()))
+    handshake_ack = ReliableTransportLayerProtocolHeader(8001, 8000, ISN + 1, seq_add(syn_ack.seq_num, 1), 64, MSS, ack=True)
+    connection.handle(SegmentView(handshake_ack.to_bytes()))
+    return connection
+
+
+def test_zero_window_probe_gets_the_current_window(tmp_path, monkeypatch):
+    monkeypatch.setattr(receiver, "RECEIVE_BUFFER_SIZE", 2 * MSS)
+    monkeypatch.setattr(receiver, "EMULATED_READ_RATE", 1)  # the application reads next to nothing
+    connection = established(tmp_path)
+    connection.handle(datagram(ISN + 2, b"x" * MSS))
+    connection.handle(datagram(ISN + 2 + MSS, b"x" * MSS))
+    probe = datagram(ISN + 2 + 2 * MSS)
+    ack, = connection.handle(probe)
+    assert ack.sending_window < MSS and connection.metrics.window_probes == 1  # no room for a segment
+    connection.unread = 0  # the application caught up
+    ack, = connection.handle(probe)
+    assert ack.sending_window == 2 * MSS
+    assert connection.bytes_received == 2 * MSS
+    connection.finish()
+
+
+def test_lone_full_segment_is_acknowledged_when_the_delay_runs_out(tmp_path):
+    connection = established(tmp_path)
+    assert connection.handle(datagram(ISN + 2, b"x" * MSS)) == []
+    deadline = connection.ack_deadline
+    assert deadline is not None
+    assert connection.flush_ack(deadline - receiver.DELAYED_ACK_TIMEOUT / 2) is None
+    ack = connection.flush_ack(deadline)
+    assert ack.ack_num == ISN + 2 and connection.ack_deadline is None
+    connection.finish()
+
+
+def test_second_full_segment_is_acknowledged_at_once(tmp_path):
+    connection = established(tmp_path)
+    connection.handle(datagram(ISN + 2, b"x" * MSS))
+    ack, = connection.handle(datagram(ISN + 2 + MSS, b"x" * MSS))
+    assert ack.ack_num == ISN + 2 + MSS  # covers both
+    assert connection.ack_deadline is None and connection.flush_ack(float("inf")) is None
+    # a short (last) segment does not wait
+    ack, = connection.handle(datagram(ISN + 2 + 2 * MSS, b"end"))
+    assert ack.ack_num == ISN + 2 + 2 * MSS
+    connection.finish()
@@ -0,0 +1,58 @@
+import os
+import checkpoint
+from header import ReliableTransportLayerProtocolHeader, SegmentView, OPT_RESUME
+import receiver
+from receiver_server import ReceiverServerProtocol
+from seqnum import seq_add
+
+# The server's demultiplexing, driven with the datagrams senders would send; replies are
+# collected instead of sent.
+
+KEY = bytes(range(checkpoint.KEY_SIZE))
+
+
+class CollectingTransport:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, addr):
+        self.sent.append((SegmentView.from_bytes(data), addr))
+
+
+def datagram(port, seq_num, ack_num=0, syn=False, ack=False, app_data=b"", options=None):
+    header = ReliableTransportLayerProtocolHeader(port, 8000, seq_num, ack_num, 64, 1400, syn=syn, ack=ack,
+                                                  app_data=app_data, options=options)
+    return header.to_bytes()
+
+
+def server(tmp_path, monkeypatch):
+    monkeypatch.setattr(receiver, "DELAYED_ACK", False)  # no timers without an event loop
+    protocol = ReceiverServerProtocol(str(tmp_path), 8000)
+    protocol.transport = CollectingTransport()
+    return protocol
+
+
+def test_resumed_transfer_from_another_port_finds_its_checkpoint(tmp_path, monkeypatch):
+    protocol = server(tmp_path, monkeypatch)
+    first = ("127.0.0.1", 8001)
+    protocol.datagram_received(datagram(8001, 1000, syn=True, options={OPT_RESUME: KEY}), first)
+    syn_ack, _ = protocol.transport.sent[-1]
+    protocol.datagram_received(datagram(8001, 1001, seq_add(syn_ack.seq_num, 1), ack=True), first)
+    protocol.datagram_received(datagram(8001, 1002, seq_add(syn_ack.seq_num, 1), app_data=b"x" * 1400), first)
+
+    # the sender restarted and its new socket got another port
+    protocol.datagram_received(datagram(8002, 5000, syn=True, options={OPT_RESUME: KEY}), ("127.0.0.1", 8002))
+    syn_ack, addr = protocol.transport.sent[-1]
+    assert addr == ("127.0.0.1", 8002) and syn_ack.syn
+    assert int.from_bytes(syn_ack.options[OPT_RESUME], "big") == 1400
+    assert list(protocol.connections) == [("127.0.0.1", 8002)]
+    assert protocol.connections[addr].output_path == os.path.join(str(tmp_path), f"received_127.0.0.1_{KEY.hex()}.txt")
+
+
+def test_transfers_without_a_key_are_named_by_port(tmp_path, monkeypatch):
+    protocol = server(tmp_path, monkeypatch)
+    protocol.datagram_received(datagram(8001, 1000, syn=True), ("127.0.0.1", 8001))
+    protocol.datagram_received(datagram(8002, 1000, syn=True), ("127.0.0.1", 8002))
+    assert [connection.output_path for connection in protocol.connections.values()] == [
+        os.path.join(str(tmp_path), "received_127.0.0.1_8001.txt"),
+        os.path.join(str(tmp_path), "received_127.0.0.1_8002.txt")]
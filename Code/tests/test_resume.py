@@ -0,0 +1,81 @@
+import hashlib
+import os
+import checkpoint
+from header import ReliableTransportLayerProtocolHeader, SegmentView, OPT_DIGEST, OPT_RESUME
+from receiver import ReceiverConnection
+from seqnum import seq_add
+
+# Checkpoints on disk, and a transfer that takes up where an earlier connection stopped.
+
+SENDER = ("127.0.0.1", 8001)
+ISN = 1000
+KEY = bytes(range(checkpoint.KEY_SIZE))
+CONTENT = bytes(range(256)) * 20
+
+
+def test_checkpoint_round_trip(tmp_path):
+    output = str(tmp_path / "out.bin")
+    assert checkpoint.load(output) is None
+    checkpoint.save(output, KEY, 1234, bytes(32))
+    assert checkpoint.load(output) == (KEY, 1234, bytes(32))
+    (tmp_path / "out.bin.resume").write_text("{not json")
+    assert checkpoint.load(output) is None
+    checkpoint.remove(output)
+    checkpoint.remove(output)  # already gone
+    assert not os.path.exists(checkpoint.sidecar_path(output))
+
+
+def test_checkpoint_only_matches_the_bytes_it_describes(tmp_path):
+    output = tmp_path / "out.bin"
+    output.write_bytes(CONTENT[:3000])
+    saved = checkpoint.Checkpoint(KEY, 2800, hashlib.sha256(CONTENT[:2800]).digest())
+    assert checkpoint.verify(str(output), saved).digest() == saved.digest
+    output.write_bytes(b"?" + CONTENT[1:3000])
+    assert checkpoint.verify(str(output), saved) is None
+    output.write_bytes(CONTENT[:2000])
+    assert checkpoint.verify(str(output), saved) is None
+
+
+def test_transfer_key_changes_with_the_file(tmp_path):
+    source = tmp_path / "data.bin"
+    source.write_bytes(CONTENT)
+    key = checkpoint.transfer_key(str(source))
+    assert len(key) == checkpoint.KEY_SIZE and checkpoint.transfer_key(str(source)) == key
+    source.write_bytes(CONTENT + b"more")
+    assert checkpoint.transfer_key(str(source)) != key
+
+
+def handshake(connection, key):
+    syn = ReliableTransportLayerProtocolHeader(8001, 8000, ISN, 0, 64, 1400, syn=True, options={OPT_RESUME: key})
+    syn_ack, = connection.handle(SegmentView(syn.to_bytes()))
+    ack = ReliableTransportLayerProtocolHeader(8001, 8000, ISN + 1, seq_add(syn_ack.seq_num, 1), 64, 1400, ack=True)
+    connection.handle(SegmentView(ack.to_bytes()))
+    return int.from_bytes(syn_ack.options[OPT_RESUME], "big")
+
+
+def test_transfer_resumes_at_the_checkpoint(tmp_path):
+    output = tmp_path / "out.bin"
+    output.write_bytes(CONTENT[:3000])  # the last 200 bytes were written after the checkpoint
+    checkpoint.save(str(output), KEY, 2800, hashlib.sha256(CONTENT[:2800]).digest())
+    connection = ReceiverConnection(SENDER, str(output))
+    assert handshake(connection, KEY) == 2800
+    rest = CONTENT[2800:]
+    data = ReliableTransportLayerProtocolHeader(8001, 8000, ISN + 2, 0, 64, 1400, app_data=rest[:1400])
+    connection.handle(SegmentView(data.to_bytes()))
+    data = ReliableTransportLayerProtocolHeader(8001, 8000, ISN + 2 + 1400, 0, 64, 1400, app_data=rest[1400:])
+    connection.handle(SegmentView(data.to_bytes()))
+    fin = ReliableTransportLayerProtocolHeader(8001, 8000, ISN + 2 + len(rest), 0, 64, 1400, fin=True,
+                                               options={OPT_DIGEST: hashlib.sha256(CONTENT).digest()})
+    connection.handle(SegmentView(fin.to_bytes()))
+    assert output.read_bytes() == CONTENT and connection.digest_ok
+    assert checkpoint.load(str(output)) is None
+
+
+def test_checkpoint_of_another_file_is_not_resumed(tmp_path):
+    output = tmp_path / "out.bin"
+    output.write_bytes(CONTENT[:2800])
+    checkpoint.save(str(output), KEY, 2800, hashlib.sha256(CONTENT[:2800]).digest())
+    connection = ReceiverConnection(SENDER, str(output))
+    assert handshake(connection, bytes(checkpoint.KEY_SIZE)) == 0
+    assert checkpoint.load(str(output)) is None and output.read_bytes() == b""
+    connection.finish()
@@ -0,0 +1,39 @@
+import hashlib
+import segmenter
+from segmenter import FileSegmenter
+
+# Segments cut from a file, and the digest hashed as they go out.
+
+CONTENT = bytes(range(256)) * 40
+
+
+def test_segments_cover_the_file(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(CONTENT)
+    with FileSegmenter(str(path), 1400, 100, 5000) as data:
+        assert len(data) == 4 and data.size == 5000
+        assert b"".join(bytes(segment) for segment in data) == CONTENT[100:5100]
+        assert bytes(data[-1]) == CONTENT[4300:5100]
+
+
+def test_digest_hashed_as_segments_are_sent(tmp_path, monkeypatch):
+    monkeypatch.setattr(segmenter, "HASH_CHUNK", 1000)
+    path = tmp_path / "data.bin"
+    path.write_bytes(CONTENT)
+    with FileSegmenter(str(path), 1400) as data:
+        data.start_digest()
+        data.hash_through(1400)
+        data.hash_through(700)  # a retransmission adds nothing
+        data.hash_through(2800)
+        assert data.digest() == hashlib.sha256(CONTENT).digest()
+
+
+def test_digest_of_a_resumed_transfer_covers_the_whole_file(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(CONTENT)
+    with FileSegmenter(str(path), 1400) as whole:
+        prefix = whole.prefix_hash(3000)
+    with FileSegmenter(str(path), 1400, 3000) as rest:
+        rest.start_digest(prefix)
+        rest.hash_through(1400)
+        assert rest.digest() == hashlib.sha256(CONTENT).digest()
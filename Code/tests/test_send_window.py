@@ -0,0 +1,127 @@
+import pytest
+import sender
+from header import ReliableTransportLayerProtocolHeader, SegmentView, MAX_WINDOW, window_scale_for
+from receiver import RECEIVE_BUFFER_SIZE
+from segmenter import FileSegmenter
+from sendbuffer import SendBuffer
+from sender import SendWindow, SELECTIVE_REPEAT
+from seqnum import seq_add
+from timers import TimerHeap
+
+# The sender's window driven directly, with the module settings as shipped: the datagrams it
+# would send are collected instead of written to a socket.
+
+
+class CollectingWriter:
+    def __init__(self):
+        self.datagrams = []
+
+    def queue(self, buffers):
+        self.datagrams.append(b"".join(buffers))
+
+
+def connection_details(window_scale):
+    # what handshake() returns after a SYN-ACK from a receiver with default settings
+    return {"senderSeqNum": 1000, "senderACKNum": 1, "receiver_window": MAX_WINDOW, "window_scale": window_scale,
+            "receiver_mss": sender.MSS, "wire_format": sender.WIRE_FORMAT, "arq_mode": SELECTIVE_REPEAT,
+            "timestamps": False, "handshake_rtt": None, "congestion_control": sender.CONGESTION_CONTROL,
+            "pacing": sender.PACING, "compression": None, "fast_open_acked": 0, "sender_port": 8001}
+
+
+def send_window(tmp_path, size, window_scale, content=None):
+    data_file = tmp_path / "data.bin"
+    data_file.write_bytes(bytes(size) if content is None else content)
+    data = FileSegmenter(str(data_file), sender.MSS)
+    writer = CollectingWriter()
+    return SendWindow(writer, connection_details(window_scale), data, TimerHeap()), writer
+
+
+def ack(window, index, sending_window=MAX_WINDOW):
+    # the receiver's cumulative ACK of every segment up to index
+    header = ReliableTransportLayerProtocolHeader(8000, 8001, 1, window.seq_num(index), sending_window, sender.MSS, ack=True)
+    return SegmentView(header.to_bytes())
+
+
+def test_scaled_receive_window_allows_more_than_64_kib_in_flight(tmp_path):
+    window_scale = window_scale_for(RECEIVE_BUFFER_SIZE)
+    window, writer = send_window(tmp_path, 2 * RECEIVE_BUFFER_SIZE, window_scale)
+    # the receiver's first ACK advertises its whole (scaled) buffer, and the congestion window has grown
+    window.receive_window = RECEIVE_BUFFER_SIZE
+    window.congestion.cwnd = RECEIVE_BUFFER_SIZE
+    window.fill()
+    assert window.flight_bytes > 64 * 1024
+    assert window.flight_bytes == RECEIVE_BUFFER_SIZE // sender.MSS * sender.MSS
+    assert len(writer.datagrams) == window.buffer.in_flight
+    window.data.close()
+
+
+def test_unscaled_receive_window_caps_the_congestion_window(tmp_path):
+    window, _ = send_window(tmp_path, 1024, 0)
+    assert window.congestion.max_window == MAX_WINDOW
+    window.data.close()
+
+
+def test_send_buffer_slots_are_reused_around_the_table():
+    buffer = SendBuffer(4)
+    for index in range(4):
+        buffer.add(index, index * 15, 15)
+    with pytest.raises(ValueError):
+        buffer.add(4, 60, 15)  # segment 0 still holds the slot
+    assert buffer.acknowledge(0) and not buffer.acknowledge(0)
+    buffer.release(0)
+    buffer.add(4, 60, 15)
+    assert buffer.is_in_flight(4) and buffer.offset[0] == 60 and buffer.in_flight == 4
+
+
+def test_transfer_wraps_a_small_send_buffer_many_times(tmp_path, monkeypatch):
+    monkeypatch.setattr(sender, "CWND_MAX", 4 * sender.MSS)
+    monkeypatch.setattr(sender, "SEND_BUFFER_SEGMENTS", 4)
+    content = bytes(range(256)) * 4
+    window, writer = send_window(tmp_path, len(content), 0, content)
+    window.pacing = False
+    assert window.buffer.capacity == 4
+    delivered = {}
+    while not window.done:
+        window.fill()
+        assert 0 < window.next_index - window.base <= 4
+        for datagram in writer.datagrams:
+            segment = SegmentView(datagram)
+            delivered[segment.seq_num] = bytes(segment.payload)
+        writer.datagrams.clear()
+        window.on_ack(ack(window, window.next_index - 1))
+    assert window.next_index == window.total_packets > 16
+    assert b"".join(delivered[seq_add(1000, offset)] for offset in range(0, len(content), sender.MSS)) == content
+    window.data.close()
+
+
+def test_closed_window_is_probed_until_an_ack_reopens_it(tmp_path):
+    window, writer = send_window(tmp_path, 1024, 0)
+    window.receive_window = 0
+    window.fill()
+    assert writer.datagrams == [] and "persist" in window.timers
+    window.probe()  # the persist timer fired
+    probe, = [SegmentView(datagram) for datagram in writer.datagrams]
+    assert probe.payload_length == 0 and probe.seq_num == window.seq_num(0)
+    assert window.probes == 1 and "persist" in window.timers
+    window.on_ack(ack(window, -1, sending_window=4 * sender.MSS))
+    assert window.probes == 0 and "persist" not in window.timers
+    window.fill()
+    assert window.next_index > 0
+    window.data.close()
+
+
+def test_data_file_is_read_when_packets_are_prepared(tmp_path, monkeypatch):
+    data_file = tmp_path / "data.bin"
+    data_file.write_bytes(bytes(100))
+    monkeypatch.setattr(sender, "DATA_FILE", str(data_file))
+    data = sender.prepare_packets()
+    assert data.size == 100
+    data.close()
+
+
+def test_segments_carry_the_port_the_socket_was_bound_to(tmp_path):
+    window, writer = send_window(tmp_path, 100, 0)
+    window.connection_details["sender_port"] = 54321  # parallel_sender.py binds port 0
+    window.fill()
+    assert {SegmentView(datagram).source_port_num for datagram in writer.datagrams} == {54321}
+    window.data.close()
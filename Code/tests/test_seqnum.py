@@ -0,0 +1,78 @@
+import random
+import socket
+import threading
+import pytest
+import receiver
+import sender
+from seqnum import SEQ_MODULUS, seq_add, seq_diff, seq_lt, seq_le, seq_gt, seq_ge
+
+# Serial number arithmetic across the 2**32 wrap, and whole transfers whose sequence
+# numbers cross it.
+
+TOP = SEQ_MODULUS - 1
+
+
+def test_seq_add_wraps():
+    assert seq_add(TOP, 1) == 0
+    assert seq_add(TOP - 9, 20) == 10
+    assert seq_add(5, -10) == SEQ_MODULUS - 5
+    assert seq_add(0, SEQ_MODULUS) == 0
+
+
+def test_seq_diff_across_the_wrap():
+    assert seq_diff(10, TOP - 9) == 20
+    assert seq_diff(TOP - 9, 10) == -20
+    assert seq_diff(7, 7) == 0
+    # at exactly half the space apart the distance is positive either way round
+    assert seq_diff(SEQ_MODULUS // 2, 0) == SEQ_MODULUS // 2
+    assert seq_diff(0, SEQ_MODULUS // 2) == SEQ_MODULUS // 2
+
+
+def test_comparisons_across_the_wrap():
+    before, after = TOP - 100, 100
+    assert seq_lt(before, after) and seq_le(before, after)
+    assert seq_gt(after, before) and seq_ge(after, before)
+    assert not seq_lt(after, before) and not seq_gt(before, after)
+    assert seq_le(after, after) and seq_ge(after, after) and not seq_lt(after, after)
+
+
+def test_comparisons_agree_with_offsets():
+    rng = random.Random(0)
+    for _ in range(1000):
+        base = rng.randrange(SEQ_MODULUS)
+        a, b = rng.randrange(-2**30, 2**30), rng.randrange(-2**30, 2**30)
+        assert seq_diff(seq_add(base, a), seq_add(base, b)) == a - b
+        assert seq_lt(seq_add(base, a), seq_add(base, b)) == (a < b)
+
+
+@pytest.mark.parametrize("arq_mode, loss", [(sender.SELECTIVE_REPEAT, 0.0), (sender.SELECTIVE_REPEAT, 0.05),
+                                            (sender.GO_BACK_N, 0.05)])
+def test_transfer_across_the_wrap(tmp_path, monkeypatch, arq_mode, loss):
+    # a little data before the wrap and most of it after, over loopback
+    size = 200 * 1024
+    data = random.Random(1).randbytes(size)
+    data_file = tmp_path / "data.bin"
+    data_file.write_bytes(data)
+    monkeypatch.chdir(tmp_path)  # the receiver writes its output to the working directory
+
+    server_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server_sock.bind((receiver.HOST, 0))
+    monkeypatch.setattr(receiver, "TIMEOUT", 10)
+    settings = {"RECEIVER_PORT": server_sock.getsockname()[1], "INITIAL_SEQUENCE": SEQ_MODULUS - 5000,
+                "MSS": 1400, "WINDOW_SIZE": 32, "CWND_MAX": 32 * 1400, "SEND_BUFFER_SEGMENTS": 64,
+                "ARQ_MODE": arq_mode, "LOSS_PROBABILITY": loss}
+    for name, value in settings.items():
+        monkeypatch.setattr(sender, name, value)
+    random.seed(2)  # the sender's emulated losses
+
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(connection=receiver.serve_connection(server_sock)))
+    thread.start()
+    try:
+        metrics = sender.start_sender(str(data_file), 0)
+    finally:
+        thread.join(30)
+        server_sock.close()
+    assert metrics is not None and metrics.bytes_acked == size
+    assert result["connection"].digest_ok
+    assert (tmp_path / receiver.OUTPUT_FILE).read_bytes() == data
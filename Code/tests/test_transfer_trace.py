@@ -0,0 +1,18 @@
+import pytest
+import transfer_trace
+from transfer_trace import TraceWriter, read_trace, CWND, RETRANSMIT
+
+# Trace files written as the events come and read back, in both formats.
+
+
+@pytest.mark.parametrize("name", ["trace.csv", "trace.jsonl"])
+def test_trace_round_trip(tmp_path, monkeypatch, name):
+    monkeypatch.setattr(transfer_trace, "FLUSH_EVERY", 2)  # one batch written before close()
+    path = str(tmp_path / name)
+    tracer = TraceWriter(path)
+    tracer.event(CWND, 3000, 6000, now=tracer.started + 0.25)
+    tracer.event(RETRANSMIT, 1015, "fast", now=tracer.started + 0.5)
+    tracer.event(CWND, 1500, None, now=tracer.started + 0.75)
+    tracer.close()
+    assert list(read_trace(path)) == [(0.25, CWND, 3000, "6000" if name.endswith(".csv") else 6000),
+                                      (0.5, RETRANSMIT, 1015, "fast"), (0.75, CWND, 1500, None)]
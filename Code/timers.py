@@ -0,0 +1,66 @@
+import heapq
+import itertools
+import time
+
+
+class TimerHeap:
+    """
+    Deadline timers kept on a heap, for event loops built around selectors.
+
+    A timer can be given a key; scheduling the same key again replaces the old timer and
+    cancel(key) removes it. Replaced and cancelled entries stay in the heap and are skipped
+    when they come up, so every operation is O(log n).
+    """
+
+    def __init__(self):
+        self._heap = []  # (deadline, tie breaker, key, callback)
+        self._active = {}  # key -> tie breaker of its live entry
+        self._counter = itertools.count()
+
+    def schedule(self, deadline, callback, key=None):
+        entry_id = next(self._counter)
+        if key is None:
+            key = ("anonymous", entry_id)
+        self._active[key] = entry_id
+        heapq.heappush(self._heap, (deadline, entry_id, key, callback))
+
+    def schedule_in(self, delay, callback, key=None):
+        self.schedule(time.monotonic() + delay, callback, key)
+
+    def cancel(self, key):
+        self._active.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._active
+
+    def _discard_stale(self):
+        heap = self._heap
+        while heap and self._active.get(heap[0][2]) != heap[0][1]:
+            heapq.heappop(heap)
+
+    def next_deadline(self):
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def timeout(self, now=None, default=None):
+        # seconds until the next deadline (never negative), for selector.select()
+        deadline = self.next_deadline()
+        if deadline is None:
+            return default
+        if now is None:
+            now = time.monotonic()
+        return max(0.0, deadline - now)
+
+    def run_expired(self, now=None):
+        # runs the callbacks of every timer whose deadline has passed, earliest first
+        if now is None:
+            now = time.monotonic()
+        ran = 0
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return ran
+            deadline, entry_id, key, callback = heapq.heappop(self._heap)
+            del self._active[key]
+            callback()
+            ran += 1
@@ -0,0 +1,127 @@
+import csv
+import json
+import os
+import sys
+import time
+
+# usage: python transfer_trace.py plot <trace file> [output prefix]
+# Renders PNGs from a trace written by a sender run with TRACE_FILE set. This is the only
+# place matplotlib is imported, and only when plotting.
+
+# event kinds
+CWND = "cwnd"  # value: congestion window (bytes), detail: ssthresh
+RTT = "rtt"  # value: RTT sample (seconds)
+INFLIGHT = "inflight"  # value: bytes in flight
+RETRANSMIT = "retransmit"  # value: sequence number, detail: why (timeout, fast, partial)
+
+FIELDS = ("time", "event", "value", "detail")
+FLUSH_EVERY = 512  # events buffered before they are written out
+
+
+class TraceWriter:
+    """
+    Streams transfer events to a CSV or JSONL file (chosen by the extension, *.jsonl or
+    *.csv) as they happen, so a long transfer needs no memory for its history. Times are
+    seconds since the writer was created. Events are formatted and written in batches of
+    FLUSH_EVERY.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.jsonl = path.endswith(".jsonl")
+        self.started = time.monotonic()
+        self._file = open(path, "w", newline="")
+        self._pending = []
+        if not self.jsonl:
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(FIELDS)
+
+    def event(self, event, value, detail=None, now=None):
+        now = time.monotonic() if now is None else now
+        self._pending.append((round(now - self.started, 6), event, value, detail))
+        if len(self._pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        if self.jsonl:
+            self._file.write("".join(json.dumps(dict(zip(FIELDS, row))) + "\n" for row in self._pending))
+        else:
+            self._csv.writerows(("" if field is None else field for field in row) for row in self._pending)
+        self._pending.clear()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+def read_trace(path):
+    # yields (time, event, value, detail) from a CSV or JSONL trace
+    with open(path, newline="") as file:
+        if path.endswith(".jsonl"):
+            for line in file:
+                if line.strip():
+                    row = json.loads(line)
+                    yield row["time"], row["event"], row["value"], row["detail"]
+        else:
+            for row in csv.DictReader(file):
+                detail = row["detail"]
+                yield float(row["time"]), row["event"], float(row["value"]), detail if detail != "" else None
+
+
+def plot(path, prefix=None):
+    import matplotlib
+    matplotlib.use("Agg")  # files only, no display needed
+    import matplotlib.pyplot as plt
+
+    prefix = prefix or os.path.splitext(path)[0]
+    series = {CWND: ([], [], []), RTT: ([], []), INFLIGHT: ([], [])}
+    retransmits = {}
+    for when, event, value, detail in read_trace(path):
+        if event == CWND:
+            times, values, thresholds = series[CWND]
+            times.append(when)
+            values.append(value)
+            thresholds.append(float(detail) if detail is not None else None)
+        elif event in series:
+            series[event][0].append(when)
+            series[event][1].append(value)
+        elif event == RETRANSMIT:
+            retransmits.setdefault(detail or "retransmit", []).append(when)
+
+    written = []
+    times, values, thresholds = series[CWND]
+    figure, axes = plt.subplots()
+    axes.step(times, values, where="post", label="cwnd")
+    if any(threshold is not None for threshold in thresholds):
+        axes.step(times, [t if t is not None else float("nan") for t in thresholds], where="post", label="ssthresh")
+    for reason, moments in sorted(retransmits.items()):
+        axes.plot(moments, [0] * len(moments), "|", markersize=12, label=f"retransmit ({reason})")
+    axes.set(title="Congestion window", xlabel="Time (seconds)", ylabel="Bytes")
+    axes.grid(True)
+    axes.legend()
+    written.append(save(figure, f"{prefix}_cwnd.png"))
+
+    for event, title, ylabel in ((RTT, "RTT samples", "Seconds"), (INFLIGHT, "Bytes in flight", "Bytes")):
+        times, values = series[event]
+        figure, axes = plt.subplots()
+        axes.plot(times, values, marker="." if event == RTT else None, linestyle="" if event == RTT else "-")
+        axes.set(title=title, xlabel="Time (seconds)", ylabel=ylabel)
+        axes.grid(True)
+        written.append(save(figure, f"{prefix}_{event}.png"))
+    plt.close("all")
+    return written
+
+
+def save(figure, path):
+    figure.savefig(path, dpi=120)
+    return path
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "plot":
+        print("usage: python transfer_trace.py plot <trace file> [output prefix]")
+        sys.exit(2)
+    for written in plot(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None):
+        print(f"wrote {written}")
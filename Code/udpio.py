@@ -0,0 +1,109 @@
+import selectors
+import socket
+from header import MAX_DATAGRAM_SIZE
+
+SOCKET_BUFFER_SIZE = 4 * 1024 * 1024  # requested SO_RCVBUF/SO_SNDBUF (the kernel may cap it)
+RECV_BATCH = 64  # datagrams read per drain, each into its own preallocated buffer
+SEND_WAIT = 0.05  # seconds a burst waits for room in a full send buffer before dropping
+
+
+def tune_socket(sock, rcvbuf=SOCKET_BUFFER_SIZE, sndbuf=SOCKET_BUFFER_SIZE):
+    # asks for bigger kernel buffers so bursts are not dropped; returns the sizes we got
+    for option, size in ((socket.SO_RCVBUF, rcvbuf), (socket.SO_SNDBUF, sndbuf)):
+        if size:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, option, size)
+            except OSError:
+                pass
+    return sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF), sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+
+
+class DatagramReader:
+    """
+    Drains a non-blocking UDP socket into preallocated buffers with recvmsg_into().
+
+    drain() returns (memoryview, address) pairs that point into the reader's own buffers:
+    they stay valid until the next drain(), so anything kept longer must be copied. The
+    buffer size starts at MAX_DATAGRAM_SIZE and can follow the peer's MSS once it is known
+    (resize()). Datagrams that do not fit are reported truncated by the kernel and skipped.
+    """
+
+    def __init__(self, sock, datagram_size=MAX_DATAGRAM_SIZE, batch=RECV_BATCH):
+        self.sock = sock
+        self.batch = batch
+        self.truncated = 0
+        self.resize(datagram_size)
+
+    def resize(self, datagram_size):
+        self.datagram_size = datagram_size
+        self._buffers = [memoryview(bytearray(datagram_size)) for _ in range(self.batch)]
+
+    def drain(self):
+        datagrams = []
+        recvmsg_into = self.sock.recvmsg_into
+        for buffer in self._buffers:
+            try:
+                nbytes, _, flags, addr = recvmsg_into([buffer])
+            except (BlockingIOError, ConnectionRefusedError):
+                break
+            if flags & socket.MSG_TRUNC:
+                self.truncated += 1
+                continue
+            datagrams.append((buffer[:nbytes], addr))
+        return datagrams
+
+
+class DatagramWriter:
+    """
+    Queues outgoing datagrams and sends them in one burst with sendmsg().
+
+    A datagram is a list of buffers (see ReliableTransportLayerProtocolHeader.to_buffers)
+    that the kernel gathers, so payloads are not copied into a new bytes object first.
+    When the send buffer is full the burst waits up to SEND_WAIT for room; whatever still
+    does not fit is dropped like the network would, and retransmission takes care of it.
+    """
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.pending = []
+        self.dropped = 0
+        self._selector = None
+
+    def queue(self, buffers):
+        self.pending.append(buffers)
+
+    def send(self, buffers):
+        self.queue(buffers)
+        self.flush()
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        sendmsg = self.sock.sendmsg
+        addr = self.addr
+        for buffers in pending:
+            try:
+                sendmsg(buffers, (), 0, addr)
+            except BlockingIOError:
+                if not self.wait_writable():
+                    self.dropped += 1
+                    continue
+                try:
+                    sendmsg(buffers, (), 0, addr)
+                except BlockingIOError:
+                    self.dropped += 1
+            except ConnectionRefusedError:
+                pass  # ICMP from an earlier datagram; UDP has nothing to retry
+
+    def wait_writable(self):
+        if self.sock.gettimeout() != 0.0:
+            return True  # a blocking socket already waits in sendmsg()
+        if self._selector is None:
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self.sock, selectors.EVENT_WRITE)
+        return bool(self._selector.select(SEND_WAIT))
+
+    def close(self):
+        if self._selector is not None:
+            self._selector.close()
+            self._selector = None